@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ActivitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'activities'
+
+    def ready(self):
+        # Mantiene VisibilidadActividad sincronizado con asignaciones y cambios de actividad
+        from . import signals  # noqa: F401
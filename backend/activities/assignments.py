@@ -0,0 +1,58 @@
+"""
+Asignación en bloque de becarios a actividades.
+
+``aplicar_matriz(actividad_ids, becario_ids, modo)`` trata la petición como la
+matriz actividades × becarios y la aplica sobre la tabla intermedia de
+``becarios_asignados`` calculando solo la diferencia:
+
+- ``agregar``: crea los pares que faltan.
+- ``quitar``: borra los pares de la matriz que existan.
+- ``reemplazar``: las actividades quedan asignadas exactamente a esos becarios.
+
+Las altas van en ``bulk_create(ignore_conflicts=True)`` y las bajas en un solo
+``DELETE``, dentro de una transacción. Como no pasan por ``m2m_changed``, el
+índice ``VisibilidadActividad`` se recalcula aquí para las actividades tocadas.
+"""
+from django.db import transaction
+from backend import sharding
+from .models import Actividad
+from . import visibility
+
+MODOS = ('agregar', 'quitar', 'reemplazar')
+TAMANO_LOTE = 500
+
+
+def aplicar_matriz(actividad_ids, becario_ids, modo):
+    """Aplica la matriz y devuelve ``(agregadas, quitadas)``"""
+    actividad_ids = list(dict.fromkeys(actividad_ids))
+    becario_ids = list(dict.fromkeys(becario_ids))
+    Asignacion = Actividad.becarios_asignados.through
+
+    with transaction.atomic(using=sharding.alias_actual()):
+        if modo == 'reemplazar':
+            # Toda asignación de estas actividades fuera de la matriz sobra
+            existentes = Asignacion.objects.filter(actividad_id__in=actividad_ids)
+            quitadas, _ = existentes.exclude(usuario_id__in=becario_ids).delete()
+        elif modo == 'quitar':
+            existentes = Asignacion.objects.filter(actividad_id__in=actividad_ids, usuario_id__in=becario_ids)
+            quitadas, _ = existentes.delete()
+        else:
+            existentes = Asignacion.objects.filter(actividad_id__in=actividad_ids, usuario_id__in=becario_ids)
+            quitadas = 0
+
+        agregadas = 0
+        if modo != 'quitar':
+            if modo == 'reemplazar':
+                existentes = existentes.filter(usuario_id__in=becario_ids)
+            presentes = set(existentes.values_list('actividad_id', 'usuario_id'))
+            nuevas = [
+                Asignacion(actividad_id=actividad_id, usuario_id=becario_id)
+                for actividad_id in actividad_ids for becario_id in becario_ids
+                if (actividad_id, becario_id) not in presentes
+            ]
+            Asignacion.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+            agregadas = len(nuevas)
+
+        if agregadas or quitadas:
+            visibility.recalcular(actividad_ids)
+    return agregadas, quitadas
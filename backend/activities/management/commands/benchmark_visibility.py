@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from users.models import Usuario
+from activities.models import Actividad
+from activities.visibility import reconstruir
+from backend.query_plan import explicar_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the becario activity visibility query before (M2M join + OR + DISTINCT) and after "
+        "(VisibilidadActividad index). Synthetic data is created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actividades', type=int, default=10000)
+        parser.add_argument('--becarios', type=int, default=5000)
+        parser.add_argument('--asignaciones', type=int, default=20, help='Becarios assigned per activity')
+        parser.add_argument('--muestras', type=int, default=200, help='Becarios sampled per measurement')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Commit the synthetic data instead of rolling back')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            becarios_ids = self.crear_datos(rng, options)
+            muestra = rng.sample(becarios_ids, min(options['muestras'], len(becarios_ids)))
+
+            def antes(usuario_id):
+                return Actividad.objects.filter(
+                    Q(en_catalogo=True, becarios_asignados=usuario_id) | Q(creador=usuario_id)
+                ).distinct()
+
+            def despues(usuario_id):
+                return Actividad.objects.filter(visibilidad__usuario=usuario_id, visibilidad__visible=True)
+
+            for nombre, consulta in (('antes', antes), ('despues', despues)):
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {nombre} =='))
+                self.mostrar_plan(consulta(muestra[0]))
+                self.medir('list', [lambda u=u: list(consulta(u)) for u in muestra])
+                self.medir('retrieve', [
+                    lambda u=u: consulta(u).filter(pk=rng.randint(1, options['actividades'])).first()
+                    for u in muestra
+                ])
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def crear_datos(self, rng, options):
+        inicio = time.perf_counter()
+        password = make_password('benchmark')
+        admin = Usuario.objects.create(username='bench_vis_admin', rol='administrador', password=password)
+        Usuario.objects.bulk_create([
+            Usuario(username=f'bench_vis_{i}', email=f'bench_vis_{i}@example.com', rol='becario', password=password)
+            for i in range(options['becarios'])
+        ], batch_size=1000)
+        becarios_ids = list(
+            Usuario.objects.filter(username__startswith='bench_vis_', rol='becario').values_list('id', flat=True)
+        )
+
+        tipos = [t for t, _ in Actividad.TIPO_CHOICES]
+        hoy = date.today()
+        Actividad.objects.bulk_create([
+            Actividad(
+                titulo=f'Actividad {i}', tipo=rng.choice(tipos), fecha=hoy - timedelta(days=rng.randint(0, 365)),
+                duracion_horas=2, modalidad='P', en_catalogo=rng.random() < 0.7,
+                creador_id=rng.choice(becarios_ids) if rng.random() < 0.1 else admin.id,
+            )
+            for i in range(options['actividades'])
+        ], batch_size=1000)
+        actividades_ids = list(Actividad.objects.filter(titulo__startswith='Actividad ').values_list('id', flat=True))
+
+        Asignacion = Actividad.becarios_asignados.through
+        por_actividad = min(options['asignaciones'], len(becarios_ids))
+        Asignacion.objects.bulk_create([
+            Asignacion(actividad_id=actividad_id, usuario_id=usuario_id)
+            for actividad_id in actividades_ids
+            for usuario_id in rng.sample(becarios_ids, por_actividad)
+        ], batch_size=5000)
+        self.stdout.write(f'Synthetic data created in {time.perf_counter() - inicio:.1f}s')
+
+        inicio = time.perf_counter()
+        altas, _, _ = reconstruir()
+        self.stdout.write(f'Visibility index built ({altas} rows) in {time.perf_counter() - inicio:.1f}s')
+        return becarios_ids
+
+    def mostrar_plan(self, queryset):
+        for paso in explicar_queryset(queryset):
+            self.stdout.write(f'  {paso}')
+
+    def medir(self, nombre, llamadas):
+        tiempos = []
+        for llamada in llamadas:
+            inicio = time.perf_counter()
+            llamada()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+        self.stdout.write(f'  {nombre}: p50={statistics.median(tiempos):.2f}ms p95={p95:.2f}ms')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from activities.search import disponible, reconstruir
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 full-text index of activities (activities_actividad_fts)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (e.g. a shard)')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if not disponible(alias):
+            raise CommandError(f'No FTS5 index in "{alias}" (run migrate; requires SQLite with FTS5)')
+        reconstruir(alias)
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt in "{alias}"'))
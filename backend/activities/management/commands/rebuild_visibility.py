@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from activities.visibility import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Rebuild the VisibilidadActividad index from assignments, creators and catalog flags."
+
+    def handle(self, *args, **options):
+        altas, cambios, bajas = reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created: {altas}, Updated: {cambios}, Deleted: {bajas}'
+        ))
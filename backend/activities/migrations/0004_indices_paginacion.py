@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_actividad_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actividad',
+            index=models.Index(fields=['fecha', 'id'], name='actividad_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actividad',
+            index=models.Index(fields=['is_active', 'fecha', 'id'], name='actividad_activa_fecha_idx'),
+        ),
+    ]
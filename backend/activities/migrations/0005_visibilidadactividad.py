@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_visibilidad(apps, schema_editor):
+    """Construye el índice de visibilidad para las actividades existentes"""
+    Actividad = apps.get_model('activities', 'Actividad')
+    VisibilidadActividad = apps.get_model('activities', 'VisibilidadActividad')
+    Asignacion = Actividad.becarios_asignados.through
+
+    info = {
+        a_id: (en_catalogo and is_active, creador_id)
+        for a_id, en_catalogo, is_active, creador_id in
+        Actividad.objects.values_list('id', 'en_catalogo', 'is_active', 'creador_id')
+    }
+    filas = {}
+    for actividad_id, usuario_id in Asignacion.objects.values_list('actividad_id', 'usuario_id'):
+        publicada, creador_id = info[actividad_id]
+        filas[(usuario_id, actividad_id)] = (publicada or usuario_id == creador_id, True)
+    for actividad_id, (_, creador_id) in info.items():
+        filas.setdefault((creador_id, actividad_id), (True, False))
+
+    VisibilidadActividad.objects.bulk_create([
+        VisibilidadActividad(usuario_id=u, actividad_id=a, visible=visible, asignada=asignada)
+        for (u, a), (visible, asignada) in filas.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_indices_paginacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisibilidadActividad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visible', models.BooleanField(default=False)),
+                ('asignada', models.BooleanField(default=False)),
+                ('actividad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibilidad', to='activities.actividad')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibilidad_actividades', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'visible', 'actividad'], name='visibilidad_visible_idx'), models.Index(fields=['usuario', 'asignada', 'actividad'], name='visibilidad_asignada_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'actividad'), name='visibilidad_usuario_actividad_uniq')],
+            },
+        ),
+        migrations.RunPython(poblar_visibilidad, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def ocultar_desactivadas(apps, schema_editor):
+    """Las actividades desactivadas dejan de ser visibles también para su creador"""
+    VisibilidadActividad = apps.get_model('activities', 'VisibilidadActividad')
+    VisibilidadActividad.objects.filter(actividad__is_active=False, visible=True).update(visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0005_visibilidadactividad'),
+    ]
+
+    operations = [
+        migrations.RunPython(ocultar_desactivadas, migrations.RunPython.noop),
+    ]
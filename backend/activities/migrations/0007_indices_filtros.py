@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0006_ocultar_desactivadas_al_creador'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actividad',
+            index=models.Index(condition=models.Q(('en_catalogo', True), ('is_active', True)), fields=['fecha', 'id'], name='actividad_catalogo_idx'),
+        ),
+    ]
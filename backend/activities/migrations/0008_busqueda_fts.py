@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+TABLA = 'activities_actividad_fts'
+COLUMNAS = 'titulo, descripcion, competencia_desarrollada, organizacion, facilitador'
+NUEVAS = 'new.titulo, new.descripcion, new.competencia_desarrollada, new.organizacion, new.facilitador'
+VIEJAS = 'old.titulo, old.descripcion, old.competencia_desarrollada, old.organizacion, old.facilitador'
+
+
+def crear_indice(apps, schema_editor):
+    """Tabla FTS5 de contenido externo sobre activities_actividad, con triggers de sincronización"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(f"""CREATE VIRTUAL TABLE {TABLA} USING fts5(
+                {COLUMNAS},
+                content='activities_actividad', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )""")
+        except OperationalError:
+            # SQLite sin FTS5: activities/search.py recurre a icontains
+            return
+        cursor.execute(f"""CREATE TRIGGER {TABLA}_ai AFTER INSERT ON activities_actividad BEGIN
+            INSERT INTO {TABLA}(rowid, {COLUMNAS}) VALUES (new.id, {NUEVAS});
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {TABLA}_ad AFTER DELETE ON activities_actividad BEGIN
+            INSERT INTO {TABLA}({TABLA}, rowid, {COLUMNAS}) VALUES ('delete', old.id, {VIEJAS});
+        END""")
+        cursor.execute(f"""CREATE TRIGGER {TABLA}_au AFTER UPDATE OF {COLUMNAS} ON activities_actividad BEGIN
+            INSERT INTO {TABLA}({TABLA}, rowid, {COLUMNAS}) VALUES ('delete', old.id, {VIEJAS});
+            INSERT INTO {TABLA}(rowid, {COLUMNAS}) VALUES (new.id, {NUEVAS});
+        END""")
+        cursor.execute(f"INSERT INTO {TABLA}({TABLA}) VALUES ('rebuild')")
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for trigger in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA}_{trigger}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLA}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0007_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -38,8 +38,46 @@ class Actividad(models.Model):
     is_active = models.BooleanField(default=True, help_text="Desactivar en lugar de eliminar")
 
 
+    class Meta:
+        # Claves de la paginación por cursor: (fecha, id) y (is_active, fecha, id)
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='actividad_fecha_id_idx'),
+            models.Index(fields=['is_active', 'fecha', 'id'], name='actividad_activa_fecha_idx'),
+            # Parcial: catálogo visible (activas y en catálogo)
+            models.Index(fields=['fecha', 'id'], condition=models.Q(is_active=True, en_catalogo=True),
+                         name='actividad_catalogo_idx'),
+        ]
+
     def __str__(self):
         return self.titulo
     
     objects = models.Manager()
-    active_objects = models.Manager()
\ No newline at end of file
+    active_objects = models.Manager()
+
+
+class VisibilidadActividad(models.Model):
+    """
+    Índice desnormalizado de qué actividades ve cada usuario.
+
+    Hay una fila por (usuario, actividad) cuando el usuario está asignado a la
+    actividad o es su creador. ``visible`` replica la regla de los becarios
+    (en catálogo, activa y asignada, o creada por él) y ``asignada`` indica si
+    está en ``becarios_asignados``. Se mantiene desde ``activities.signals``;
+    ``manage.py rebuild_visibility`` lo reconstruye por completo.
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='visibilidad_actividades')
+    actividad = models.ForeignKey(Actividad, on_delete=models.CASCADE, related_name='visibilidad')
+    visible = models.BooleanField(default=False)
+    asignada = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'actividad'], name='visibilidad_usuario_actividad_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'visible', 'actividad'], name='visibilidad_visible_idx'),
+            models.Index(fields=['usuario', 'asignada', 'actividad'], name='visibilidad_asignada_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} -> {self.actividad_id} (visible={self.visible})"
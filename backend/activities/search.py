@@ -0,0 +1,111 @@
+"""
+Búsqueda de texto completo sobre el catálogo de actividades (SQLite FTS5).
+
+``activities_actividad_fts`` es una tabla virtual FTS5 de contenido externo
+sobre ``titulo``, ``descripcion``, ``competencia_desarrollada``,
+``organizacion`` y ``facilitador``. La crea la migración
+``0008_busqueda_fts`` junto con triggers de inserción, actualización y borrado,
+así que se mantiene sincronizada también con ``bulk_create``,
+``queryset.update()`` y SQL directo. El tokenizador ``unicode61`` con
+``remove_diacritics`` ignora mayúsculas y acentos, y los índices de prefijo de
+2 y 3 caracteres hacen que ``"ta"*`` no recorra todo el vocabulario.
+
+``buscar(queryset, texto)`` añade la condición ``MATCH`` y la relevancia BM25
+a un queryset cualquiera, de modo que se combina con las reglas de
+visibilidad y con los filtros de la vista en una sola consulta. Cada palabra
+del texto es un prefijo y todas deben aparecer. Sin FTS5 (otra base de datos
+o SQLite compilado sin él) se recurre a ``icontains``.
+
+``manage.py rebuild_search_index`` reconstruye el índice.
+"""
+import re
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from .models import Actividad
+
+TABLA = 'activities_actividad_fts'
+CAMPOS = ('titulo', 'descripcion', 'competencia_desarrollada', 'organizacion', 'facilitador')
+# Pesos de BM25 por columna, en el orden de CAMPOS
+PESOS = (10.0, 2.0, 4.0, 1.0, 1.0)
+PALABRA = re.compile(r'\w+')
+
+SQL_RECONSTRUIR = f"INSERT INTO {TABLA}({TABLA}) VALUES ('rebuild')"
+
+# alias -> si la tabla FTS existe en esa base de datos
+_disponible = {}
+
+
+def disponible(alias):
+    if alias not in _disponible:
+        conexion = connections[alias]
+        if conexion.vendor != 'sqlite':
+            _disponible[alias] = False
+        else:
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA])
+                _disponible[alias] = cursor.fetchone() is not None
+    return _disponible[alias]
+
+
+def filtros(params):
+    """
+    Valida los filtros de la búsqueda: ``tipo``, ``modalidad`` y ``desde`` /
+    ``hasta`` (``fecha``, ``YYYY-MM-DD``). Lanza ``ValueError`` si alguno no es válido.
+    """
+    filtros = {}
+    for param, opciones in (('tipo', Actividad.TIPO_CHOICES), ('modalidad', Actividad.MODALIDAD_CHOICES)):
+        valor = params.get(param)
+        if valor:
+            if valor not in dict(opciones):
+                raise ValueError(f'Valor inválido en "{param}": {valor}')
+            filtros[param] = valor
+    for param, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+        valor = params.get(param)
+        if valor:
+            fecha = parse_date(valor)
+            if fecha is None:
+                raise ValueError(f'Fecha inválida en "{param}": {valor}')
+            filtros[lookup] = fecha
+    return filtros
+
+
+def palabras(texto):
+    return PALABRA.findall(texto or '')
+
+
+def expresion(texto):
+    """Consulta FTS5 con cada palabra como prefijo entre comillas (sin operadores del usuario)"""
+    return ' '.join(f'"{palabra}"*' for palabra in palabras(texto))
+
+
+def buscar(queryset, texto):
+    """``queryset`` filtrado por ``texto`` y ordenado por relevancia (``relevancia`` con FTS5)"""
+    if not palabras(texto):
+        return queryset.none()
+    if not disponible(queryset.db):
+        return _buscar_sin_fts(queryset, texto)
+    pesos = ', '.join(str(p) for p in PESOS)
+    # BM25 devuelve valores negativos: cuanto menor, más relevante
+    return queryset.extra(
+        tables=[TABLA],
+        where=[f'{TABLA}.rowid = activities_actividad.id', f'{TABLA} MATCH %s'],
+        params=[expresion(texto)],
+        select={'relevancia': f'bm25({TABLA}, {pesos})'},
+        order_by=['relevancia', '-id'],
+    )
+
+
+def _buscar_sin_fts(queryset, texto):
+    for palabra in palabras(texto):
+        condicion = Q()
+        for campo in CAMPOS:
+            condicion |= Q(**{f'{campo}__icontains': palabra})
+        queryset = queryset.filter(condicion)
+    return queryset.order_by('-fecha', '-id')
+
+
+def reconstruir(alias):
+    """Vuelve a indexar todas las actividades de ``alias``"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(SQL_RECONSTRUIR)
@@ -1,28 +1,32 @@
 from rest_framework import serializers
+from backend.expansion import ExpandableFieldsMixin
 from .models import Actividad
-from users.serializers import UsuarioSerializer
 
 # NUEVO: Serializer básico para evitar recursividad
-class ActividadBasicaSerializer(serializers.ModelSerializer):
+class ActividadBasicaSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Actividad
         fields = ['id', 'titulo', 'tipo', 'fecha', 'duracion_horas', 'modalidad']
 
-class ActividadSerializer(serializers.ModelSerializer):
+class ActividadSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     creador_nombre = serializers.CharField(source='creador.get_full_name', read_only=True)
-    # NUEVO: Mostrar becarios asignados con sus datos
-    becarios_asignados_info = UsuarioSerializer(
-        source='becarios_asignados', 
-        many=True, 
-        read_only=True
-    )
-    
+
     class Meta:
         model = Actividad
         fields = ['id', 'titulo', 'descripcion', 'tipo', 'fecha', 'duracion_horas',
                  'competencia_desarrollada', 'modalidad', 'organizacion', 'facilitador',
                  'creador', 'creador_nombre', 'en_catalogo', 'fecha_creacion',
-                 'becarios_asignados', 'becarios_asignados_info']  # NUEVOS campos
+                 'becarios_asignados']
+        # Relaciones necesarias para creador_nombre y la lista de ids de becarios
+        select_related_fields = ['creador']
+        prefetch_related_fields = ['becarios_asignados']
+        # Solo con ?expand=becarios_asignados_info se incluyen los datos de cada becario
+        expandable_fields = {
+            'becarios_asignados_info': ('users.serializers.UsuarioSerializer', {
+                'source': 'becarios_asignados',
+                'many': True,
+            }),
+        }
 
 class ActividadCreateSerializer(serializers.ModelSerializer):
     becarios_asignados = serializers.ListField(
@@ -54,4 +58,36 @@ class AsignarBecariosSerializer(serializers.Serializer):
     becarios_ids = serializers.ListField(
         child=serializers.IntegerField(),
         help_text="Lista de IDs de becarios a asignar"
-    )
\ No newline at end of file
+    )
+
+class AsignacionMatrizSerializer(serializers.Serializer):
+    MAX_PARES = 100000
+
+    actividades_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=1000,
+        help_text="IDs de las actividades (filas de la matriz)"
+    )
+    becarios_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        max_length=10000,
+        help_text="IDs de los becarios (columnas de la matriz)"
+    )
+    modo = serializers.ChoiceField(
+        choices=['agregar', 'quitar', 'reemplazar'],
+        default='agregar',
+        help_text="agregar: crea los pares que faltan; quitar: borra los pares; "
+                  "reemplazar: las actividades quedan asignadas solo a estos becarios"
+    )
+
+    def validate(self, data):
+        data['actividades_ids'] = list(dict.fromkeys(data['actividades_ids']))
+        data['becarios_ids'] = list(dict.fromkeys(data['becarios_ids']))
+        if not data['becarios_ids'] and data['modo'] != 'reemplazar':
+            raise serializers.ValidationError({'becarios_ids': 'Debe indicar al menos un becario.'})
+        if len(data['actividades_ids']) * len(data['becarios_ids']) > self.MAX_PARES:
+            raise serializers.ValidationError(
+                f'La matriz no puede superar {self.MAX_PARES} pares actividad-becario.'
+            )
+        return data
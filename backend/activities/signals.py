@@ -0,0 +1,44 @@
+from django.db.models.signals import pre_save, post_save, m2m_changed
+from django.dispatch import receiver
+from .models import Actividad
+from . import visibility
+
+# Campos de Actividad que afectan a VisibilidadActividad
+CAMPOS_VISIBILIDAD = ('en_catalogo', 'is_active', 'creador_id')
+
+
+@receiver(pre_save, sender=Actividad)
+def recordar_visibilidad_anterior(sender, instance, raw=False, **kwargs):
+    instance._visibilidad_anterior = None
+    if raw or instance.pk is None:
+        return
+    instance._visibilidad_anterior = (
+        Actividad.objects.filter(pk=instance.pk).values_list(*CAMPOS_VISIBILIDAD).first()
+    )
+
+
+@receiver(post_save, sender=Actividad)
+def actualizar_visibilidad_actividad(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    actual = tuple(getattr(instance, campo) for campo in CAMPOS_VISIBILIDAD)
+    if created or getattr(instance, '_visibilidad_anterior', None) != actual:
+        visibility.recalcular([instance.pk])
+
+
+@receiver(m2m_changed, sender=Actividad.becarios_asignados.through)
+def actualizar_visibilidad_asignaciones(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # usuario.actividades_asignadas.clear(): se necesitan las actividades antes de borrar
+        instance._actividades_antes_de_limpiar = list(instance.actividades_asignadas.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        visibility.recalcular([instance.pk])
+    elif action == 'post_clear':
+        visibility.recalcular(getattr(instance, '_actividades_antes_de_limpiar', []))
+    else:
+        visibility.recalcular(pk_set or [])
+
@@ -1,3 +1,290 @@
+from datetime import date
 from django.test import TestCase
+from rest_framework.test import APIClient
+from backend.query_plan import PlanConsultasMixin
+from users.models import Usuario
+from .assignments import aplicar_matriz
+from .models import Actividad, VisibilidadActividad
 
-# Create your tests here.
+
+class PlanConsultasActividadesTests(PlanConsultasMixin, TestCase):
+    """Las consultas principales de los endpoints de actividades no recorren tablas enteras"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', rol='becario')
+        for i, tipo in enumerate(['Interna', 'Externa', 'Taller', 'Chat']):
+            actividad = Actividad.objects.create(
+                titulo=f'Actividad {i}', tipo=tipo, fecha=date(2025, 1, i + 1), duracion_horas=2,
+                modalidad='P', en_catalogo=i % 2 == 0, creador=cls.admin
+            )
+            actividad.becarios_asignados.add(cls.becario)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_listado_becario(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/activities/actividades/', {'paginacion': 'cursor'})
+        )
+        self.assertEqual(len(respuesta.data['results']), 2)
+
+    def test_listado_admin_por_cursor(self):
+        self.client.force_authenticate(self.admin)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/activities/actividades/', {'paginacion': 'cursor'})
+        )
+        self.assertEqual(len(respuesta.data['results']), 4)
+
+    def test_mis_actividades_asignadas(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/activities/actividades/mis_actividades_asignadas/')
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_catalogo_activo(self):
+        self.assertSinEscaneosCompletos(
+            lambda: list(Actividad.objects.filter(is_active=True, en_catalogo=True).order_by('-fecha', '-id'))
+        )
+
+
+class AsignacionMatrizTests(TestCase):
+    """La matriz de asignaciones aplica solo la diferencia y mantiene el índice de visibilidad"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becarios = [
+            Usuario.objects.create_user(f'becario{i}', f'becario{i}@example.com', 'clave') for i in range(3)
+        ]
+        cls.actividades = [
+            Actividad.objects.create(
+                titulo=f'Actividad {i}', tipo='Taller', fecha=date(2025, 1, i + 1), duracion_horas=2,
+                modalidad='P', en_catalogo=True, creador=cls.admin
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def asignar(self, becarios, modo):
+        return self.client.post('/api/activities/actividades/asignar_matriz/', {
+            'actividades_ids': [a.pk for a in self.actividades],
+            'becarios_ids': [b.pk for b in becarios],
+            'modo': modo,
+        }, format='json')
+
+    def pares(self):
+        return set(Actividad.becarios_asignados.through.objects.values_list('actividad_id', 'usuario_id'))
+
+    def test_agregar_reemplazar_y_quitar(self):
+        respuesta = self.asignar(self.becarios[:2], 'agregar')
+        self.assertEqual((respuesta.data['agregadas'], respuesta.data['quitadas']), (4, 0))
+        # Repetir no crea nada
+        self.assertEqual(self.asignar(self.becarios[:2], 'agregar').data['agregadas'], 0)
+
+        respuesta = self.asignar(self.becarios[1:], 'reemplazar')
+        self.assertEqual((respuesta.data['agregadas'], respuesta.data['quitadas']), (2, 2))
+        self.assertEqual(self.pares(), {(a.pk, b.pk) for a in self.actividades for b in self.becarios[1:]})
+
+        respuesta = self.asignar(self.becarios[2:], 'quitar')
+        self.assertEqual((respuesta.data['agregadas'], respuesta.data['quitadas']), (0, 2))
+        self.assertEqual(
+            set(VisibilidadActividad.objects.filter(asignada=True).values_list('actividad_id', 'usuario_id')),
+            {(a.pk, self.becarios[1].pk) for a in self.actividades},
+        )
+
+    def test_consultas_constantes(self):
+        otros = [Usuario.objects.create_user(f'otro{i}', f'otro{i}@example.com', 'clave') for i in range(20)]
+        # Validación (2), diferencia, altas y recálculo de visibilidad (más savepoints): no depende del tamaño de la matriz
+        with self.assertNumQueries(12):
+            respuesta = self.asignar(otros, 'agregar')
+        self.assertEqual(respuesta.data['agregadas'], 40)
+
+    def test_ids_invalidos(self):
+        respuesta = self.client.post('/api/activities/actividades/asignar_matriz/', {
+            'actividades_ids': [self.actividades[0].pk], 'becarios_ids': [self.admin.pk],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('becarios_ids', respuesta.data)
+        self.assertEqual(self.pares(), set())
+
+
+class VisibilidadActividadesTests(TestCase):
+    """Catálogo, asignación y autoría deciden qué ve un becario; una actividad desactivada no la ve ninguno"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creador = Usuario.objects.create_user('creador', 'creador@example.com', 'clave')
+        cls.asignado = Usuario.objects.create_user('asignado', 'asignado@example.com', 'clave')
+        cls.actividad = Actividad.objects.create(
+            titulo='Propuesta', tipo='Externa', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=False, creador=cls.creador,
+        )
+        cls.actividad.becarios_asignados.add(cls.asignado)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def ve(self, usuario):
+        self.client.force_authenticate(usuario)
+        listado = [a['id'] for a in self.client.get('/api/activities/actividades/').data]
+        detalle = self.client.get(f'/api/activities/actividades/{self.actividad.pk}/').status_code
+        self.assertEqual(self.actividad.pk in listado, detalle == 200)
+        return detalle == 200
+
+    def test_creador_y_catalogo(self):
+        # Fuera de catálogo solo la ve su creador
+        self.assertEqual((self.ve(self.creador), self.ve(self.asignado)), (True, False))
+        self.actividad.en_catalogo = True
+        self.actividad.save()
+        self.assertEqual((self.ve(self.creador), self.ve(self.asignado)), (True, True))
+
+    def test_desactivada_no_la_ve_ni_su_creador(self):
+        self.actividad.en_catalogo = True
+        self.actividad.is_active = False
+        self.actividad.save()
+        self.assertEqual((self.ve(self.creador), self.ve(self.asignado)), (False, False))
+        self.assertFalse(VisibilidadActividad.objects.filter(actividad=self.actividad, visible=True).exists())
+
+
+class BusquedaActividadesTests(PlanConsultasMixin, TestCase):
+    """Búsqueda FTS5: prefijos sin acentos, relevancia, visibilidad y sincronización por triggers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        datos = [
+            ('Taller de Programación', '', 'Taller', 'V', True),
+            ('Voluntariado en biblioteca', 'Clasificación de programas culturales', 'Externa', 'P', True),
+            ('Programación competitiva', '', 'Taller', 'P', False),
+        ]
+        cls.actividades = []
+        for i, (titulo, descripcion, tipo, modalidad, en_catalogo) in enumerate(datos):
+            actividad = Actividad.objects.create(
+                titulo=titulo, descripcion=descripcion, tipo=tipo,
+                fecha=date(2025, 1, i + 1), duracion_horas=2, modalidad=modalidad,
+                en_catalogo=en_catalogo, creador=cls.admin,
+            )
+            actividad.becarios_asignados.add(cls.becario)
+            cls.actividades.append(actividad)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def buscar(self, usuario, **params):
+        self.client.force_authenticate(usuario)
+        respuesta = self.client.get('/api/activities/actividades/buscar/', params)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return [fila['titulo'] for fila in respuesta.data]
+
+    def test_prefijo_sin_acentos_y_relevancia(self):
+        self.assertEqual(set(self.buscar(self.admin, q='programacion')),
+                         {'Taller de Programación', 'Programación competitiva'})
+        # El título pesa más que la descripción
+        titulos = self.buscar(self.admin, q='PROGRAM')
+        self.assertEqual(len(titulos), 3)
+        self.assertEqual(titulos[-1], 'Voluntariado en biblioteca')
+        self.assertEqual(self.buscar(self.admin, q='biblio program'), ['Voluntariado en biblioteca'])
+
+    def test_visibilidad_y_filtros(self):
+        # La tercera no está en catálogo: el becario no la ve
+        self.assertEqual(self.buscar(self.becario, q='prog', modalidad='V'), ['Taller de Programación'])
+        self.assertEqual(len(self.buscar(self.becario, q='prog')), 2)
+        self.assertEqual(self.buscar(self.admin, q='prog', tipo='Externa', desde='2025-01-02'),
+                         ['Voluntariado en biblioteca'])
+
+    def test_triggers_mantienen_el_indice(self):
+        actividad = self.actividades[0]
+        actividad.titulo = 'Taller de cerámica'
+        actividad.save()
+        Actividad.objects.filter(pk=self.actividades[1].pk).update(descripcion='Inventario')
+        self.assertEqual(self.buscar(self.admin, q='programacion'), ['Programación competitiva'])
+        self.assertEqual(self.buscar(self.admin, q='ceramica'), ['Taller de cerámica'])
+        self.actividades[2].delete()
+        self.assertEqual(self.buscar(self.admin, q='programacion'), [])
+
+    def test_plan_becario(self):
+        self.client.force_authenticate(self.becario)
+        self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/activities/actividades/buscar/', {'q': 'prog'}),
+            permitidas=['sqlite_master'],
+        )
+
+
+class PeticionesCondicionalesTests(TestCase):
+    """ETag / Last-Modified del listado y de mis_actividades_asignadas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin,
+        )
+        cls.actividad.becarios_asignados.add(cls.becario)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.becario)
+
+    def get(self, url, **cabeceras):
+        return self.client.get(url, headers=cabeceras)
+
+    def test_sin_cambios_responde_304_con_una_consulta(self):
+        for url in ('/api/activities/actividades/', '/api/activities/actividades/mis_actividades_asignadas/'):
+            respuesta = self.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertIn('Last-Modified', respuesta.headers)
+            # Solo se lee el último cambio del registro de sincronización
+            with self.assertNumQueries(1):
+                condicional = self.get(url, if_none_match=respuesta['ETag'])
+            self.assertEqual(condicional.status_code, 304)
+            self.assertEqual(condicional['ETag'], respuesta['ETag'])
+            with self.assertNumQueries(1):
+                self.assertEqual(self.get(url, if_modified_since=respuesta['Last-Modified']).status_code, 304)
+
+    def test_etag_depende_de_usuario_y_parametros(self):
+        etag = self.get('/api/activities/actividades/')['ETag']
+        self.assertNotEqual(self.get('/api/activities/actividades/?fields=id')['ETag'], etag)
+        self.client.force_authenticate(self.admin)
+        self.assertNotEqual(self.get('/api/activities/actividades/')['ETag'], etag)
+
+    def test_cambios_renuevan_el_etag(self):
+        url = '/api/activities/actividades/mis_actividades_asignadas/'
+        etag = self.get(url)['ETag']
+        self.actividad.titulo = 'Taller de cerámica'
+        self.actividad.save()
+        respuesta = self.get(url, if_none_match=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data[0]['titulo'], 'Taller de cerámica')
+
+        # Sin señales: los triggers del registro de cambios también lo ven
+        etag = respuesta['ETag']
+        Actividad.objects.filter(pk=self.actividad.pk).update(titulo='Taller de barro')
+        respuesta = self.get(url, if_none_match=etag)
+        self.assertEqual((respuesta.status_code, respuesta.data[0]['titulo']), (200, 'Taller de barro'))
+
+        etag = respuesta['ETag']
+        aplicar_matriz([self.actividad.pk], [self.becario.pk], 'quitar')
+        respuesta = self.get(url, if_none_match=etag)
+        self.assertEqual((respuesta.status_code, respuesta.data), (200, []))
+
+    def test_expandido_sin_validadores(self):
+        # becarios_asignados_info incluye datos de usuarios que no quedan en el registro de cambios
+        respuesta = self.get('/api/activities/actividades/?expand=becarios_asignados_info')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('ETag', respuesta.headers)
+
+    def test_administrador_no_recibe_validadores_en_403(self):
+        self.client.force_authenticate(self.admin)
+        respuesta = self.get('/api/activities/actividades/mis_actividades_asignadas/')
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertNotIn('ETag', respuesta.headers)
@@ -1,15 +1,33 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db import transaction
 from .models import Actividad
-from .serializers import ActividadSerializer, ActividadCreateSerializer, AsignarBecariosSerializer
+from .serializers import (ActividadSerializer, ActividadCreateSerializer, AsignarBecariosSerializer,
+                          AsignacionMatrizSerializer)
+from .assignments import aplicar_matriz
+from . import search
+from .visibility import actividades_visibles
 from users.permissions import IsAdministrador
+from backend import conditional, sharding
+from backend.conditional import condicional
+from backend.expansion import ExpandableViewMixin
 from drf_spectacular.utils import extend_schema
 
-class ActividadViewSet(viewsets.ModelViewSet):
+
+def versiones_actividades(view, request):
+    # La visibilidad de cada becario solo cambia con actividades o asignaciones, que quedan en el
+    # registro de cambios. Con ?expand=becarios_asignados_info la respuesta incluye datos de
+    # usuarios que no se registran: se responde sin validadores
+    if request.query_params.get('expand'):
+        return None
+    return [conditional.marca_actividades()]
+
+
+class ActividadViewSet(ExpandableViewMixin, viewsets.ModelViewSet):
     queryset = Actividad.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-fecha', '-id')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -17,15 +35,8 @@ class ActividadViewSet(viewsets.ModelViewSet):
         return ActividadSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        if user.rol == 'administrador':
-            return Actividad.objects.filter(is_active=True).prefetch_related('becarios_asignados')
-        else:
-            # Becarios solo ven actividades que están en catálogo Y que están asignadas a ellos
-            # O actividades que ellos mismos crearon
-            return Actividad.objects.filter(
-                Q(en_catalogo=True, becarios_asignados=user) | Q(creador=user)
-            ).prefetch_related('becarios_asignados').distinct()
+        # Regla de visibilidad compartida con /api/sync/ (activities/visibility.py)
+        return actividades_visibles(self.request.user).select_related('creador').prefetch_related('becarios_asignados')
         
     @extend_schema(
         description="""**👑 SOLO ADMINISTRADORES** - Desactivar actividad
@@ -87,8 +98,11 @@ class ActividadViewSet(viewsets.ModelViewSet):
         **Permisos:**
         - **Administradores:** Pueden ver todas las actividades
         - **Becarios:** Solo pueden ver actividades que están en catálogo y asignadas específicamente a ellos, o actividades que ellos mismos crearon
+
+        Admite peticiones condicionales (`If-None-Match` / `If-Modified-Since`): sin cambios responde 304.
         """
     )
+    @condicional(versiones_actividades)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -177,6 +191,11 @@ class ActividadViewSet(viewsets.ModelViewSet):
         user = self.request.user
         serializer.save(creador=user)
 
+    def perform_update(self, serializer):
+        # Un cambio de tipo traslada las horas aprobadas en ProgresoMeta dentro de la misma transacción
+        with transaction.atomic(using=sharding.alias_actual()):
+            serializer.save()
+
     @extend_schema(
         description="""**👑 SOLO ADMINISTRADORES** - Asignar becarios a actividad
         
@@ -193,7 +212,7 @@ class ActividadViewSet(viewsets.ModelViewSet):
         serializer = AsignarBecariosSerializer(data=request.data)
         
         if serializer.is_valid():
-            becarios_ids = serializer.validated_data['becarios_ids']
+            becarios_ids = list(dict.fromkeys(serializer.validated_data['becarios_ids']))
             
             # Verificar que los IDs correspondan a becarios
             from users.models import Usuario
@@ -202,28 +221,74 @@ class ActividadViewSet(viewsets.ModelViewSet):
                 rol='becario'
             )
             
-            if len(becarios) != len(becarios_ids):
+            if becarios.count() != len(becarios_ids):
                 return Response(
                     {'error': 'Algunos IDs no corresponden a becarios válidos'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Asignar becarios a la actividad
-            actividad.becarios_asignados.set(becarios)
-            actividad.save()
+            # Asignar becarios a la actividad (solo la diferencia con lo que ya había)
+            aplicar_matriz([actividad.pk], becarios_ids, 'reemplazar')
             
             return Response({
-                'message': f'Se asignaron {len(becarios)} becarios a la actividad',
+                'message': f'Se asignaron {len(becarios_ids)} becarios a la actividad',
                 'actividad': actividad.titulo,
-                'becarios_asignados': [f"{b.first_name} {b.last_name}" for b in becarios]
+                'becarios_asignados': [f"{nombre} {apellido}" for nombre, apellido in
+                                       becarios.values_list('first_name', 'last_name')]
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Asignación en bloque (matriz actividades × becarios)
+
+        Aplica una matriz de asignaciones en una sola transacción, con una consulta
+        para la diferencia, un `bulk_create` para las altas y un solo borrado.
+
+        **Cuerpo:**
+        - `actividades_ids`: actividades activas (máximo 1000)
+        - `becarios_ids`: becarios (máximo 10000; el producto no puede superar 100000 pares)
+        - `modo`: `agregar` (por defecto), `quitar` o `reemplazar`
+
+        Con `reemplazar` cada actividad queda asignada exactamente a `becarios_ids`.
+
+        **Permisos:**
+        - **Administradores:** Pueden asignar becarios a cualquier actividad
+        - **Becarios:** No tienen acceso a esta funcionalidad
+        """
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsAdministrador])
+    def asignar_matriz(self, request):
+        serializer = AsignacionMatrizSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        datos = serializer.validated_data
+        actividad_ids, becario_ids = datos['actividades_ids'], datos['becarios_ids']
+
+        from users.models import Usuario
+        errores = {}
+        if Actividad.objects.filter(id__in=actividad_ids, is_active=True).count() != len(actividad_ids):
+            errores['actividades_ids'] = 'Algunos IDs no corresponden a actividades activas'
+        if becario_ids and Usuario.objects.filter(id__in=becario_ids, rol='becario').count() != len(becario_ids):
+            errores['becarios_ids'] = 'Algunos IDs no corresponden a becarios válidos'
+        if errores:
+            return Response(errores, status=status.HTTP_400_BAD_REQUEST)
+
+        agregadas, quitadas = aplicar_matriz(actividad_ids, becario_ids, datos['modo'])
+        return Response({
+            'message': f'{agregadas} asignaciones agregadas y {quitadas} quitadas',
+            'modo': datos['modo'],
+            'agregadas': agregadas,
+            'quitadas': quitadas,
+        })
+
     @extend_schema(
         description="""**🎓 SOLO BECARIOS** - Ver mis actividades asignadas
         
         Retorna la lista de actividades que han sido asignadas al becario autenticado.
+        Con `?paginacion=cursor` la respuesta se pagina por cursor. Admite peticiones
+        condicionales (`If-None-Match` / `If-Modified-Since`): sin cambios responde 304.
         
         **Permisos:**
         - **Becarios:** Pueden ver sus actividades asignadas
@@ -231,6 +296,7 @@ class ActividadViewSet(viewsets.ModelViewSet):
         """
     )
     @action(detail=False, methods=['get'])
+    @condicional(versiones_actividades)
     def mis_actividades_asignadas(self, request):
         if request.user.rol != 'becario':
             return Response(
@@ -238,10 +304,54 @@ class ActividadViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        actividades = Actividad.objects.filter(becarios_asignados=request.user)
+        actividades = self.filter_queryset(
+            Actividad.objects.filter(visibilidad__usuario=request.user, visibilidad__asignada=True)
+            .select_related('creador').prefetch_related('becarios_asignados')
+        )
+
+        pagina = self.paginate_queryset(actividades)
+        if pagina is not None:
+            return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
         serializer = self.get_serializer(actividades, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        description="""**🔐 BECARIOS Y ADMINISTRADORES** - Buscar actividades
+
+        Búsqueda de texto completo en título, descripción, competencia, organización
+        y facilitador, ordenada por relevancia (BM25). Cada palabra se busca como
+        prefijo, sin distinguir mayúsculas ni acentos, y deben aparecer todas.
+
+        **Parámetros:**
+        - `q`: texto a buscar (requerido)
+        - `tipo`, `modalidad`: filtros opcionales
+        - `desde` / `hasta`: rango de `fecha` (`YYYY-MM-DD`)
+        - `limite`: número máximo de resultados (por defecto 20, máximo 100)
+
+        **Permisos:**
+        - Se aplican las mismas reglas de visibilidad que en el listado
+        """
+    )
+    @action(detail=False, methods=['get'])
+    def buscar(self, request):
+        params = request.query_params
+        texto = params.get('q', '').strip()
+        if not search.palabras(texto):
+            return Response({'error': 'El parámetro q es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filtros = search.filtros(params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(max(int(params.get('limite', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'El parámetro limite debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+        actividades = self.filter_queryset(search.buscar(self.get_queryset().filter(**filtros), texto))
+        serializer = self.get_serializer(actividades[:limite], many=True)
+        return Response(serializer.data)
+
     @extend_schema(
         description="""**👑 SOLO ADMINISTRADORES** - Quitar becarios de actividad
         
@@ -261,8 +371,7 @@ class ActividadViewSet(viewsets.ModelViewSet):
             becarios_ids = serializer.validated_data['becarios_ids']
             
             # Quitar becarios de la actividad
-            actividad.becarios_asignados.remove(*becarios_ids)
-            actividad.save()
+            aplicar_matriz([actividad.pk], becarios_ids, 'quitar')
             
             return Response({
                 'message': f'Se quitaron {len(becarios_ids)} becarios de la actividad',
@@ -0,0 +1,116 @@
+"""
+Mantenimiento del índice ``VisibilidadActividad``.
+
+``recalcular(actividad_ids)`` calcula las filas esperadas de esas actividades a
+partir de ``becarios_asignados``, ``creador``, ``en_catalogo`` e ``is_active`` y
+aplica solo la diferencia (altas, bajas y cambios) con operaciones en bloque.
+``actividades_visibles(usuario)`` es la regla de visibilidad de los endpoints.
+"""
+from django.db import transaction
+from backend import sharding
+from .models import Actividad, VisibilidadActividad
+
+TAMANO_LOTE = 500
+
+
+def actividades_visibles(usuario):
+    """Actividades que ve ``usuario``: todas las activas para administradores"""
+    if usuario.rol == 'administrador':
+        return Actividad.objects.filter(is_active=True)
+    # Becarios solo ven actividades activas que están en catálogo Y que están asignadas a ellos
+    # O que ellos mismos crearon. Desactivada, no la ve ningún becario, tampoco su creador.
+    # La regla está precalculada en VisibilidadActividad, así que es una búsqueda por índice
+    # sin OR ni DISTINCT.
+    return Actividad.objects.filter(visibilidad__usuario=usuario, visibilidad__visible=True)
+
+
+def filas_esperadas(actividades, asignaciones):
+    """
+    ``actividades``: iterable de (id, en_catalogo, is_active, creador_id)
+    ``asignaciones``: iterable de (actividad_id, usuario_id)
+    Devuelve ``{(usuario_id, actividad_id): (visible, asignada)}``.
+    """
+    info = {a_id: (en_catalogo, is_active, creador_id)
+            for a_id, en_catalogo, is_active, creador_id in actividades}
+    esperadas = {}
+    for actividad_id, usuario_id in asignaciones:
+        en_catalogo, is_active, creador_id = info[actividad_id]
+        esperadas[(usuario_id, actividad_id)] = (is_active and (en_catalogo or usuario_id == creador_id), True)
+    for actividad_id, (_, is_active, creador_id) in info.items():
+        clave = (creador_id, actividad_id)
+        if clave not in esperadas:
+            esperadas[clave] = (is_active, False)
+    return esperadas
+
+
+def recalcular(actividad_ids):
+    """Sincroniza las filas de visibilidad de las actividades indicadas"""
+    actividad_ids = list(set(actividad_ids))
+    if not actividad_ids:
+        return
+
+    Asignacion = Actividad.becarios_asignados.through
+    with transaction.atomic(using=sharding.alias_actual()):
+        for inicio in range(0, len(actividad_ids), TAMANO_LOTE):
+            lote = actividad_ids[inicio:inicio + TAMANO_LOTE]
+            actividades = Actividad.objects.filter(id__in=lote).values_list(
+                'id', 'en_catalogo', 'is_active', 'creador_id'
+            )
+            asignaciones = Asignacion.objects.filter(actividad_id__in=lote).values_list(
+                'actividad_id', 'usuario_id'
+            )
+            _aplicar(
+                filas_esperadas(actividades, asignaciones),
+                VisibilidadActividad.objects.filter(actividad_id__in=lote),
+            )
+
+
+def _aplicar(esperadas, existentes_qs):
+    existentes = {
+        (usuario_id, actividad_id): (pk, visible, asignada)
+        for pk, usuario_id, actividad_id, visible, asignada in existentes_qs.values_list(
+            'id', 'usuario_id', 'actividad_id', 'visible', 'asignada'
+        )
+    }
+
+    sobrantes = [pk for clave, (pk, _, _) in existentes.items() if clave not in esperadas]
+    for inicio in range(0, len(sobrantes), TAMANO_LOTE):
+        VisibilidadActividad.objects.filter(id__in=sobrantes[inicio:inicio + TAMANO_LOTE]).delete()
+
+    nuevas, cambiadas = [], []
+    for (usuario_id, actividad_id), (visible, asignada) in esperadas.items():
+        actual = existentes.get((usuario_id, actividad_id))
+        if actual is None:
+            nuevas.append(VisibilidadActividad(
+                usuario_id=usuario_id, actividad_id=actividad_id, visible=visible, asignada=asignada
+            ))
+        elif actual[1:] != (visible, asignada):
+            cambiadas.append(VisibilidadActividad(
+                id=actual[0], usuario_id=usuario_id, actividad_id=actividad_id,
+                visible=visible, asignada=asignada
+            ))
+
+    VisibilidadActividad.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+    VisibilidadActividad.objects.bulk_update(cambiadas, ['visible', 'asignada'], batch_size=TAMANO_LOTE)
+    return len(nuevas), len(cambiadas), len(sobrantes)
+
+
+def reconstruir(stdout=None):
+    """Reconstruye todo el índice. Devuelve (altas, cambios, bajas)"""
+    totales = [0, 0, 0]
+    ids = list(Actividad.objects.order_by('id').values_list('id', flat=True))
+    Asignacion = Actividad.becarios_asignados.through
+    with transaction.atomic(using=sharding.alias_actual()):
+        # Filas huérfanas (no debería haberlas por el CASCADE, pero por si acaso)
+        VisibilidadActividad.objects.exclude(actividad_id__in=Actividad.objects.values('id')).delete()
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio:inicio + TAMANO_LOTE]
+            resultado = _aplicar(
+                filas_esperadas(
+                    Actividad.objects.filter(id__in=lote).values_list('id', 'en_catalogo', 'is_active', 'creador_id'),
+                    Asignacion.objects.filter(actividad_id__in=lote).values_list('actividad_id', 'usuario_id'),
+                ),
+                VisibilidadActividad.objects.filter(actividad_id__in=lote),
+            )
+            totales = [t + r for t, r in zip(totales, resultado)]
+    return tuple(totales)
@@ -0,0 +1,100 @@
+"""
+Peticiones condicionales (``ETag`` / ``Last-Modified``) para endpoints de lectura.
+
+El frontend consulta periódicamente ``mi_perfil``, ``mi_progreso``,
+``mis_actividades_asignadas`` y el listado de actividades. Cada respuesta
+depende de unas pocas *marcas* ``(valor, fecha)`` que se leen de la base de
+datos, así que todos los procesos calculan el mismo ``ETag`` sin estado
+compartido:
+
+- ``marca_actividades()``: el último cambio de actividades del registro de
+  sincronización (``sync.Cambio``). Los triggers apuntan ahí altas,
+  modificaciones, asignaciones y cambios de nombre del creador, incluidos
+  los hechos con ``queryset.update()`` o SQL directo.
+- ``marca_campos(instancia, campos)``: huella de los campos que se
+  serializan, p. ej. los del perfil en ``request.user``. No tiene fecha.
+- ``mi_progreso`` usa el ``fecha_actualizacion`` más reciente del libro de
+  progreso y las metas del usuario (``progress/views.py``).
+
+``@condicional(validadores)`` calcula el ``ETag`` a partir de esas marcas,
+del usuario y de la query string, y responde 304 sin ejecutar la vista ni
+serializar nada si el cliente envía ``If-None-Match`` (o ``If-Modified-Since``)
+y no ha cambiado. ``Last-Modified`` es la fecha más reciente, con resolución
+de segundos, y solo se envía si todas las marcas tienen fecha; ``ETag`` es
+exacto y tiene prioridad. Si un validador devuelve ``None`` (p. ej. sin los
+triggers de ``sync`` fuera de SQLite) la vista responde sin validadores.
+"""
+import functools
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from backend import sharding
+
+
+def marca_actividades():
+    """Último cambio de actividades y asignaciones del shard actual, o ``None`` sin registro de cambios"""
+    from sync.changes import disponible
+    from sync.models import Cambio
+
+    if not disponible(sharding.alias_actual()):
+        return None
+    # Índice (entidad, id): una sola fila leída desde el final
+    ultimo = Cambio.objects.filter(entidad=Cambio.ACTIVIDAD).order_by('-id').values_list('id', 'fecha').first()
+    return ultimo or (0, None)
+
+
+def marca_campos(instancia, campos):
+    """Huella de los valores de ``campos`` en ``instancia`` (sin fecha)"""
+    valores = '|'.join(repr(getattr(instancia, campo, None)) for campo in campos)
+    return hashlib.md5(valores.encode()).hexdigest(), None
+
+
+def etag(request, marcas):
+    """ETag de la respuesta para ``request.user``: no requiere renderizar el cuerpo"""
+    partes = [
+        sharding.alias_actual(), str(request.user.pk), *(str(valor) for valor, _ in marcas),
+        request.META.get('QUERY_STRING', ''), getattr(request, 'accepted_media_type', '') or '',
+    ]
+    return quote_etag(hashlib.md5('|'.join(partes).encode()).hexdigest())
+
+
+def ultima_modificacion(marcas):
+    """Timestamp de la marca más reciente, o ``None`` si alguna no tiene fecha"""
+    fechas = [fecha for _, fecha in marcas]
+    if not fechas or None in fechas:
+        return None
+    return int(max(fechas).timestamp())
+
+
+def condicional(validadores):
+    """
+    Decorador para acciones de lectura de un ViewSet. ``validadores(view, request)``
+    devuelve las marcas ``(valor, fecha)`` de las que depende la respuesta, o
+    ``None`` si no se puede validar.
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return metodo(self, request, *args, **kwargs)
+
+            marcas = validadores(self, request)
+            if marcas is None or None in marcas:
+                return metodo(self, request, *args, **kwargs)
+            valor_etag = etag(request, marcas)
+            modificacion = ultima_modificacion(marcas)
+
+            respuesta = get_conditional_response(request, etag=valor_etag, last_modified=modificacion)
+            if respuesta is None:
+                respuesta = metodo(self, request, *args, **kwargs)
+            if respuesta.status_code not in (200, 304):
+                return respuesta
+            respuesta.headers['ETag'] = valor_etag
+            if modificacion is not None:
+                respuesta.headers['Last-Modified'] = http_date(modificacion)
+            # El cliente guarda la respuesta pero la revalida en cada consulta
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            patch_vary_headers(respuesta, ('Authorization',))
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,175 @@
+"""
+Campos dispersos (``?fields=``) y expansión de relaciones (``?expand=``).
+
+Por defecto los serializers devuelven solo columnas propias e ids de las
+relaciones. Las relaciones anidadas se declaran en ``Meta.expandable_fields``
+y solo se incluyen si el cliente las pide::
+
+    GET /api/records/registros-horas/?expand=actividad_detalle
+    GET /api/records/registros-horas/?expand=actividad_detalle.becarios_asignados_info
+    GET /api/activities/actividades/?fields=id,titulo,fecha
+
+Ambos parámetros aceptan listas separadas por comas y rutas con puntos para
+llegar a serializers anidados (``fields=id,actividad_detalle.titulo``).
+
+``ExpandableViewMixin`` deriva de la expansión pedida los ``select_related`` /
+``prefetch_related`` necesarios, de modo que expandir no añade consultas por
+fila y no expandir no paga joins ni prefetches innecesarios. Las relaciones que
+un serializer necesita aunque no se expanda nada se declaran en
+``Meta.select_related_fields`` / ``Meta.prefetch_related_fields``.
+"""
+from django.db.models import ForeignObjectRel
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+EXPAND_PARAM = 'expand'
+FIELDS_PARAM = 'fields'
+
+
+def parsear_rutas(valor):
+    """``"a,b.c,b.d"`` -> ``{'a': {}, 'b': {'c': {}, 'd': {}}}``"""
+    arbol = {}
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    for ruta in valor or []:
+        nodo = arbol
+        for parte in ruta.strip().split('.'):
+            if parte:
+                nodo = nodo.setdefault(parte, {})
+    return arbol
+
+
+def _resolver_serializer(clase):
+    return import_string(clase) if isinstance(clase, str) else clase
+
+
+class ExpandableFieldsMixin:
+    """
+    Mixin para serializers con campos dispersos y relaciones expandibles.
+
+    ``Meta.expandable_fields`` mapea el nombre del campo a
+    ``(serializer o ruta 'app.serializers.Clase', kwargs)``. Los serializers
+    anidados reciben su parte de ``expand``/``fields`` por argumento; solo el
+    serializer raíz lee los query params de la petición.
+    """
+
+    def __init__(self, *args, expand=None, fields=None, **kwargs):
+        self._expansion = parsear_rutas(expand) if expand is not None else None
+        self._campos_solicitados = parsear_rutas(fields) if fields is not None else None
+        super().__init__(*args, **kwargs)
+
+    def _es_raiz(self):
+        padre = self.parent
+        if isinstance(padre, serializers.ListSerializer):
+            padre = padre.parent
+        return padre is None
+
+    def _opciones(self):
+        expand, fields = self._expansion, self._campos_solicitados
+        request = self.context.get('request')
+        if request is not None and self._es_raiz():
+            params = getattr(request, 'query_params', request.GET)
+            if expand is None:
+                expand = parsear_rutas(params.get(EXPAND_PARAM, ''))
+            if fields is None and params.get(FIELDS_PARAM):
+                fields = parsear_rutas(params.get(FIELDS_PARAM))
+        return expand or {}, fields
+
+    @classmethod
+    def campos_expandibles(cls):
+        return getattr(getattr(cls, 'Meta', None), 'expandable_fields', {})
+
+    def get_fields(self):
+        campos = super().get_fields()
+        expand, fields = self._opciones()
+
+        for nombre, (clase, kwargs) in self.campos_expandibles().items():
+            if nombre not in expand:
+                continue
+            hijos_fields = fields.get(nombre) if fields else None
+            campos[nombre] = _resolver_serializer(clase)(
+                expand=_a_rutas(expand[nombre]),
+                fields=_a_rutas(hijos_fields) if hijos_fields else None,
+                **{'read_only': True, **kwargs}
+            )
+
+        if fields:
+            # Los campos expandidos se incluyen aunque no aparezcan en ``fields``
+            permitidos = set(fields) | set(expand)
+            campos = {nombre: campo for nombre, campo in campos.items() if nombre in permitidos}
+        return campos
+
+
+def _a_rutas(arbol, prefijo=''):
+    """Inversa de ``parsear_rutas``: ``{'b': {'c': {}}}`` -> ``['b.c']``"""
+    rutas = []
+    for nombre, hijos in arbol.items():
+        ruta = f'{prefijo}{nombre}'
+        if hijos:
+            rutas.extend(_a_rutas(hijos, f'{ruta}.'))
+        else:
+            rutas.append(ruta)
+    return rutas
+
+
+def relaciones_para(serializer_class, model, expand, prefijo='', en_prefetch=False):
+    """
+    Calcula ``(select_related, prefetch_related)`` para ``serializer_class``
+    según el árbol ``expand``. Las relaciones a uno se unen con JOIN mientras
+    el camino no pase por una relación a muchos; a partir de ahí se prefetchean.
+    """
+    select, prefetch = [], []
+    for nombre, (clase, kwargs) in getattr(serializer_class, 'campos_expandibles', dict)().items():
+        if nombre not in expand:
+            continue
+        source = kwargs.get('source', nombre)
+        try:
+            campo = model._meta.get_field(source)
+        except Exception:
+            continue
+        a_muchos = campo.many_to_many or campo.one_to_many or (
+            isinstance(campo, ForeignObjectRel) and campo.multiple
+        )
+        ruta = f'{prefijo}{source}'
+        prefetchear = en_prefetch or a_muchos
+        (prefetch if prefetchear else select).append(ruta)
+
+        # Relaciones que el serializer anidado usa siempre (p. ej. ``creador_nombre``)
+        hijo = _resolver_serializer(clase)
+        meta = getattr(hijo, 'Meta', None)
+        for relacion in getattr(meta, 'select_related_fields', []):
+            (prefetch if prefetchear else select).append(f'{ruta}__{relacion}')
+        for relacion in getattr(meta, 'prefetch_related_fields', []):
+            prefetch.append(f'{ruta}__{relacion}')
+
+        sub_select, sub_prefetch = relaciones_para(
+            hijo, campo.related_model, expand[nombre],
+            prefijo=f'{ruta}__', en_prefetch=prefetchear
+        )
+        select.extend(sub_select)
+        prefetch.extend(sub_prefetch)
+    return select, prefetch
+
+
+class ExpandableViewMixin:
+    """
+    Mixin para vistas que optimiza el queryset según ``?expand=``.
+
+    Las vistas genéricas lo aplican en ``filter_queryset``; las acciones que
+    construyen su propio queryset deben pasarlo por ``self.filter_queryset``.
+    """
+
+    def expansion_solicitada(self):
+        return parsear_rutas(self.request.query_params.get(EXPAND_PARAM, ''))
+
+    def optimizar_queryset(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        select, prefetch = relaciones_para(serializer_class, queryset.model, self.expansion_solicitada())
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        return self.optimizar_queryset(super().filter_queryset(queryset))
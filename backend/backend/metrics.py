@@ -0,0 +1,264 @@
+"""
+Métricas por endpoint: latencia, consultas, tiempo de base de datos y tamaño de respuesta.
+
+``MetricasMiddleware`` mide cada petición y la agrega en histogramas en memoria
+(por proceso) bajo la etiqueta de la vista resuelta, p. ej.
+``ProgressViewSet.progreso_general``. ``MetricasView`` las expone en formato
+de texto de Prometheus para administradores (``GET /api/metrics/``).
+
+Configuración en ``settings.METRICAS``:
+
+- ``HEADERS``: añade ``Server-Timing`` y ``X-Query-Count`` a las respuestas.
+- ``QUERY_BUDGETS``: máximo de consultas por endpoint; ``'*'`` aplica a los
+  que no aparecen. Las peticiones que lo superan se registran en el log
+  ``backend.metrics`` y en el contador ``http_query_budget_exceeded_total``.
+
+Las respuestas en streaming se miden hasta que la vista devuelve la respuesta:
+las consultas y bytes emitidos al recorrer el contenido no se cuentan.
+
+Las consultas se cuentan con un ``execute_wrapper`` fijo en cada conexión que
+suma al contador de la petición en curso, guardado en un ``ContextVar``: así
+cuentan también las de ``sync_to_async`` bajo ASGI y las de los hilos de
+``sharding.en_todos``, que heredan el contexto de la petición. El middleware
+funciona en modo síncrono y asíncrono.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework.views import APIView
+from users.permissions import IsAdministrador
+
+logger = logging.getLogger(__name__)
+
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# nombre -> (ayuda, límites de los buckets)
+HISTOGRAMAS = {
+    'http_request_duration_seconds': ('Latencia de la petición', SEGUNDOS),
+    'http_request_db_queries': ('Consultas SQL por petición', CONSULTAS),
+    'http_request_db_duration_seconds': ('Tiempo en la base de datos por petición', SEGUNDOS),
+    'http_response_size_bytes': ('Tamaño del cuerpo de la respuesta', BYTES),
+}
+
+SIN_RESOLVER = 'sin_resolver'
+
+# Contador de consultas de la petición en curso
+_contador = ContextVar('contador_consultas', default=None)
+
+
+def configuracion():
+    return {'HEADERS': False, 'QUERY_BUDGETS': {}, **getattr(settings, 'METRICAS', {})}
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.buckets = [0] * (len(limites) + 1)
+        self.suma = 0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        self.buckets[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+
+class RegistroMetricas:
+    """Histogramas y contadores por endpoint, protegidos por un lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limpiar()
+
+    def limpiar(self):
+        with self._lock:
+            self._histogramas = {nombre: {} for nombre in HISTOGRAMAS}
+            self._respuestas = {}
+            self._excesos = {}
+
+    def observar(self, endpoint, status, duracion, consultas, duracion_db, tamano, exceso):
+        with self._lock:
+            valores = {
+                'http_request_duration_seconds': duracion,
+                'http_request_db_queries': consultas,
+                'http_request_db_duration_seconds': duracion_db,
+                'http_response_size_bytes': tamano,
+            }
+            for nombre, valor in valores.items():
+                if valor is None:
+                    continue
+                por_endpoint = self._histogramas[nombre]
+                if endpoint not in por_endpoint:
+                    por_endpoint[endpoint] = Histograma(HISTOGRAMAS[nombre][1])
+                por_endpoint[endpoint].observar(valor)
+            clave = (endpoint, status)
+            self._respuestas[clave] = self._respuestas.get(clave, 0) + 1
+            if exceso:
+                self._excesos[endpoint] = self._excesos.get(endpoint, 0) + 1
+
+    def prometheus(self):
+        lineas = []
+        with self._lock:
+            for nombre, (ayuda, limites) in HISTOGRAMAS.items():
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+                for endpoint, h in sorted(self._histogramas[nombre].items()):
+                    acumulado = 0
+                    for limite, n in zip(limites + ('+Inf',), h.buckets):
+                        acumulado += n
+                        lineas.append(f'{nombre}_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+                    lineas.append(f'{nombre}_sum{{endpoint="{endpoint}"}} {h.suma:g}')
+                    lineas.append(f'{nombre}_count{{endpoint="{endpoint}"}} {h.cuenta}')
+
+            lineas += ['# HELP http_responses_total Respuestas por endpoint y código',
+                       '# TYPE http_responses_total counter']
+            for (endpoint, status), n in sorted(self._respuestas.items()):
+                lineas.append(f'http_responses_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+
+            lineas += ['# HELP http_query_budget_exceeded_total Peticiones por encima del presupuesto de consultas',
+                       '# TYPE http_query_budget_exceeded_total counter']
+            for endpoint, n in sorted(self._excesos.items()):
+                lineas.append(f'http_query_budget_exceeded_total{{endpoint="{endpoint}"}} {n}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+
+def nombre_endpoint(request, view_func):
+    """``Clase.accion`` para ViewSets, ``Clase`` para APIView y el nombre de la función en el resto"""
+    clase = getattr(view_func, 'cls', None)
+    if clase is None:
+        return getattr(view_func, '__name__', SIN_RESOLVER)
+    acciones = getattr(view_func, 'actions', None)
+    if acciones:
+        accion = acciones.get(request.method.lower())
+        if accion:
+            return f'{clase.__name__}.{accion}'
+    return clase.__name__
+
+
+class ContadorConsultas:
+    """Consultas y su duración en una petición; pueden sumar varios hilos a la vez"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.duracion = 0.0
+
+    def sumar(self, duracion):
+        with self._lock:
+            self.duracion += duracion
+            self.consultas += 1
+
+
+def contar_consultas(execute, sql, params, many, context):
+    """``execute_wrapper`` de todas las conexiones (funciona con DEBUG=False)"""
+    contador = _contador.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        contador.sumar(time.perf_counter() - inicio)
+
+
+def instalar_contador(sender=None, connection=None, **kwargs):
+    if contar_consultas not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_consultas)
+
+
+def instalar_en_conexiones():
+    """Instala el contador en las conexiones ya creadas en el hilo actual (son por hilo)"""
+    for alias in connections:
+        instalar_contador(connection=connections[alias])
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Las conexiones nuevas lo reciben al abrirse; las ya creadas, aquí y en process_view
+        connection_created.connect(instalar_contador, dispatch_uid='backend.metrics.instalar_contador')
+        instalar_en_conexiones()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request._endpoint_metricas = SIN_RESOLVER
+        contador = ContadorConsultas()
+        token = _contador.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _contador.reset(token)
+        return self.registrar(request, response, contador, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        request._endpoint_metricas = SIN_RESOLVER
+        contador = ContadorConsultas()
+        token = _contador.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _contador.reset(token)
+        return self.registrar(request, response, contador, time.perf_counter() - inicio)
+
+    def registrar(self, request, response, contador, duracion):
+        endpoint = request._endpoint_metricas
+        config = configuracion()
+        presupuestos = config['QUERY_BUDGETS']
+        presupuesto = presupuestos.get(endpoint, presupuestos.get('*'))
+        exceso = presupuesto is not None and contador.consultas > presupuesto
+        if exceso:
+            logger.warning('%s %s (%s): %d consultas, presupuesto %d',
+                           request.method, request.path, endpoint, contador.consultas, presupuesto)
+
+        tamano = None if response.streaming else len(response.content)
+        registro.observar(endpoint, response.status_code, duracion, contador.consultas,
+                          contador.duracion, tamano, exceso)
+
+        if config['HEADERS']:
+            response['Server-Timing'] = (
+                f'app;dur={duracion * 1000:.1f}, db;dur={contador.duracion * 1000:.1f}'
+            )
+            response['X-Query-Count'] = str(contador.consultas)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Con ASGI se ejecuta en el hilo de las vistas síncronas, que no es el de __init__
+        instalar_en_conexiones()
+        request._endpoint_metricas = nombre_endpoint(request, view_func)
+
+
+class MetricasView(APIView):
+    """Métricas del proceso en formato de texto de Prometheus (solo administradores)"""
+    permission_classes = [IsAdministrador]
+
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Métricas por endpoint
+
+        Histogramas de latencia, consultas SQL, tiempo de base de datos y tamaño de
+        respuesta por vista, en formato de texto de Prometheus. Son por proceso.
+        """,
+        responses={(200, 'text/plain'): OpenApiTypes.STR}
+    )
+    def get(self, request):
+        return HttpResponse(registro.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,186 @@
+"""
+Paginación por cursor (keyset) opcional para los endpoints de listado.
+
+Por compatibilidad con el frontend los listados siguen devolviendo la lista
+completa salvo que el cliente la pida paginada con ``?paginacion=cursor``.
+En ese modo la respuesta es ``{"next", "previous", "results"}`` y cada página
+se obtiene filtrando por la última clave vista, por ejemplo
+``(fecha_registro, id) < (f, i)``, de modo que la página N cuesta lo mismo que
+la primera siempre que exista un índice compuesto sobre esas columnas.
+
+Cada vista declara su clave con ``keyset_ordering``; el último campo debe ser
+único (normalmente ``id``) para que el orden sea total.
+
+Los listados que mezclan varios shards (``sharding.ResultadosFusionados``) no
+admiten cursor y se paginan por número de página con ``FusionadaPagination``.
+"""
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    activar_query_param = 'paginacion'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if not self.esta_activa(request):
+            return None
+
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        valores, self.reverso = self.decodificar_cursor(request, queryset.model)
+
+        orden = self.ordering
+        if self.reverso:
+            orden = tuple(self._invertir(campo) for campo in orden)
+        queryset = queryset.order_by(*orden)
+        if valores is not None:
+            queryset = queryset.filter(self._filtro_despues_de(orden, valores))
+
+        # Se pide un elemento extra para saber si hay más páginas
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+
+        if self.reverso:
+            resultados.reverse()
+            self.hay_siguiente = valores is not None
+            self.hay_anterior = hay_mas
+        else:
+            self.hay_siguiente = hay_mas
+            self.hay_anterior = valores is not None
+
+        self.pagina = resultados
+        return resultados
+
+    def esta_activa(self, request):
+        params = request.query_params
+        return params.get(self.activar_query_param) == 'cursor' or self.cursor_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.hay_siguiente or not self.pagina:
+            return None
+        return self._enlace(self.pagina[-1], reverso=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if not self.pagina:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._enlace(self.pagina[0], reverso=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.activar_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Usar "cursor" para paginar la respuesta por cursor',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor devuelto en "next" o "previous"',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Elementos por página (máximo {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    # -- Cursor -----------------------------------------------------------------
+
+    @staticmethod
+    def _invertir(campo):
+        return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+    @staticmethod
+    def _filtro_despues_de(orden, valores):
+        """Comparación lexicográfica ``(c1, c2, ...) > (v1, v2, ...)`` según la dirección de cada campo"""
+        filtro = Q()
+        iguales = {}
+        for campo, valor in zip(orden, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        return filtro
+
+    def _enlace(self, instancia, reverso):
+        valores = []
+        for campo in self.ordering:
+            valor = getattr(instancia, campo.lstrip('-'))
+            valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        contenido = json.dumps({'v': valores, 'r': int(reverso)}, default=str)
+        cursor = base64.urlsafe_b64encode(contenido.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decodificar_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            contenido = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            valores = contenido['v']
+            if len(valores) != len(self.ordering):
+                raise ValueError
+            valores = [
+                model._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(self.ordering, valores)
+            ]
+            return valores, bool(contenido.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class FusionadaPagination(PageNumberPagination):
+    """Paginación por número de página (``?page=`` / ``?page_size=``) de resultados de varios shards"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,63 @@
+"""
+Utilidades para inspeccionar planes de consulta (``EXPLAIN QUERY PLAN`` en SQLite).
+
+``PlanConsultasMixin`` se usa en los tests: ejecuta una petición, captura las
+consultas que hace y falla si alguna recorre entera una tabla que debería
+resolverse por índice (``SCAN tabla`` sin ``USING INDEX``).
+"""
+import re
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# "SCAN tabla" o "SCAN tabla AS alias", sin índice
+ESCANEO_COMPLETO = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# Subconsultas que SQLite evalúa aparte; recorrer su resultado no es leer una tabla
+SUBCONSULTA = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)')
+
+
+def explicar(sql, params=()):
+    """Devuelve el detalle de cada paso del plan de ``sql``"""
+    prefijo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefijo + sql, params)
+        return [fila[-1] for fila in cursor.fetchall()]
+
+
+def explicar_queryset(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return explicar(sql, params)
+
+
+def escaneos_completos(plan):
+    """Tablas recorridas enteras según ``plan``"""
+    subconsultas = {m.group(1) for m in map(SUBCONSULTA.match, plan) if m}
+    return [m.group(1) for m in map(ESCANEO_COMPLETO.match, plan) if m and m.group(1) not in subconsultas]
+
+
+class PlanConsultasMixin:
+    """Mixin para ``TestCase`` con aserciones sobre el plan de las consultas"""
+
+    def assertSinEscaneosCompletos(self, realizar, permitidas=()):
+        """
+        Ejecuta ``realizar()`` y comprueba el plan de cada SELECT emitido.
+        ``permitidas`` son tablas que la consulta recorre enteras a propósito
+        (p. ej. un agregado global). Devuelve el resultado de ``realizar()``.
+        """
+        if connection.vendor != 'sqlite':
+            self.skipTest('Los planes esperados son los del planificador de SQLite')
+
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = realizar()
+
+        errores = []
+        for consulta in contexto.captured_queries:
+            sql = consulta['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = explicar(sql)
+            tablas = [t for t in escaneos_completos(plan) if t not in permitidas]
+            if tablas:
+                errores.append(f'{", ".join(tablas)}:\n  {sql}\n  ' + '\n  '.join(plan))
+        if errores:
+            self.fail('Consultas con escaneo completo:\n' + '\n'.join(errores))
+        return resultado
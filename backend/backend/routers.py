@@ -0,0 +1,137 @@
+"""
+Réplica de lectura para SQLite.
+
+Si ``DB_REPLICA`` apunta a un fichero (ver settings), existe el alias
+``replica``: una copia del primario que ``manage.py refresh_replica`` refresca
+con la API de backup en línea de SQLite.
+
+``ReplicaMiddleware`` decide por petición dónde leen los modelos:
+
+- las peticiones seguras (GET, HEAD, OPTIONS) leen de la réplica;
+- las escrituras van siempre al primario (``LecturaEscrituraRouter``);
+- tras una petición de escritura, el mismo cliente (cabecera ``Authorization``)
+  vuelve a leer del primario hasta que la réplica se refresque después de esa
+  escritura (read-your-writes). La marca de la escritura se guarda en el alias
+  ``escrituras`` de ``CACHES``, compartido por todos los procesos: la siguiente
+  lectura puede llegar a otro worker;
+- si la réplica no existe o su última copia tiene más de ``REPLICA['MAX_LAG']``
+  segundos, se lee del primario.
+
+Los tokens, la lista de revocación de los tokens firmados y la ubicación de
+los usuarios siempre se leen del primario para que un login, una revocación o
+un alta recientes se vean en la siguiente petición.
+"""
+import hashlib
+import os
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+ALIAS_REPLICA = 'replica'
+
+# Modelos que deben leerse siempre actualizados
+SIEMPRE_PRIMARIA = {'authtoken.Token', 'users.RevocacionToken', 'users.UbicacionUsuario'}
+
+_usar_replica = ContextVar('usar_replica', default=False)
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def configuracion():
+    return {'MAX_LAG': 300, **getattr(settings, 'REPLICA', {})}
+
+
+def ruta_marca(nombre):
+    """Fichero cuyo mtime es el instante de la última copia de la réplica ``nombre``"""
+    return f'{nombre}.sync'
+
+
+def replica_actualizada():
+    """Instante (epoch) de la copia de la réplica, o ``None`` si no está configurada o no existe"""
+    replica = settings.DATABASES.get(ALIAS_REPLICA)
+    if not replica:
+        return None
+    try:
+        return os.path.getmtime(ruta_marca(replica['NAME']))
+    except OSError:
+        return None
+
+
+def _escrituras():
+    return caches['escrituras']
+
+
+def clave_cliente(request):
+    autorizacion = request.META.get('HTTP_AUTHORIZATION')
+    if not autorizacion:
+        return None
+    return 'replica:escritura:' + hashlib.sha256(autorizacion.encode()).hexdigest()
+
+
+class LecturaEscrituraRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label in SIEMPRE_PRIMARIA:
+            return 'default'
+        return ALIAS_REPLICA if _usar_replica.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambos alias contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema con cada copia
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contexto = _usar_replica.set(self.usar_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _usar_replica.reset(contexto)
+        self.recordar_escritura(request)
+        return response
+
+    async def __acall__(self, request):
+        contexto = _usar_replica.set(self.usar_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _usar_replica.reset(contexto)
+        self.recordar_escritura(request)
+        return response
+
+    @staticmethod
+    def usar_replica(request):
+        if request.method not in METODOS_SEGUROS:
+            return False
+        copia = replica_actualizada()
+        if copia is None or time.time() - copia > configuracion()['MAX_LAG']:
+            return False
+        clave = clave_cliente(request)
+        ultima_escritura = _escrituras().get(clave) if clave else None
+        return ultima_escritura is None or ultima_escritura < copia
+
+    @staticmethod
+    def recordar_escritura(request):
+        clave = clave_cliente(request)
+        if request.method not in METODOS_SEGUROS and clave:
+            # Pasado MAX_LAG la réplica o ya incluye la escritura o se considera obsoleta
+            max_lag = configuracion()['MAX_LAG']
+            _escrituras().set(clave, time.time(), max_lag)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,20 +47,74 @@ INSTALLED_APPS = [
     'activities',
     'records',
     'progress',
+    'sync',
 ]
 AUTH_USER_MODEL = 'users.Usuario'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication con caché en proceso de token -> usuario (users/authentication.py)
+        'users.authentication.CachedTokenAuthentication',
     ],
+    # Caché de CachedTokenAuthentication: TTL en segundos y número máximo de tokens (LRU).
+    # TTL = 0 desactiva la caché.
+    'TOKEN_CACHE': {
+        'TTL': 60,
+        'MAX_ENTRIES': 10000,
+    },
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Paginación por cursor opcional (?paginacion=cursor), ver backend/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.KeysetPagination',
     # Use drf-spectacular for the OpenAPI schema generation
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Tokens de acceso firmados (users/tokens.py): con AUTH_SIGNED_TOKENS=1 el login emite
+# tokens HMAC con usuario, rol y caducidad que se verifican sin consultar la base de datos.
+# TTL: validez en segundos. REFRESCO: segundos entre recargas de la lista de revocación.
+TOKENS_FIRMADOS = {
+    'ACTIVO': os.environ.get('AUTH_SIGNED_TOKENS', '').lower() in ('1', 'true', 'yes'),
+    'TTL': 24 * 3600,
+    'REFRESCO': 30,
+}
+
+# Login y recuperación de contraseña (acciones públicas, users/throttling.py): cubos de tokens
+# en memoria por IP y por cuenta (email o user_id). CAPACIDAD: ráfaga máxima;
+# RECARGA: intentos recuperados por segundo. Al agotarse se responde 429.
+THROTTLING_PUBLICO = {
+    'ACTIVO': True,
+    'IP': {'CAPACIDAD': 30, 'RECARGA': 0.5},
+    'CUENTA': {'CAPACIDAD': 10, 'RECARGA': 0.1},
+    'MAX_ENTRIES': 100000,
+}
+
+# Pool de hilos del login asíncrono (users/hashing.py): hashes simultáneos y máximo en espera (503 al superarlo)
+HASHING_ASYNC = {
+    'WORKERS': int(os.environ.get('HASHING_WORKERS', 4)),
+    'MAX_PENDIENTES': 64,
+}
+
+# Login por email con una sola consulta (users/backends.py); ModelBackend sigue atendiendo el admin
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Métricas por endpoint (backend/metrics.py), expuestas en /api/metrics/.
+# HEADERS añade Server-Timing y X-Query-Count a las respuestas.
+# QUERY_BUDGETS: consultas máximas por endpoint ('*' = resto); los excesos se registran en el log.
+METRICAS = {
+    'HEADERS': DEBUG,
+    'QUERY_BUDGETS': {
+        '*': 30,
+        'ProgressViewSet.progreso_general': 10,
+        'ProgressViewSet.mi_progreso': 10,
+        'RegistroHorasViewSet.aprobar_rechazar_lote': 20,
+    },
+}
+
 # drf-spectacular settings (optional tweaks)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Software-2 API',
@@ -68,6 +124,8 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    # Primero para medir la petición completa (backend/metrics.py)
+    'backend.metrics.MetricasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -109,6 +167,111 @@ DATABASES = {
     }
 }
 
+# Perfil de base de datos: DB_PROFILE=production activa el perfil de SQLite
+# para escrituras concurrentes (ver backend/sqlite.py): WAL y demás pragmas por
+# conexión, transacciones IMMEDIATE y conexiones persistentes.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'development')
+
+from backend.sqlite import PRAGMAS_PRODUCCION  # noqa: E402  (registra la señal connection_created)
+
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = PRAGMAS_PRODUCCION
+    DATABASES['default'].update({
+        # Solo útil con workers WSGI: bajo ASGI cada petición usa un hilo nuevo y
+        # las conexiones persistentes no se reutilizan (ponerlo a 0 en ese caso).
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # transaction.atomic() empieza con BEGIN IMMEDIATE: las vistas de escritura
+            # (registros, aprobaciones, actividades) toman el lock al empezar
+            'transaction_mode': 'IMMEDIATE',
+            # Segundos de espera del driver ante un lock (equivale a busy_timeout)
+            'timeout': 5,
+        },
+    })
+
+# Réplica de lectura (backend/routers.py): DB_REPLICA=/ruta/replica.sqlite3 crea el
+# alias ``replica``, al que van las lecturas de las peticiones GET. Se refresca
+# con ``manage.py refresh_replica``. MAX_LAG: segundos tras los que una copia se
+# considera obsoleta y se vuelve a leer del primario.
+DB_REPLICA = os.environ.get('DB_REPLICA')
+REPLICA = {
+    'MAX_LAG': int(os.environ.get('DB_REPLICA_MAX_LAG', 300)),
+}
+if DB_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['backend.routers.LecturaEscrituraRouter']
+    MIDDLEWARE.insert(MIDDLEWARE.index('backend.metrics.MetricasMiddleware') + 1, 'backend.routers.ReplicaMiddleware')
+
+# Sharding por universidad (backend/sharding.py): DB_SHARDS=alias=/ruta.sqlite3,alias2=/ruta2.sqlite3
+# crea un alias por shard. DB_SHARD_UNIVERSIDADES=UCV=alias,USB=alias2 fija universidades
+# concretas; el resto se reparte por hash. ``default`` guarda la tabla global de ubicación
+# y a los usuarios sin universidad. Cada shard se migra con ``migrate --database <alias>``.
+DB_SHARDS = os.environ.get('DB_SHARDS')
+SHARDING = {'ALIASES': [], 'UNIVERSIDADES': {}, 'GLOBAL': 'default'}
+if DB_SHARDS:
+    for entrada in DB_SHARDS.split(','):
+        alias, _, nombre = entrada.strip().partition('=')
+        DATABASES[alias] = {**DATABASES['default'], 'NAME': nombre}
+        SHARDING['ALIASES'].append(alias)
+    SHARDING['UNIVERSIDADES'] = dict(
+        entrada.strip().split('=', 1)
+        for entrada in os.environ.get('DB_SHARD_UNIVERSIDADES', '').split(',') if entrada.strip()
+    )
+    DATABASE_ROUTERS = ['backend.sharding.ShardRouter'] + (['backend.routers.LecturaEscrituraRouter'] if DB_REPLICA else [])
+    MIDDLEWARE.insert(MIDDLEWARE.index('backend.metrics.MetricasMiddleware') + 1, 'backend.sharding.ShardMiddleware')
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# ``progress`` guarda las respuestas por usuario de mi_progreso e historial
+# (ver progress/cache.py). LocMemCache desaloja por LRU al llegar a MAX_ENTRIES;
+# CULL_FREQUENCY=10 elimina el 10% menos usado en cada desalojo.
+# ``versiones`` guarda las versiones con las que se invalidan esas respuestas.
+# Tienen que verlas todos los procesos (gunicorn con varios workers): con
+# SQLite todos corren en la misma máquina, así que basta un directorio común.
+# ``escrituras`` guarda, por cliente, la última escritura con réplica de lectura
+# (read-your-writes en backend/routers.py); también la comparten los procesos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'progress': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'progress',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_VERSIONES_DIR', os.path.join(tempfile.gettempdir(), 'backend-versiones')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'escrituras': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_ESCRITURAS_DIR', os.path.join(tempfile.gettempdir(), 'backend-escrituras')),
+        'TIMEOUT': REPLICA['MAX_LAG'],
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,268 @@
+"""
+Sharding por universidad.
+
+Con ``DB_SHARDS`` (ver settings) cada universidad vive en uno de varios alias
+de base de datos: sus usuarios, tokens, actividades, registros, el libro
+``ProgresoMeta`` y el registro de cambios de ``sync``. Todo lo de una
+universidad está en el mismo shard, así que las claves foráneas y las
+transacciones siguen siendo locales. El alias
+``default`` guarda la tabla global ``UbicacionUsuario`` (email/username ->
+shard) y a los usuarios sin universidad (administradores globales).
+
+- ``shard_para(universidad)``: mapa explícito de ``SHARDING['UNIVERSIDADES']``
+  o, si no aparece, un hash estable (crc32) sobre ``SHARDING['ALIASES']``.
+- ``ShardRouter`` envía las lecturas y escrituras de las apps de dominio al
+  shard de la petición (``alias_actual()``), que fija la autenticación a partir
+  del usuario del token. Los administradores pueden elegir otro shard con la
+  cabecera ``X-Shard``.
+- ``en_todos(funcion)`` ejecuta una consulta en cada shard en paralelo y
+  ``ResultadosFusionados`` mezcla resultados ordenados para los endpoints de
+  administración que abarcan todos los shards (``progreso_general``,
+  ``pendientes``).
+
+Sin ``DB_SHARDS`` no hay router y ``alias_actual()`` es ``default``: el
+comportamiento es el de una sola base de datos.
+"""
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import cmp_to_key
+from itertools import islice
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Apps cuyos modelos se reparten por shard
+APPS_SHARDEADAS = {'users', 'activities', 'records', 'progress', 'sync', 'authtoken'}
+# Modelos de esas apps que viven solo en ``default``
+MODELOS_GLOBALES = {'users.UbicacionUsuario', 'users.RevocacionToken'}
+
+CABECERA_SHARD = 'HTTP_X_SHARD'
+
+_shard = ContextVar('shard', default=None)
+
+
+def configuracion():
+    return {'ALIASES': [], 'UNIVERSIDADES': {}, 'GLOBAL': DEFAULT_DB_ALIAS, **getattr(settings, 'SHARDING', {})}
+
+
+def activo():
+    return bool(configuracion()['ALIASES'])
+
+
+def todos():
+    """Alias con datos de dominio: el global y los shards, sin repetir"""
+    config = configuracion()
+    return list(dict.fromkeys([config['GLOBAL'], *config['ALIASES']]))
+
+
+def normalizar(universidad):
+    return (universidad or '').strip().casefold()
+
+
+def shard_para(universidad):
+    """Alias en el que vive una universidad"""
+    config = configuracion()
+    if not config['ALIASES']:
+        return DEFAULT_DB_ALIAS
+    clave = normalizar(universidad)
+    if not clave:
+        return config['GLOBAL']
+    explicitos = {normalizar(nombre): alias for nombre, alias in config['UNIVERSIDADES'].items()}
+    if clave in explicitos:
+        return explicitos[clave]
+    return config['ALIASES'][zlib.crc32(clave.encode()) % len(config['ALIASES'])]
+
+
+def alias_actual():
+    """Shard de la petición en curso (el global si no se ha fijado)"""
+    return _shard.get() or (configuracion()['GLOBAL'] if activo() else DEFAULT_DB_ALIAS)
+
+
+def fijar_shard(alias):
+    """Fija el shard hasta el final de la petición (``ShardMiddleware`` lo restaura)"""
+    _shard.set(alias)
+
+
+@contextmanager
+def en_shard(alias):
+    contexto = _shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard.reset(contexto)
+
+
+def shard_de_email(email):
+    """Shard del usuario con ``email`` según la tabla global, o ``None`` si no existe"""
+    if not activo():
+        return DEFAULT_DB_ALIAS
+    from users.models import UbicacionUsuario
+    return UbicacionUsuario.objects.filter(email=email).values_list('shard', flat=True).first()
+
+
+def shard_de_token(key):
+    """Shard que contiene el token ``key`` (el actual si no está en ninguno)"""
+    if not activo():
+        return alias_actual()
+    from rest_framework.authtoken.models import Token
+    for alias in todos():
+        if Token.objects.using(alias).filter(key=key).exists():
+            return alias
+    return alias_actual()
+
+
+def shard_solicitado(request):
+    """Valor de la cabecera ``X-Shard``; ``ValueError`` si no es un alias conocido"""
+    alias = request.META.get(CABECERA_SHARD)
+    if alias is not None and alias not in todos():
+        raise ValueError(f'Shard desconocido: {alias}')
+    return alias
+
+
+def consulta_en_todos(request):
+    """
+    Alias a consultar para un endpoint de administración que abarca todos los
+    shards, o ``None`` si la petición debe atenderse solo en su shard (sharding
+    inactivo o ``X-Shard`` explícito).
+    """
+    if not activo() or request.META.get(CABECERA_SHARD):
+        return None
+    return todos()
+
+
+def en_todos(funcion, aliases=None):
+    """
+    Ejecuta ``funcion(alias)`` en cada shard en paralelo. Devuelve ``{alias: resultado}``.
+    Cada hilo hereda una copia del contexto de la petición (p. ej. el contador de
+    consultas de ``backend.metrics``).
+    """
+    aliases = todos() if aliases is None else list(aliases)
+    contexto = copy_context()
+
+    def ejecutar(alias):
+        with en_shard(alias):
+            try:
+                return funcion(alias)
+            finally:
+                # Las conexiones son por hilo: se cierran las que abrió este
+                connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(len(aliases), 1)) as pool:
+        # Un contexto no puede estar activo en dos hilos a la vez: una copia por tarea
+        return dict(zip(aliases, pool.map(lambda alias: contexto.copy().run(ejecutar, alias), aliases)))
+
+
+def clave_orden(ordenamiento):
+    """
+    Clave de ordenación en Python equivalente a ``order_by(*ordenamiento)``
+    sobre objetos cargados de shards distintos; en empate desempata por shard.
+    """
+    def comparar(a, b):
+        for campo in ordenamiento:
+            nombre = campo.lstrip('-')
+            x, y = getattr(a, nombre), getattr(b, nombre)
+            if x != y:
+                resultado = -1 if x < y else 1
+                return -resultado if campo.startswith('-') else resultado
+        return (a.shard > b.shard) - (a.shard < b.shard)
+    return cmp_to_key(comparar)
+
+
+class ResultadosFusionados:
+    """
+    Secuencia perezosa con el resultado de un queryset repartido entre shards.
+
+    ``querysets`` es ``{alias: queryset}`` ordenado por ``ordenamiento`` (el
+    mismo ``order_by`` en todos). ``count()`` suma los totales de cada shard y
+    un slice ``[a:b]`` pide las ``b`` primeras filas a cada shard en paralelo y
+    las mezcla, de modo que los paginadores de Django y DRF funcionan sobre
+    ella. Cada objeto lleva el atributo ``shard``.
+    """
+
+    def __init__(self, querysets, ordenamiento):
+        self.querysets = querysets
+        self.ordenamiento = tuple(ordenamiento)
+
+    def count(self):
+        return sum(en_todos(lambda alias: self.querysets[alias].using(alias).count(), self.querysets).values())
+
+    def __len__(self):
+        return self.count()
+
+    def _primeros(self, limite):
+        def consultar(alias):
+            queryset = self.querysets[alias].using(alias)
+            filas = list(queryset if limite is None else queryset[:limite])
+            for fila in filas:
+                fila.shard = alias
+            return filas
+
+        por_shard = en_todos(consultar, self.querysets)
+        fusionados = heapq.merge(*por_shard.values(), key=clave_orden(self.ordenamiento))
+        return list(fusionados if limite is None else islice(fusionados, limite))
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            if indice.step is not None or (indice.start or 0) < 0 or (indice.stop is not None and indice.stop < 0):
+                raise ValueError('Solo se admiten slices positivos sin paso')
+            return self._primeros(indice.stop)[indice.start or 0:]
+        return self._primeros(indice + 1)[indice]
+
+    def __iter__(self):
+        return iter(self._primeros(None))
+
+
+class ShardRouter:
+    def _alias(self, model, hints):
+        if model._meta.app_label not in APPS_SHARDEADAS:
+            return None
+        if model._meta.label in MODELOS_GLOBALES:
+            return DEFAULT_DB_ALIAS
+        # Objetos relacionados: el shard del que se cargó la instancia
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db
+        return alias_actual()
+
+    def db_for_read(self, model, **hints):
+        return self._alias(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._alias(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._meta.app_label, obj2._meta.app_label} & APPS_SHARDEADAS:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in todos():
+            return None
+        if f'{app_label}.{model_name}'.lower() in {label.lower() for label in MODELOS_GLOBALES}:
+            return db == DEFAULT_DB_ALIAS
+        # Cada shard tiene el esquema completo
+        return True
+
+
+class ShardMiddleware:
+    """Aísla el shard fijado durante la petición (la autenticación lo fija)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with en_shard(None):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with en_shard(None):
+            return await self.get_response(request)
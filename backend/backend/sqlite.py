@@ -0,0 +1,55 @@
+"""
+Perfil de SQLite para producción (``DB_PROFILE=production`` en settings).
+
+Con la configuración por defecto (journal ``DELETE``, transacciones
+``DEFERRED``) dos escrituras concurrentes que leen antes de escribir, como
+``aprobar_rechazar`` y la creación de registros, pueden fallar con
+``database is locked``: ambas toman el lock de lectura y, al intentar
+promocionarlo a escritura, SQLite devuelve ``SQLITE_BUSY`` sin esperar al
+``busy_timeout`` porque esperar sería un interbloqueo.
+
+El perfil de producción:
+
+- abre las transacciones con ``BEGIN IMMEDIATE`` (``OPTIONS['transaction_mode']``),
+  de modo que el lock de escritura se pide al empezar y la espera sí respeta
+  el timeout;
+- aplica los pragmas de ``PRAGMAS_PRODUCCION`` a cada conexión nueva desde la
+  señal ``connection_created`` (WAL para que las lecturas no bloqueen a la
+  escritura, ``synchronous=NORMAL`` para no hacer fsync en cada commit, etc.).
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+PRAGMAS_PRODUCCION = {
+    # Lectores y escritor no se bloquean entre sí; persiste en el fichero
+    'journal_mode': 'WAL',
+    # Con WAL es seguro ante caídas del proceso; un corte de luz puede perder el último commit
+    'synchronous': 'NORMAL',
+    # Milisegundos esperando el lock de escritura antes de fallar
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negativo: tamaño en KiB (64 MiB por conexión)
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def aplicar_pragmas(conexion, pragmas):
+    """Aplica ``pragmas`` a una conexión DB-API de sqlite3"""
+    cursor = conexion.cursor()
+    try:
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+    finally:
+        cursor.close()
+
+
+def configurar_conexion(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if pragmas:
+        aplicar_pragmas(connection.connection, pragmas)
+
+
+connection_created.connect(configurar_conexion, dispatch_uid='backend.sqlite.configurar_conexion')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProgressConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'progress'
+
+    def ready(self):
+        # Mantiene ProgresoMeta sincronizado con RegistroHoras, Actividad y Usuario
+        from . import signals  # noqa: F401
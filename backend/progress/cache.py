@@ -0,0 +1,121 @@
+"""
+Caché por usuario de las respuestas de progreso (``mi_progreso`` e ``historial``).
+
+Las entradas se guardan en el alias ``progress`` de ``CACHES`` bajo una clave que
+incluye una versión por (endpoint, usuario). Invalidar equivale a cambiar esa
+versión: las entradas anteriores dejan de ser alcanzables y el backend las
+desaloja por LRU. Las señales de ``progress.signals`` invalidan tras cada
+cambio en registros, actividades, metas o nombre del usuario.
+
+Las respuestas pueden ser locales a cada proceso, pero las versiones viven en
+el alias ``versiones``, compartido por todos: una invalidación en un worker
+deja sin efecto las entradas de los demás.
+
+``historial?expand=...`` no se cachea: incluye datos de actividades y de otros
+usuarios (asignaciones, creador) que cambian sin pasar por estas señales.
+"""
+import hashlib
+import threading
+import time
+from django.core.cache import caches
+from django.db import transaction
+from backend import sharding
+
+ENDPOINTS = ('mi_progreso', 'historial')
+
+_lock = threading.Lock()
+_contadores = {endpoint: {'hits': 0, 'misses': 0} for endpoint in ENDPOINTS}
+
+
+def _cache():
+    return caches['progress']
+
+
+def _versiones():
+    return caches['versiones']
+
+
+def _usuario(usuario_id):
+    # Con sharding los ids solo son únicos dentro de cada shard
+    return f'{sharding.alias_actual()}:{usuario_id}' if sharding.activo() else usuario_id
+
+
+def _clave_version(endpoint, usuario_id):
+    return f'version:{endpoint}:{_usuario(usuario_id)}'
+
+
+def version(endpoint, usuario_id):
+    """Versión actual de las respuestas de ``endpoint`` para el usuario"""
+    clave = _clave_version(endpoint, usuario_id)
+    actual = _versiones().get(clave)
+    if actual is None:
+        # Si la versión fue desalojada se crea una nueva y única, de modo que
+        # ninguna entrada antigua vuelva a ser válida
+        actual = time.time_ns()
+        if not _versiones().add(clave, actual, timeout=None):
+            actual = _versiones().get(clave, actual)
+    return actual
+
+
+def _clave(endpoint, usuario_id, params=''):
+    sufijo = hashlib.md5(params.encode()).hexdigest() if params else ''
+    return f'{endpoint}:{_usuario(usuario_id)}:{version(endpoint, usuario_id)}:{sufijo}'
+
+
+def _contar(endpoint, campo):
+    with _lock:
+        _contadores[endpoint][campo] += 1
+
+
+def respuesta_cacheada(endpoint, request, construir):
+    """
+    Devuelve los datos cacheados de ``endpoint`` para ``request.user`` o los
+    construye con ``construir()`` y los guarda. Los query params forman parte
+    de la clave; con ``expand`` se construye siempre.
+    """
+    if request.query_params.get('expand'):
+        return construir()
+
+    clave = _clave(endpoint, request.user.id, request.META.get('QUERY_STRING', ''))
+    datos = _cache().get(clave)
+    if datos is not None:
+        _contar(endpoint, 'hits')
+        return datos
+
+    _contar(endpoint, 'misses')
+    datos = construir()
+    _cache().set(clave, datos)
+    return datos
+
+
+def invalidar(usuario_ids, endpoints=ENDPOINTS):
+    """Invalida las respuestas cacheadas de los usuarios indicados al confirmar la transacción"""
+    usuario_ids = [usuario_id for usuario_id in set(usuario_ids) if usuario_id is not None]
+    if not usuario_ids:
+        return
+
+    claves = [_clave_version(endpoint, usuario_id) for usuario_id in usuario_ids for endpoint in endpoints]
+
+    def _invalidar():
+        _versiones().set_many({clave: time.time_ns() for clave in claves}, timeout=None)
+
+    transaction.on_commit(_invalidar, using=sharding.alias_actual())
+
+
+def estadisticas():
+    """Contadores de aciertos y fallos por endpoint desde que arrancó el proceso"""
+    with _lock:
+        resultado = {}
+        for endpoint, contador in _contadores.items():
+            total = contador['hits'] + contador['misses']
+            resultado[endpoint] = {
+                **contador,
+                'hit_ratio': round(contador['hits'] / total, 4) if total else 0,
+            }
+        return resultado
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        for contador in _contadores.values():
+            contador['hits'] = contador['misses'] = 0
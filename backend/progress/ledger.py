@@ -0,0 +1,148 @@
+"""
+Libro mayor de horas aprobadas respaldado por ``ProgresoMeta``.
+
+Cada fila (becario, tipo_actividad) guarda la suma de ``horas_reportadas`` de los
+registros aprobados de ese becario en actividades de ese tipo. Las señales de
+``progress.signals`` aplican deltas al aprobar, rechazar, editar o eliminar
+registros; ``manage.py reconcile_progress`` lo reconstruye en bloque.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from backend import sharding
+from django.utils import timezone
+from django.db.models import Case, DecimalField, F, Max, Sum, Value, When
+from .models import ProgresoMeta
+
+# Filas por UPDATE; mantiene los parámetros por consulta bajo el límite de SQLite
+TAMANO_LOTE = 400
+
+# Tipo de actividad -> campo de meta en Usuario
+META_POR_TIPO = {
+    'Interna': 'meta_horas_voluntariado_interno',
+    'Externa': 'meta_horas_voluntariado_externo',
+    'Chat': 'meta_horas_chat_ingles',
+    'Taller': 'meta_horas_talleres',
+}
+
+
+def metas_de(usuario):
+    """Mapa tipo de actividad -> horas objetivo del usuario"""
+    return {tipo: getattr(usuario, campo) for tipo, campo in META_POR_TIPO.items()}
+
+
+def metas_guardadas(usuario_id):
+    """
+    ``(metas, ultima_actualizacion)`` del usuario leídas de la base de datos en
+    una consulta: metas por tipo y ``fecha_actualizacion`` más reciente de su
+    libro. ``request.user`` puede venir de la caché de tokens de un proceso y
+    tener metas de hace hasta ``TTL`` segundos.
+    """
+    from users.models import Usuario
+
+    fila = (
+        Usuario.objects.filter(pk=usuario_id).values(*META_POR_TIPO.values())
+        .annotate(ultima=Max('progresometa__fecha_actualizacion'))[:1]
+    )
+    fila = fila[0] if fila else {}
+    return {tipo: fila.get(campo, 0) for tipo, campo in META_POR_TIPO.items()}, fila.get('ultima')
+
+
+def aporte(estado, horas):
+    """Horas que un registro aporta al libro según su estado"""
+    return horas if estado == 'A' else Decimal('0')
+
+
+def aplicar_deltas(deltas, crear=True):
+    """
+    Aplica un diccionario ``{(becario_id, tipo): delta}`` al libro.
+
+    Las filas inexistentes se crean con la meta actual del becario; con
+    ``crear=False`` se omiten sus deltas (p. ej. al borrar en cascada un
+    becario, cuyas filas ya se eliminaron). Los deltas
+    se aplican con ``UPDATE ... SET horas = horas + CASE id WHEN ...`` por lotes,
+    de modo que el coste no crece con una consulta por fila y el incremento es
+    atómico frente a escrituras concurrentes.
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    from users.models import Usuario
+
+    with transaction.atomic(using=sharding.alias_actual()):
+        becarios_ids = {becario_id for becario_id, _ in deltas}
+
+        def filas_existentes():
+            return {
+                (becario_id, tipo): pk
+                for pk, becario_id, tipo in ProgresoMeta.objects.filter(becario_id__in=becarios_ids)
+                .values_list('id', 'becario_id', 'tipo_actividad')
+            }
+
+        existentes = filas_existentes()
+        faltantes = [clave for clave in deltas if clave not in existentes]
+        if faltantes and crear:
+            usuarios = Usuario.objects.in_bulk({becario_id for becario_id, _ in faltantes})
+            ProgresoMeta.objects.bulk_create([
+                ProgresoMeta(
+                    becario_id=becario_id,
+                    tipo_actividad=tipo,
+                    horas_objetivo=metas_de(usuarios[becario_id]).get(tipo, 0),
+                    horas_alcanzadas=0,
+                )
+                for becario_id, tipo in faltantes if becario_id in usuarios
+            ], ignore_conflicts=True)
+            existentes = filas_existentes()
+
+        por_fila = [(existentes[clave], delta) for clave, delta in deltas.items() if clave in existentes]
+        decimal = DecimalField(max_digits=5, decimal_places=2)
+        for inicio in range(0, len(por_fila), TAMANO_LOTE):
+            lote = por_fila[inicio:inicio + TAMANO_LOTE]
+            ProgresoMeta.objects.filter(id__in=[pk for pk, _ in lote]).update(
+                horas_alcanzadas=F('horas_alcanzadas') + Case(
+                    *[When(id=pk, then=Value(delta, output_field=decimal)) for pk, delta in lote],
+                    default=Value(Decimal('0'), output_field=decimal),
+                    output_field=decimal
+                ),
+                fecha_actualizacion=timezone.now()
+            )
+
+
+def aplicar_delta(becario_id, tipo, delta, crear=True):
+    aplicar_deltas({(becario_id, tipo): delta}, crear=crear)
+
+
+def mover_tipo_actividad(actividad_id, tipo_anterior, tipo_nuevo):
+    """Traslada las horas aprobadas de una actividad cuando cambia su ``tipo``"""
+    from records.models import RegistroHoras
+
+    horas_por_becario = (
+        RegistroHoras.objects.filter(actividad_id=actividad_id, estado_aprobacion='A')
+        .values('becario_id').annotate(total=Sum('horas_reportadas'))
+    )
+    deltas = defaultdict(Decimal)
+    for fila in horas_por_becario:
+        deltas[(fila['becario_id'], tipo_anterior)] -= fila['total']
+        deltas[(fila['becario_id'], tipo_nuevo)] += fila['total']
+    aplicar_deltas(deltas)
+
+
+def sincronizar_metas(usuario):
+    """Copia las metas actuales del usuario a ``horas_objetivo`` de sus filas (un solo UPDATE)"""
+    ProgresoMeta.objects.filter(becario=usuario).update(horas_objetivo=Case(
+        *[When(tipo_actividad=tipo, then=Value(meta)) for tipo, meta in metas_de(usuario).items()],
+        default=F('horas_objetivo'),
+        output_field=DecimalField(max_digits=5, decimal_places=2)
+    ))
+
+
+def calcular_esperado(becarios_ids=None):
+    """Recalcula desde ``RegistroHoras`` el libro esperado: ``{(becario_id, tipo): horas}``"""
+    from records.models import RegistroHoras
+
+    queryset = RegistroHoras.objects.filter(estado_aprobacion='A')
+    if becarios_ids is not None:
+        queryset = queryset.filter(becario_id__in=becarios_ids)
+    filas = queryset.values('becario_id', 'actividad__tipo').annotate(total=Sum('horas_reportadas'))
+    return {(f['becario_id'], f['actividad__tipo']): f['total'] or Decimal('0') for f in filas}
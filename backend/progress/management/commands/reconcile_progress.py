@@ -0,0 +1,73 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users.models import Usuario
+from progress.ledger import calcular_esperado, metas_de
+from progress.models import ProgresoMeta
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ProgresoMeta hours ledger from approved RegistroHoras and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk write')
+        parser.add_argument('--becario', type=int, action='append', dest='becarios',
+                            help='Limit to this becario id (can be repeated)')
+
+    def handle(self, *args, **options):
+        becarios_ids = options['becarios']
+        batch_size = options['batch_size']
+
+        esperado = calcular_esperado(becarios_ids)
+
+        filas = ProgresoMeta.objects.all()
+        if becarios_ids is not None:
+            filas = filas.filter(becario_id__in=becarios_ids)
+        actuales = {
+            (f['becario_id'], f['tipo_actividad']): f['horas_alcanzadas']
+            for f in filas.values('becario_id', 'tipo_actividad', 'horas_alcanzadas')
+        }
+
+        faltantes = [clave for clave in esperado if clave not in actuales]
+        diferentes = [
+            clave for clave, horas in actuales.items()
+            if Decimal(horas) != esperado.get(clave, Decimal('0'))
+        ]
+
+        for becario_id, tipo in diferentes[:20]:
+            self.stdout.write(
+                f'Drift becario={becario_id} tipo={tipo}: '
+                f'ledger={actuales[(becario_id, tipo)]} esperado={esperado.get((becario_id, tipo), 0)}'
+            )
+        if len(diferentes) > 20:
+            self.stdout.write(f'... and {len(diferentes) - 20} more')
+
+        self.stdout.write(self.style.NOTICE(
+            f'Rows: {len(actuales)}, Missing: {len(faltantes)}, Drifted: {len(diferentes)}'
+        ))
+
+        if options['dry_run'] or not (faltantes or diferentes):
+            return
+
+        claves = faltantes + diferentes
+        usuarios = Usuario.objects.in_bulk({becario_id for becario_id, _ in claves})
+        objetos = [
+            ProgresoMeta(
+                becario_id=becario_id,
+                tipo_actividad=tipo,
+                horas_objetivo=metas_de(usuarios[becario_id]).get(tipo, 0),
+                horas_alcanzadas=esperado.get((becario_id, tipo), Decimal('0')),
+            )
+            for becario_id, tipo in claves if becario_id in usuarios
+        ]
+        with transaction.atomic():
+            ProgresoMeta.objects.bulk_create(
+                objetos,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['becario', 'tipo_actividad'],
+                update_fields=['horas_objetivo', 'horas_alcanzadas', 'fecha_actualizacion'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {len(objetos)} ledger rows'))
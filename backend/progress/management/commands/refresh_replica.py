@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.routers import ALIAS_REPLICA, ruta_marca
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the read replica database file from the primary using SQLite's online backup API. "
+        "The copy is consistent and does not block writers on the primary (WAL) for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Primary database alias')
+        parser.add_argument('--target', default=ALIAS_REPLICA, help='Replica database alias')
+        parser.add_argument('--pages', type=int, default=-1,
+                            help='Pages copied per backup step (-1 = whole database in one step)')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep refreshing every N seconds (0 = refresh once and exit)')
+
+    def handle(self, *args, **options):
+        origen = self.ruta(options['source'])
+        destino = self.ruta(options['target'])
+        if os.path.abspath(origen) == os.path.abspath(destino):
+            raise CommandError('Source and target are the same file')
+
+        while True:
+            self.refrescar(origen, destino, options['pages'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def ruta(self, alias):
+        base = settings.DATABASES.get(alias)
+        if base is None:
+            raise CommandError(f'Database alias "{alias}" is not configured (set DB_REPLICA for the replica)')
+        if base['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f'Database alias "{alias}" is not SQLite')
+        return str(base['NAME'])
+
+    def refrescar(self, origen, destino, paginas):
+        # Marca de la copia: el instante previo a empezar, así cualquier escritura
+        # posterior (que podría no estar en la copia) sigue leyendo del primario
+        inicio = time.time()
+        fuente = sqlite3.connect(origen)
+        copia = sqlite3.connect(destino, timeout=30)
+        try:
+            fuente.backup(copia, pages=paginas)
+        finally:
+            copia.close()
+            fuente.close()
+
+        marca = ruta_marca(destino)
+        with open(marca, 'w') as fh:
+            fh.write(f'{inicio}\n')
+        os.utime(marca, (inicio, inicio))
+
+        tamano = os.path.getsize(destino) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f'Replica {destino} refreshed ({tamano:.1f} MB) in {time.time() - inicio:.2f}s'
+        ))
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Sum
+
+META_POR_TIPO = {
+    'Interna': 'meta_horas_voluntariado_interno',
+    'Externa': 'meta_horas_voluntariado_externo',
+    'Chat': 'meta_horas_chat_ingles',
+    'Taller': 'meta_horas_talleres',
+}
+
+
+def rellenar_libro(apps, schema_editor):
+    """Construye el libro de horas a partir de los registros aprobados existentes"""
+    RegistroHoras = apps.get_model('records', 'RegistroHoras')
+    ProgresoMeta = apps.get_model('progress', 'ProgresoMeta')
+    Usuario = apps.get_model('users', 'Usuario')
+
+    filas = (
+        RegistroHoras.objects.filter(estado_aprobacion='A')
+        .values('becario_id', 'actividad__tipo').annotate(total=Sum('horas_reportadas'))
+    )
+    filas = list(filas)
+    usuarios = Usuario.objects.in_bulk({f['becario_id'] for f in filas})
+    ProgresoMeta.objects.bulk_create([
+        ProgresoMeta(
+            becario_id=f['becario_id'],
+            tipo_actividad=f['actividad__tipo'],
+            horas_objetivo=getattr(usuarios[f['becario_id']], META_POR_TIPO.get(f['actividad__tipo'], ''), 0),
+            horas_alcanzadas=f['total'] or 0,
+        )
+        for f in filas
+    ], batch_size=1000, update_conflicts=True, unique_fields=['becario', 'tipo_actividad'],
+        update_fields=['horas_objetivo', 'horas_alcanzadas'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0001_initial'),
+        ('records', '0001_initial'),
+        ('activities', '0003_actividad_is_active'),
+        ('users', '0004_alter_usuario_managers'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_libro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,8 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class ProgresoGeneralPagination(PageNumberPagination):
+    """Paginación del dashboard de progreso general (``?page=`` / ``?page_size=``)"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
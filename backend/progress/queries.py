@@ -0,0 +1,98 @@
+from decimal import Decimal
+from django.db.models import (
+    Case, DecimalField, ExpressionWrapper, F, FloatField, Q, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Round
+from users.models import Usuario
+
+# Bandas de cumplimiento aceptadas por ``?cumplimiento=``
+BANDAS_CUMPLIMIENTO = {
+    'sin_iniciar': Q(porcentaje_cumplimiento__lte=0),
+    'en_progreso': Q(porcentaje_cumplimiento__gt=0, porcentaje_cumplimiento__lt=100),
+    'completado': Q(porcentaje_cumplimiento__gte=100),
+}
+
+# Campos por los que se puede ordenar con ``?ordering=`` (prefijo ``-`` para descendente)
+ORDENAMIENTOS_PERMITIDOS = {
+    'id', 'username', 'first_name', 'last_name', 'carrera', 'universidad',
+    'horas_totales_aprobadas', 'meta_total', 'porcentaje_cumplimiento',
+}
+
+# Columnas de Usuario que realmente necesita el dashboard
+CAMPOS_BECARIO = ['id', 'username', 'email', 'first_name', 'last_name', 'rol',
+                  'carrera', 'universidad', 'semestre']
+
+
+def anotar_progreso(queryset):
+    """
+    Anota horas aprobadas, meta total y porcentaje de cumplimiento en una sola consulta agrupada.
+
+    Las horas se leen del libro ``ProgresoMeta`` (a lo sumo 4 filas por becario)
+    en lugar de recorrer todos sus registros.
+    """
+    decimal = DecimalField(max_digits=10, decimal_places=2)
+    meta_total = ExpressionWrapper(
+        F('meta_horas_voluntariado_interno') +
+        F('meta_horas_voluntariado_externo') +
+        F('meta_horas_chat_ingles') +
+        F('meta_horas_talleres'),
+        output_field=decimal
+    )
+    horas = Coalesce(
+        Sum('progresometa__horas_alcanzadas'),
+        Value(Decimal('0')),
+        output_field=decimal
+    )
+    return queryset.annotate(
+        horas_totales_aprobadas=horas,
+        meta_total=meta_total,
+    ).annotate(
+        # Se castea a float para evitar la división entera de SQLite
+        porcentaje_cumplimiento=Case(
+            When(meta_total__gt=0, then=Round(
+                Cast(F('horas_totales_aprobadas'), FloatField()) * 100.0 /
+                Cast(F('meta_total'), FloatField()),
+                2
+            )),
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+    )
+
+
+def progreso_general_queryset(params):
+    """
+    Construye el queryset del dashboard a partir de los query params.
+
+    Filtros: ``rol`` (por defecto ``becario``), ``carrera``, ``universidad`` y
+    ``cumplimiento`` (``sin_iniciar``, ``en_progreso``, ``completado``).
+    Lanza ``ValueError`` si algún parámetro no es válido.
+    """
+    rol = params.get('rol', 'becario')
+    if rol not in dict(Usuario.ROL_CHOICES):
+        raise ValueError(f'Rol inválido: {rol}')
+
+    queryset = Usuario.objects.filter(rol=rol).only(*CAMPOS_BECARIO)
+
+    carrera = params.get('carrera')
+    if carrera:
+        queryset = queryset.filter(carrera__iexact=carrera)
+    universidad = params.get('universidad')
+    if universidad:
+        queryset = queryset.filter(universidad__iexact=universidad)
+
+    queryset = anotar_progreso(queryset)
+
+    cumplimiento = params.get('cumplimiento')
+    if cumplimiento:
+        if cumplimiento not in BANDAS_CUMPLIMIENTO:
+            raise ValueError(f'Banda de cumplimiento inválida: {cumplimiento}')
+        queryset = queryset.filter(BANDAS_CUMPLIMIENTO[cumplimiento])
+
+    ordering = params.get('ordering', '-porcentaje_cumplimiento')
+    # Un solo ``-`` opcional: ``--campo`` no es un ordenamiento válido
+    campo = ordering[1:] if ordering.startswith('-') else ordering
+    if campo not in ORDENAMIENTOS_PERMITIDOS:
+        raise ValueError(f'Ordenamiento inválido: {ordering}')
+    # ``id`` como desempate para que la paginación sea estable
+    return queryset.order_by(ordering, 'id')
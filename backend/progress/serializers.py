@@ -1,15 +1,24 @@
 from rest_framework import serializers
-from users.serializers import UsuarioSerializer
+from backend.expansion import ExpandableFieldsMixin
+from users.models import Usuario
 
-class ProgresoMetaSerializer(serializers.Serializer):
+class ProgresoMetaSerializer(ExpandableFieldsMixin, serializers.Serializer):
     tipo_actividad = serializers.CharField()
     horas_objetivo = serializers.DecimalField(max_digits=5, decimal_places=2)
     horas_alcanzadas = serializers.DecimalField(max_digits=5, decimal_places=2)
     porcentaje = serializers.DecimalField(max_digits=5, decimal_places=2)
     horas_restantes = serializers.DecimalField(max_digits=5, decimal_places=2)
 
-class ProgresoGeneralSerializer(serializers.Serializer):
-    becario = UsuarioSerializer()
-    horas_totales_aprobadas = serializers.DecimalField(max_digits=5, decimal_places=2)
-    meta_total = serializers.DecimalField(max_digits=5, decimal_places=2)
-    porcentaje_cumplimiento = serializers.DecimalField(max_digits=5, decimal_places=2)
\ No newline at end of file
+class BecarioResumenSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    """Datos básicos del becario sin relaciones anidadas (no genera consultas extra)"""
+    class Meta:
+        model = Usuario
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'rol',
+                 'carrera', 'universidad', 'semestre']
+
+class ProgresoGeneralSerializer(ExpandableFieldsMixin, serializers.Serializer):
+    # Se serializa desde una instancia de Usuario anotada por progress.queries.anotar_progreso
+    becario = BecarioResumenSerializer(source='*')
+    horas_totales_aprobadas = serializers.DecimalField(max_digits=10, decimal_places=2)
+    meta_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    porcentaje_cumplimiento = serializers.DecimalField(max_digits=10, decimal_places=2)
\ No newline at end of file
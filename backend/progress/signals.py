@@ -0,0 +1,98 @@
+from decimal import Decimal
+from django.db import transaction
+from backend import sharding
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from activities.models import Actividad
+from records.models import RegistroHoras
+from users.models import Usuario
+from . import cache, ledger
+
+
+@receiver(pre_save, sender=RegistroHoras)
+def recordar_registro_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda el aporte previo del registro para calcular el delta en post_save"""
+    instance._aporte_anterior = None
+    if raw or instance.pk is None:
+        return
+    anterior = (
+        RegistroHoras.objects.filter(pk=instance.pk)
+        .values('becario_id', 'actividad__tipo', 'estado_aprobacion', 'horas_reportadas')
+        .first()
+    )
+    if anterior:
+        instance._aporte_anterior = (
+            anterior['becario_id'],
+            anterior['actividad__tipo'],
+            ledger.aporte(anterior['estado_aprobacion'], anterior['horas_reportadas']),
+        )
+
+
+@receiver(post_save, sender=RegistroHoras)
+def actualizar_libro_registro(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {}
+    anterior = getattr(instance, '_aporte_anterior', None)
+    if anterior and anterior[2]:
+        deltas[(anterior[0], anterior[1])] = -anterior[2]
+
+    horas = ledger.aporte(instance.estado_aprobacion, Decimal(instance.horas_reportadas))
+    if horas:
+        clave = (instance.becario_id, instance.actividad.tipo)
+        deltas[clave] = deltas.get(clave, Decimal('0')) + horas
+
+    with transaction.atomic(using=sharding.alias_actual()):
+        ledger.aplicar_deltas(deltas)
+    cache.invalidar([instance.becario_id, anterior[0] if anterior else None])
+
+
+@receiver(post_delete, sender=RegistroHoras)
+def descontar_registro_eliminado(sender, instance, **kwargs):
+    horas = ledger.aporte(instance.estado_aprobacion, instance.horas_reportadas)
+    if horas:
+        tipo = Actividad.objects.filter(pk=instance.actividad_id).values_list('tipo', flat=True).first()
+        if tipo:
+            # Un registro aprobado siempre tiene su fila en el libro. Si no está, se está
+            # borrando el becario en cascada y recrearla violaría su clave foránea
+            ledger.aplicar_delta(instance.becario_id, tipo, -horas, crear=False)
+    cache.invalidar([instance.becario_id])
+
+
+@receiver(pre_save, sender=Actividad)
+def recordar_tipo_anterior(sender, instance, raw=False, **kwargs):
+    instance._tipo_anterior = None
+    if raw or instance.pk is None:
+        return
+    instance._tipo_anterior = Actividad.objects.filter(pk=instance.pk).values_list('tipo', flat=True).first()
+
+
+@receiver(post_save, sender=Actividad)
+def mover_horas_por_cambio_de_tipo(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, '_tipo_anterior', None)
+    if raw or not anterior:
+        return
+
+    # El historial incluye el detalle de la actividad; el progreso solo depende del tipo
+    becarios_ids = RegistroHoras.objects.filter(actividad_id=instance.pk).values_list('becario_id', flat=True).distinct()
+    if anterior == instance.tipo:
+        cache.invalidar(becarios_ids, endpoints=['historial'])
+        return
+
+    with transaction.atomic(using=sharding.alias_actual()):
+        ledger.mover_tipo_actividad(instance.pk, anterior, instance.tipo)
+    cache.invalidar(becarios_ids)
+
+
+@receiver(post_save, sender=Usuario)
+def sincronizar_metas_usuario(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    # Guardados parciales que no tocan metas (p. ej. last_login) no requieren sincronizar
+    metas = update_fields is None or set(update_fields) & set(ledger.META_POR_TIPO.values())
+    if metas:
+        ledger.sincronizar_metas(instance)
+        cache.invalidar([instance.pk])
+    elif set(update_fields) & {'first_name', 'last_name'}:
+        # El historial incluye ``becario_nombre``
+        cache.invalidar([instance.pk], endpoints=['historial'])
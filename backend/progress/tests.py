@@ -1,3 +1,459 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from activities.models import Actividad
+from backend import metrics
+from backend.metrics import registro
+from backend.query_plan import PlanConsultasMixin
+from backend.routers import (ALIAS_REPLICA, LecturaEscrituraRouter, ReplicaMiddleware, clave_cliente,
+                             ruta_marca, configuracion as configuracion_replica)
+from records.models import RegistroHoras
+from .management.commands.refresh_replica import Command as RefreshReplica
+from .models import ProgresoMeta
+from users.authentication import token_cache
+from users.models import Usuario
 
-# Create your tests here.
+URL_ACTIVIDADES = '/api/activities/actividades/'
+
+
+class ProgresoGeneralTests(TestCase):
+    """progreso_general responde un sobre paginado con estadísticas, filtros y ordenamiento"""
+
+    url = '/api/progress/progress/progreso_general/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becarios = [
+            Usuario.objects.create_user(
+                f'becario{i}', f'becario{i}@example.com', 'clave', rol='becario', last_name=f'Apellido {i}',
+                meta_horas_talleres=4,
+            )
+            for i in range(3)
+        ]
+        actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin
+        )
+        for becario, horas, estado in ((cls.becarios[1], 4, 'A'), (cls.becarios[2], 2, 'A'), (cls.becarios[0], 3, 'P')):
+            RegistroHoras.objects.create(
+                becario=becario, actividad=actividad, horas_reportadas=horas, estado_aprobacion=estado
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, params=None):
+        # X-Shard: con DB_SHARDS se consulta un solo shard
+        return self.client.get(self.url, params, HTTP_X_SHARD='default')
+
+    def test_sobre_paginado(self):
+        respuesta = self.get({'page_size': 2})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            set(respuesta.data), {'estadisticas_generales', 'count', 'next', 'previous', 'progreso_becarios'}
+        )
+        self.assertEqual(respuesta.data['estadisticas_generales'], {'total_becarios': 3, 'total_horas_aprobadas': 6.0})
+        self.assertEqual(respuesta.data['count'], 3)
+        self.assertIsNotNone(respuesta.data['next'])
+        self.assertIsNone(respuesta.data['previous'])
+        # Por defecto, de mayor a menor cumplimiento
+        primero, segundo = respuesta.data['progreso_becarios']
+        self.assertEqual(primero['becario']['username'], 'becario1')
+        self.assertEqual(primero['porcentaje_cumplimiento'], '100.00')
+        self.assertEqual(segundo['horas_totales_aprobadas'], '2.00')
+        self.assertEqual(segundo['meta_total'], '4.00')
+
+    def test_filtros_y_ordenamiento(self):
+        respuesta = self.get({'cumplimiento': 'sin_iniciar'})
+        self.assertEqual([fila['becario']['username'] for fila in respuesta.data['progreso_becarios']], ['becario0'])
+        respuesta = self.get({'ordering': '-last_name'})
+        self.assertEqual(
+            [fila['becario']['username'] for fila in respuesta.data['progreso_becarios']],
+            ['becario2', 'becario1', 'becario0'],
+        )
+
+    def test_ordenamiento_invalido(self):
+        for ordering in ('--last_name', '-', 'password'):
+            respuesta = self.get({'ordering': ordering})
+            self.assertEqual(respuesta.status_code, 400, ordering)
+
+    def test_solo_administradores(self):
+        self.client.force_authenticate(self.becarios[0])
+        self.assertEqual(self.get().status_code, 403)
+
+
+class PlanConsultasProgresoTests(PlanConsultasMixin, TestCase):
+    """Las consultas principales de los endpoints de progreso no recorren tablas enteras"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user(
+            'becario', 'becario@example.com', 'clave', rol='becario', meta_horas_talleres=10
+        )
+        actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin
+        )
+        RegistroHoras.objects.create(
+            becario=cls.becario, actividad=actividad, horas_reportadas=2, estado_aprobacion='A'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_mi_progreso(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(lambda: self.client.get('/api/progress/progress/mi_progreso/'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_historial_por_cursor(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/progress/progress/historial/', {'paginacion': 'cursor'})
+        )
+        self.assertEqual(len(respuesta.data['results']), 1)
+
+    def test_progreso_general(self):
+        self.client.force_authenticate(self.admin)
+        # El total de horas aprobadas es un agregado global sobre el libro de progreso
+        respuesta = self.assertSinEscaneosCompletos(
+            # X-Shard: con DB_SHARDS se mide el plan en un solo shard, sin recorrer todos
+            lambda: self.client.get('/api/progress/progress/progreso_general/', HTTP_X_SHARD='default'),
+            permitidas=('progress_progresometa',)
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class MiProgresoCondicionalTests(TestCase):
+    """mi_progreso responde 304 mientras no cambien el libro de progreso ni las metas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', meta_horas_talleres=10)
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=admin
+        )
+
+    def test_nuevo_registro_aprobado_renueva_el_etag(self):
+        client = APIClient()
+        client.force_authenticate(self.becario)
+        url = '/api/progress/progress/mi_progreso/'
+        etag = client.get(url)['ETag']
+        # Solo se lee la última fecha_actualizacion del libro
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHoras.objects.create(
+                becario=self.becario, actividad=self.actividad, horas_reportadas=2, estado_aprobacion='A'
+            )
+        respuesta = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data[0]['horas_alcanzadas'], '2.00')
+
+    def test_cambio_de_meta_renueva_el_etag(self):
+        client = APIClient()
+        # Otra instancia: como el usuario de la caché de tokens de otro proceso, no ve el cambio
+        client.force_authenticate(Usuario.objects.get(pk=self.becario.pk))
+        url = '/api/progress/progress/mi_progreso/'
+        etag = client.get(url)['ETag']
+
+        self.becario.meta_horas_talleres = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            self.becario.save(update_fields=['meta_horas_talleres'])
+        respuesta = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta.data[0]['horas_objetivo']), (200, '20.00'))
+
+
+class CacheProgresoTests(TestCase):
+    """Las señales invalidan mi_progreso e historial; el historial expandido no se cachea"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave',
+                                                  first_name='Beto', meta_horas_talleres=10)
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin
+        )
+
+    def setUp(self):
+        caches['progress'].clear()
+        caches['versiones'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.becario)
+
+    def mi_progreso(self):
+        return {p['tipo_actividad']: p for p in self.client.get('/api/progress/progress/mi_progreso/').data}
+
+    def historial(self, **params):
+        return self.client.get('/api/progress/progress/historial/', params).data
+
+    def test_aprobacion_y_metas_invalidan_mi_progreso(self):
+        self.assertEqual(self.mi_progreso()['Taller']['horas_alcanzadas'], '0.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHoras.objects.create(
+                becario=self.becario, actividad=self.actividad, horas_reportadas=2, estado_aprobacion='A'
+            )
+        self.assertEqual(self.mi_progreso()['Taller']['horas_alcanzadas'], '2.00')
+
+        self.becario.meta_horas_talleres = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            self.becario.save(update_fields=['meta_horas_talleres'])
+        self.assertEqual(self.mi_progreso()['Taller']['horas_objetivo'], '20.00')
+
+    def test_edicion_borrado_y_nombre_invalidan_historial(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            registro = RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad,
+                                                    horas_reportadas=2)
+        self.assertEqual(self.historial()[0]['horas_reportadas'], '2.00')
+
+        registro.horas_reportadas = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            registro.save()
+        self.assertEqual(self.historial()[0]['horas_reportadas'], '3.00')
+
+        self.becario.first_name = 'Alberto'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.becario.save(update_fields=['first_name'])
+        self.assertEqual(self.historial()[0]['becario_nombre'], self.becario.get_full_name())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registro.delete()
+        self.assertEqual(self.historial(), [])
+
+    def test_historial_expandido_no_se_cachea(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad, horas_reportadas=2)
+        self.assertEqual(self.historial(expand='actividad_detalle')[0]['actividad_detalle']['becarios_asignados'], [])
+
+        # Las asignaciones no invalidan la caché de progreso
+        self.actividad.becarios_asignados.add(self.becario)
+        detalle = self.historial(expand='actividad_detalle')[0]['actividad_detalle']
+        self.assertEqual(detalle['becarios_asignados'], [self.becario.pk])
+
+
+class LibroProgresoTests(TestCase):
+    """ProgresoMeta acumula las horas aprobadas con deltas y reconcile_progress corrige la deriva"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', meta_horas_talleres=10)
+        cls.taller = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=admin
+        )
+
+    def horas(self):
+        return {
+            tipo: horas for tipo, horas in
+            ProgresoMeta.objects.filter(becario=self.becario).values_list('tipo_actividad', 'horas_alcanzadas')
+        }
+
+    def test_deltas_por_aprobacion_edicion_rechazo_y_borrado(self):
+        registro = RegistroHoras.objects.create(becario=self.becario, actividad=self.taller, horas_reportadas=3)
+        self.assertEqual(self.horas(), {})
+
+        registro.estado_aprobacion = 'A'
+        registro.save()
+        self.assertEqual(self.horas(), {'Taller': Decimal('3')})
+
+        registro.horas_reportadas = Decimal('5')
+        registro.save()
+        otro = RegistroHoras.objects.create(
+            becario=self.becario, actividad=self.taller, horas_reportadas=2, estado_aprobacion='A'
+        )
+        self.assertEqual(self.horas(), {'Taller': Decimal('7')})
+
+        registro.estado_aprobacion = 'R'
+        registro.save()
+        self.assertEqual(self.horas(), {'Taller': Decimal('2')})
+
+        otro.delete()
+        self.assertEqual(self.horas(), {'Taller': Decimal('0')})
+
+    def test_borrar_becario_con_horas_aprobadas(self):
+        RegistroHoras.objects.create(becario=self.becario, actividad=self.taller, horas_reportadas=3,
+                                     estado_aprobacion='A')
+        becario_id = self.becario.pk
+        self.becario.delete()
+        # Las claves foráneas de SQLite se comprueban al confirmar: se fuerza aquí
+        connection.check_constraints()
+        self.assertFalse(ProgresoMeta.objects.filter(becario_id=becario_id).exists())
+
+    def test_cambio_de_tipo_traslada_las_horas(self):
+        RegistroHoras.objects.create(becario=self.becario, actividad=self.taller, horas_reportadas=4,
+                                     estado_aprobacion='A')
+        self.taller.tipo = 'Interna'
+        self.taller.save()
+        self.assertEqual(self.horas(), {'Taller': Decimal('0'), 'Interna': Decimal('4')})
+
+    def test_reconcile_progress_informa_y_corrige_la_deriva(self):
+        RegistroHoras.objects.create(becario=self.becario, actividad=self.taller, horas_reportadas=4,
+                                     estado_aprobacion='A')
+        ProgresoMeta.objects.filter(becario=self.becario).update(horas_alcanzadas=1)
+
+        salida = StringIO()
+        call_command('reconcile_progress', '--dry-run', stdout=salida)
+        self.assertIn(f'Drift becario={self.becario.pk} tipo=Taller: ledger=1.00 esperado=4', salida.getvalue())
+        self.assertIn('Drifted: 1', salida.getvalue())
+        self.assertEqual(self.horas(), {'Taller': Decimal('1')})
+
+        call_command('reconcile_progress', stdout=StringIO())
+        self.assertEqual(self.horas(), {'Taller': Decimal('4')})
+        salida = StringIO()
+        call_command('reconcile_progress', '--dry-run', stdout=salida)
+        self.assertIn('Missing: 0, Drifted: 0', salida.getvalue())
+
+
+class ReplicaLecturaTests(SimpleTestCase):
+    """Router y middleware de la réplica de lectura, y refresh_replica"""
+
+    def setUp(self):
+        caches['escrituras'].clear()
+        self.factory = RequestFactory()
+        self.copia = time.time()
+        parche = mock.patch('backend.routers.replica_actualizada', side_effect=lambda: self.copia)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def alias_de_lectura(self, metodo='get', autorizacion='Token a'):
+        """Alias al que el router envía las lecturas durante la petición"""
+        leido = []
+
+        def vista(request):
+            leido.append(LecturaEscrituraRouter().db_for_read(Actividad))
+            return HttpResponse()
+
+        request = getattr(self.factory, metodo)('/api/activities/actividades/', HTTP_AUTHORIZATION=autorizacion)
+        ReplicaMiddleware(vista)(request)
+        return leido[0]
+
+    def test_lecturas_de_la_replica_y_escrituras_al_primario(self):
+        self.assertEqual(self.alias_de_lectura(), ALIAS_REPLICA)
+        self.assertEqual(self.alias_de_lectura('post'), 'default')
+        router = LecturaEscrituraRouter()
+        self.assertEqual(router.db_for_write(Actividad), 'default')
+        with mock.patch('backend.routers._usar_replica') as usar:
+            usar.get.return_value = True
+            self.assertEqual(router.db_for_read(Token), 'default')
+
+    def test_tras_escribir_lee_del_primario_hasta_la_siguiente_copia(self):
+        self.alias_de_lectura('post')
+        # La marca está en la caché compartida: la ve cualquier proceso
+        marca = caches['escrituras'].get(clave_cliente(self.factory.get('/', HTTP_AUTHORIZATION='Token a')))
+        self.assertIsNotNone(marca)
+        self.assertEqual(self.alias_de_lectura(), 'default')
+        self.assertEqual(self.alias_de_lectura(autorizacion='Token b'), ALIAS_REPLICA)
+
+        self.copia = time.time() + 1
+        self.assertEqual(self.alias_de_lectura(), ALIAS_REPLICA)
+
+    def test_replica_ausente_u_obsoleta_lee_del_primario(self):
+        self.copia = None
+        self.assertEqual(self.alias_de_lectura(), 'default')
+        self.copia = time.time() - configuracion_replica()['MAX_LAG'] - 1
+        self.assertEqual(self.alias_de_lectura(), 'default')
+
+    def test_refresh_replica(self):
+        directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directorio)
+        rutas = {'default': str(directorio / 'primaria.sqlite3'), ALIAS_REPLICA: str(directorio / 'replica.sqlite3')}
+        with sqlite3.connect(rutas['default']) as conexion:
+            conexion.execute('CREATE TABLE t (x)')
+            conexion.execute('INSERT INTO t VALUES (1)')
+        conexion.close()
+
+        inicio = time.time()
+        with mock.patch.object(RefreshReplica, 'ruta', side_effect=lambda alias: rutas[alias]):
+            call_command('refresh_replica', stdout=StringIO())
+        with closing(sqlite3.connect(rutas[ALIAS_REPLICA])) as copia:
+            self.assertEqual(copia.execute('SELECT x FROM t').fetchall(), [(1,)])
+        self.assertGreaterEqual(os.path.getmtime(ruta_marca(rutas[ALIAS_REPLICA])), int(inicio))
+
+
+class MetricasTests(TestCase):
+    """MetricasMiddleware: cabeceras, consultas por petición (también con ASGI), Prometheus y presupuestos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        cls.token = Token.objects.create(user=cls.becario)
+
+    def setUp(self):
+        registro.limpiar()
+        token_cache.limpiar()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def prometheus(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        respuesta = client.get('/api/metrics/')
+        self.assertEqual(respuesta['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return respuesta.content.decode()
+
+    @override_settings(METRICAS={'HEADERS': True, 'QUERY_BUDGETS': {}})
+    def test_cabeceras_y_formato_prometheus(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(URL_ACTIVIDADES)
+        # El registro de consultas se reinicia con cada petición: se cuenta ahora
+        consultas = len(capturadas)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['X-Query-Count'], str(consultas))
+        self.assertRegex(respuesta['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+$')
+        # Fuera de una petición no se cuenta nada
+        self.assertIsNone(metrics._contador.get())
+
+        texto = self.prometheus()
+        endpoint = 'endpoint="ActividadViewSet.list"'
+        self.assertIn('# TYPE http_request_duration_seconds histogram', texto)
+        self.assertIn(f'http_request_db_queries_count{{{endpoint}}} 1', texto)
+        self.assertIn(f'http_request_db_queries_sum{{{endpoint}}} {consultas}', texto)
+        self.assertIn(f'http_request_db_queries_bucket{{{endpoint},le="+Inf"}} 1', texto)
+        self.assertIn(f'http_responses_total{{{endpoint},status="200"}} 1', texto)
+
+    @override_settings(METRICAS={'HEADERS': False, 'QUERY_BUDGETS': {'ActividadViewSet.list': 1}})
+    def test_presupuesto_excedido(self):
+        with self.assertLogs('backend.metrics', 'WARNING') as logs:
+            respuesta = self.client.get(URL_ACTIVIDADES)
+        self.assertNotIn('X-Query-Count', respuesta)
+        self.assertIn('(ActividadViewSet.list)', logs.output[0])
+        self.assertIn('presupuesto 1', logs.output[0])
+        self.assertIn('http_query_budget_exceeded_total{endpoint="ActividadViewSet.list"} 1', self.prometheus())
+
+    @override_settings(METRICAS={'HEADERS': True, 'QUERY_BUDGETS': {}})
+    async def test_consultas_con_asgi(self):
+        cabeceras = {'Authorization': f'Token {self.token.key}'}
+        respuesta = await AsyncClient().get(URL_ACTIVIDADES, headers=cabeceras)
+        self.assertEqual(respuesta.status_code, 200)
+        # La vista síncrona corre en otro contexto (sync_to_async): sus consultas cuentan igual
+        token_cache.limpiar()
+        sincrona = await sync_to_async(self.client.get)(URL_ACTIVIDADES)
+        self.assertGreater(int(respuesta['X-Query-Count']), 0)
+        self.assertEqual(respuesta['X-Query-Count'], sincrona['X-Query-Count'])
@@ -1,14 +1,32 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Q
+from django.db.models import Sum
 from users.models import Usuario
 from records.models import RegistroHoras
+from .cache import estadisticas, respuesta_cacheada
+from .ledger import metas_guardadas
+from .models import ProgresoMeta
 from .serializers import ProgresoMetaSerializer, ProgresoGeneralSerializer
+from .pagination import ProgresoGeneralPagination
+from .queries import progreso_general_queryset
 from users.permissions import IsAdministrador
+from backend import sharding
+from backend.conditional import condicional
+from backend.expansion import parsear_rutas, relaciones_para
+from backend.pagination import KeysetPagination
 from drf_spectacular.utils import extend_schema
 
+
+def versiones_mi_progreso(view, request):
+    # Cada delta del libro renueva fecha_actualizacion; las metas se leen de la base de datos
+    metas, ultima = metas_guardadas(request.user.id)
+    return [(ultima, ultima), (sorted(metas.items()), None)]
+
+
 class ProgressViewSet(viewsets.ViewSet):
+    # Clave de la paginación por cursor de historial
+    keyset_ordering = ('-fecha_registro', '-id')
     
     @extend_schema(
         description="""**🎓 SOLO BECARIOS** - Ver mi progreso de metas
@@ -23,55 +41,41 @@ class ProgressViewSet(viewsets.ViewSet):
         - Horas aprobadas por tipo de actividad (Voluntariado Interno, Externo, Chat de Inglés, Talleres)
         - Porcentaje de cumplimiento para cada meta
         - Horas restantes para alcanzar cada objetivo
+
+        Admite peticiones condicionales (`If-None-Match` / `If-Modified-Since`): sin cambios responde 304.
         """
     )
     @action(detail=False, methods=['get'])
+    @condicional(versiones_mi_progreso)
     def mi_progreso(self, request):
         user = request.user
-        
-        # Calcular horas aprobadas por tipo de actividad
-        horas_por_tipo = RegistroHoras.objects.filter(
-            becario=user, 
-            estado_aprobacion='A'
-        ).values('actividad__tipo').annotate(
-            total_horas=Sum('horas_reportadas')
-        )
-        
-        # Mapear tipos de actividad a metas
-        metas_map = {
-            'Interna': user.meta_horas_voluntariado_interno,
-            'Externa': user.meta_horas_voluntariado_externo,
-            'Chat': user.meta_horas_chat_ingles,
-            'Taller': user.meta_horas_talleres,
-        }
-        
-        progreso = []
-        for tipo_data in horas_por_tipo:
-            tipo = tipo_data['actividad__tipo']
-            horas_alcanzadas = tipo_data['total_horas'] or 0
-            meta = metas_map.get(tipo, 0)
-            
-            progreso.append({
-                'tipo_actividad': tipo,
-                'horas_objetivo': meta,
-                'horas_alcanzadas': horas_alcanzadas,
-                'porcentaje': (horas_alcanzadas / meta * 100) if meta > 0 else 0,
-                'horas_restantes': max(meta - horas_alcanzadas, 0)
-            })
-        
-        # Incluir tipos sin horas registradas
-        for tipo, meta in metas_map.items():
-            if not any(p['tipo_actividad'] == tipo for p in progreso) and meta > 0:
+
+        def construir():
+            # Horas aprobadas por tipo, mantenidas incrementalmente en ProgresoMeta
+            horas_por_tipo = dict(
+                ProgresoMeta.objects.filter(becario=user)
+                .values_list('tipo_actividad', 'horas_alcanzadas')
+            )
+
+            # Mapear tipos de actividad a metas (de la base de datos, no de request.user)
+            metas_map, _ = metas_guardadas(user.id)
+
+            progreso = []
+            for tipo, meta in metas_map.items():
+                horas_alcanzadas = horas_por_tipo.get(tipo) or 0
+                if not horas_alcanzadas and not meta > 0:
+                    continue
                 progreso.append({
                     'tipo_actividad': tipo,
                     'horas_objetivo': meta,
-                    'horas_alcanzadas': 0,
-                    'porcentaje': 0,
-                    'horas_restantes': meta
+                    'horas_alcanzadas': horas_alcanzadas,
+                    'porcentaje': (horas_alcanzadas / meta * 100) if meta > 0 else 0,
+                    'horas_restantes': max(meta - horas_alcanzadas, 0)
                 })
-        
-        serializer = ProgresoMetaSerializer(progreso, many=True)
-        return Response(serializer.data)
+
+            return list(ProgresoMetaSerializer(progreso, many=True, context={'request': request}).data)
+
+        return Response(respuesta_cacheada('mi_progreso', request, construir))
     
     @extend_schema(
         description="""**🎓 SOLO BECARIOS** - Ver mi historial de actividades
@@ -87,16 +91,33 @@ class ProgressViewSet(viewsets.ViewSet):
         - Estado de aprobación de cada registro
         - Horas reportadas y fechas de registro
         - Detalles completos de cada actividad
+
+        Con `?paginacion=cursor` la respuesta se pagina por cursor (`next`, `previous`, `results`).
         """
     )
     @action(detail=False, methods=['get'])
     def historial(self, request):
         user = request.user
-        registros = RegistroHoras.objects.filter(becario=user).select_related('actividad')
-        
-        from records.serializers import RegistroHorasSerializer
-        serializer = RegistroHorasSerializer(registros, many=True)
-        return Response(serializer.data)
+
+        def construir():
+            from records.serializers import RegistroHorasSerializer
+
+            registros = RegistroHoras.objects.filter(becario=user).select_related('becario')
+            select, prefetch = relaciones_para(
+                RegistroHorasSerializer, RegistroHoras, parsear_rutas(request.query_params.get('expand', ''))
+            )
+            registros = registros.select_related(*select).prefetch_related(*prefetch)
+            contexto = {'request': request}
+
+            paginator = KeysetPagination()
+            pagina = paginator.paginate_queryset(registros, request, view=self)
+            if pagina is not None:
+                return paginator.get_paginated_response(
+                    list(RegistroHorasSerializer(pagina, many=True, context=contexto).data)
+                ).data
+            return list(RegistroHorasSerializer(registros, many=True, context=contexto).data)
+
+        return Response(respuesta_cacheada('historial', request, construir))
     
     @extend_schema(
         description="""**👑 SOLO ADMINISTRADORES** - Ver progreso general
@@ -112,48 +133,72 @@ class ProgressViewSet(viewsets.ViewSet):
         - Progreso individual de cada becario
         - Porcentaje de cumplimiento por becario
         - Comparativa entre horas aprobadas y metas establecidas
+
+        **Parámetros opcionales:**
+        - `rol`, `carrera`, `universidad`: filtros exactos (sin distinguir mayúsculas)
+        - `cumplimiento`: `sin_iniciar`, `en_progreso` o `completado`
+        - `ordering`: campo de ordenamiento, p. ej. `-porcentaje_cumplimiento` (por defecto) o `last_name`
+        - `page`, `page_size`: paginación (50 por página, máximo 500)
         """
     )
     @action(detail=False, methods=['get'])
     def progreso_general(self, request):
         if request.user.rol != 'administrador':
             return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Estadísticas generales
-        total_becarios = Usuario.objects.filter(rol='becario').count()
-        total_horas_aprobadas = RegistroHoras.objects.filter(
-            estado_aprobacion='A'
-        ).aggregate(total=Sum('horas_reportadas'))['total'] or 0
-        
-        # Progreso individual por becario
-        becarios_progreso = []
-        for becario in Usuario.objects.filter(rol='becario'):
-            horas_becario = RegistroHoras.objects.filter(
-                becario=becario, estado_aprobacion='A'
-            ).aggregate(total=Sum('horas_reportadas'))['total'] or 0
-            
-            meta_total = (
-                becario.meta_horas_voluntariado_interno +
-                becario.meta_horas_voluntariado_externo +
-                becario.meta_horas_chat_ingles +
-                becario.meta_horas_talleres
+
+        try:
+            queryset = progreso_general_queryset(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def estadisticas_generales(alias=None):
+            # Con ``alias`` (desde ``en_todos``) se consulta ese shard como en ``ResultadosFusionados``;
+            # sin él decide el router (shard de la petición o réplica de lectura)
+            metas, usuarios = ProgresoMeta.objects.all(), Usuario.objects.all()
+            if alias is not None:
+                metas, usuarios = metas.using(alias), usuarios.using(alias)
+            total_horas = metas.aggregate(total=Sum('horas_alcanzadas'))['total'] or 0
+            return usuarios.filter(rol='becario').count(), total_horas
+
+        shards = sharding.consulta_en_todos(request)
+        if shards:
+            # Sharding por universidad: cada shard se consulta en paralelo y se mezclan los resultados
+            por_shard = sharding.en_todos(estadisticas_generales, shards).values()
+            total_becarios = sum(becarios for becarios, _ in por_shard)
+            total_horas_aprobadas = sum(horas for _, horas in por_shard)
+            queryset = sharding.ResultadosFusionados(
+                {alias: queryset for alias in shards}, queryset.query.order_by
             )
-            
-            porcentaje = (horas_becario / meta_total * 100) if meta_total > 0 else 0
-            
-            becarios_progreso.append({
-                'becario': becario,
-                'horas_totales_aprobadas': horas_becario,
-                'meta_total': meta_total,
-                'porcentaje_cumplimiento': round(porcentaje, 2)
-            })
-        
-        serializer = ProgresoGeneralSerializer(becarios_progreso, many=True)
-        
+        else:
+            # Estadísticas generales
+            total_becarios, total_horas_aprobadas = estadisticas_generales()
+
+        # Progreso individual por becario: una sola consulta agrupada por página (y shard)
+        paginator = ProgresoGeneralPagination()
+        pagina = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ProgresoGeneralSerializer(pagina, many=True, context={'request': request})
+        progreso_becarios = serializer.data
+        if shards:
+            progreso_becarios = [{**fila, 'shard': becario.shard} for fila, becario in zip(progreso_becarios, pagina)]
+
         return Response({
             'estadisticas_generales': {
                 'total_becarios': total_becarios,
                 'total_horas_aprobadas': float(total_horas_aprobadas),
             },
-            'progreso_becarios': serializer.data
-        })
\ No newline at end of file
+            'count': paginator.page.paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'progreso_becarios': progreso_becarios
+        })
+
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Estadísticas de la caché de progreso
+
+        Retorna los aciertos, fallos y la tasa de aciertos de la caché de `mi_progreso` e `historial`
+        en el proceso que atiende la petición.
+        """
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsAdministrador])
+    def estadisticas_cache(self, request):
+        return Response(estadisticas())
@@ -0,0 +1,134 @@
+"""
+Exportación CSV en streaming de usuarios y registros de horas.
+
+Las filas se leen con ``values_list()`` (sin instanciar modelos ni pasar por
+serializers) y ``iterator(chunk_size=...)`` (sin cachear el queryset), y se
+escriben una a una en un ``StreamingHttpResponse``: la memoria no depende del
+número de filas y los primeros bytes salen en cuanto llega el primer bloque.
+
+Formato: una fila de encabezado (``ENCABEZADO``) y filas de las secciones
+``users`` y ``hours``. Cambia respecto al informe que armaba el frontend:
+
+- La sección de registros se llama ``hours`` (antes ``pending_hour``): incluye
+  cualquier estado, según el filtro ``estado``.
+- ``activity`` es el título de la actividad, que antes iba en
+  ``activity_type``; ``activity_type`` es ahora el tipo.
+- Las filas de registros traen nombre, email y sexo del becario en sus
+  columnas (antes ``sexo`` iba al final y las columnas quedaban corridas).
+
+Como el listado de usuarios de la API, la sección ``users`` solo incluye
+usuarios activos salvo con ``usuarios=todos``.
+"""
+import csv
+from django.utils.dateparse import parse_date
+from activities.models import Actividad
+from users.models import Usuario
+from .models import RegistroHoras
+
+# Filas por consulta al recorrer el cursor
+TAMANO_BLOQUE = 2000
+
+SECCIONES = ('usuarios', 'registros')
+
+# Valores de ``usuarios``: solo activos (por defecto) o todos
+ALCANCES_USUARIOS = ('activos', 'todos')
+
+ENCABEZADO = ['section', 'id', 'name', 'email', 'sexo', 'user_id', 'hours', 'date',
+              'activity', 'activity_type', 'estado_aprobacion']
+
+
+class Eco:
+    """Pseudo-buffer para ``csv.writer``: devuelve la línea en vez de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def _nombre(nombre, apellido, username):
+    return f'{nombre} {apellido}'.strip() or username
+
+
+def parsear_filtros(params):
+    """
+    Valida los query params de la exportación.
+
+    Filtros: ``estado`` (``P``, ``A``, ``R``; admite varios separados por comas),
+    ``desde`` / ``hasta`` (``fecha_registro``, ``YYYY-MM-DD``), ``tipo`` (tipo de
+    actividad), ``becario`` (id), ``incluir`` (``usuarios``, ``registros``) y
+    ``usuarios`` (``activos`` o ``todos``). Devuelve ``(filtros, incluir,
+    solo_activos)``; lanza ``ValueError`` si algún parámetro no es válido.
+    """
+    filtros = {}
+
+    estados = [e.strip().upper() for e in params.get('estado', '').split(',') if e.strip()]
+    invalidos = set(estados) - set(dict(RegistroHoras.ESTADO_CHOICES))
+    if invalidos:
+        raise ValueError(f'Estado inválido: {", ".join(sorted(invalidos))}')
+    if estados:
+        filtros['estado_aprobacion__in'] = estados
+
+    for param, lookup in (('desde', 'fecha_registro__gte'), ('hasta', 'fecha_registro__lte')):
+        valor = params.get(param)
+        if valor:
+            fecha = parse_date(valor)
+            if fecha is None:
+                raise ValueError(f'Fecha inválida en "{param}": {valor}')
+            filtros[lookup] = fecha
+
+    tipo = params.get('tipo')
+    if tipo:
+        if tipo not in dict(Actividad.TIPO_CHOICES):
+            raise ValueError(f'Tipo inválido: {tipo}')
+        filtros['actividad__tipo'] = tipo
+
+    becario = params.get('becario')
+    if becario:
+        try:
+            filtros['becario_id'] = int(becario)
+        except ValueError:
+            raise ValueError(f'Becario inválido: {becario}')
+
+    usuarios = params.get('usuarios', ALCANCES_USUARIOS[0])
+    if usuarios not in ALCANCES_USUARIOS:
+        raise ValueError(f'"usuarios" debe ser {" o ".join(ALCANCES_USUARIOS)}')
+
+    incluir = [s.strip() for s in params.get('incluir', ','.join(SECCIONES)).split(',') if s.strip()]
+    if not incluir or set(incluir) - set(SECCIONES):
+        raise ValueError(f'"incluir" debe contener {" y/o ".join(SECCIONES)}')
+
+    return filtros, incluir, usuarios == 'activos'
+
+
+def filas_usuarios(filtros, solo_activos=True):
+    queryset = Usuario.objects.order_by('id')
+    if solo_activos:
+        queryset = queryset.filter(is_active=True)
+    if 'becario_id' in filtros:
+        queryset = queryset.filter(id=filtros['becario_id'])
+    columnas = queryset.values_list('id', 'first_name', 'last_name', 'username', 'email', 'sexo')
+    for id_, nombre, apellido, username, email, sexo in columnas.iterator(chunk_size=TAMANO_BLOQUE):
+        yield ['users', id_, _nombre(nombre, apellido, username), email, sexo, '', '', '', '', '', '']
+
+
+def filas_registros(filtros):
+    columnas = RegistroHoras.objects.filter(**filtros).order_by('id').values_list(
+        'id', 'becario__first_name', 'becario__last_name', 'becario__username', 'becario__email',
+        'becario__sexo', 'becario_id', 'horas_reportadas', 'fecha_registro',
+        'actividad__titulo', 'actividad__tipo', 'estado_aprobacion'
+    )
+    for (id_, nombre, apellido, username, email, sexo, becario_id, horas, fecha,
+         titulo, tipo, estado) in columnas.iterator(chunk_size=TAMANO_BLOQUE):
+        yield ['hours', id_, _nombre(nombre, apellido, username), email, sexo, becario_id,
+               horas, fecha.isoformat(), titulo, tipo, estado]
+
+
+def generar_csv(filtros, incluir, solo_activos=True):
+    """Genera el CSV línea a línea; las secciones se recorren en el orden de ``SECCIONES``"""
+    writer = csv.writer(Eco())
+    yield writer.writerow(ENCABEZADO)
+    if 'usuarios' in incluir:
+        for fila in filas_usuarios(filtros, solo_activos):
+            yield writer.writerow(fila)
+    if 'registros' in incluir:
+        for fila in filas_registros(filtros):
+            yield writer.writerow(fila)
@@ -0,0 +1,237 @@
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from io import StringIO
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from backend import sharding
+from users.models import Usuario
+from activities.models import Actividad
+from records.models import RegistroHoras
+from sync.changes import cursor_actual
+
+PREFIJO = 'bench'
+PASSWORD = 'bench-password'
+
+# (nombre, rol, método, ruta, cuerpo). Las rutas y cuerpos se formatean con los ids del dataset.
+ENDPOINTS = [
+    ('users.login', None, 'post', '/api/users/auth/login/', {'email': '{becario_email}', 'password': PASSWORD}),
+    ('users.login_async', None, 'post', '/api/users/auth/login_async/', {'email': '{becario_email}', 'password': PASSWORD}),
+    ('users.list', 'admin', 'get', '/api/users/usuarios/', None),
+    ('users.list_cursor', 'admin', 'get', '/api/users/usuarios/?paginacion=cursor', None),
+    ('users.retrieve', 'admin', 'get', '/api/users/usuarios/{becario_id}/', None),
+    ('users.mi_perfil', 'becario', 'get', '/api/users/usuarios/mi_perfil/', None),
+    ('activities.list_admin', 'admin', 'get', '/api/activities/actividades/', None),
+    ('activities.list_becario', 'becario', 'get', '/api/activities/actividades/', None),
+    ('activities.retrieve', 'admin', 'get', '/api/activities/actividades/{actividad_id}/', None),
+    ('activities.buscar', 'becario', 'get', '/api/activities/actividades/buscar/?q=act', None),
+    ('activities.mis_actividades_asignadas', 'becario', 'get',
+     '/api/activities/actividades/mis_actividades_asignadas/', None),
+    ('records.list_admin_cursor', 'admin', 'get', '/api/records/registros-horas/?paginacion=cursor', None),
+    ('records.list_becario', 'becario', 'get', '/api/records/registros-horas/', None),
+    ('records.retrieve', 'admin', 'get', '/api/records/registros-horas/{registro_id}/?expand=actividad_detalle', None),
+    ('records.pendientes', 'admin', 'get', '/api/records/registros-horas/pendientes/', None),
+    ('records.pendientes_cursor', 'admin', 'get', '/api/records/registros-horas/pendientes/?paginacion=cursor', None),
+    ('records.create', 'becario', 'post', '/api/records/registros-horas/',
+     {'actividad': '{actividad_asignada_id}', 'horas_reportadas': '2.00', 'descripcion_manual': 'benchmark'}),
+    ('records.exportar_csv', 'admin', 'get', '/api/records/registros-horas/exportar_csv/?estado=A', None),
+    ('progress.mi_progreso', 'becario', 'get', '/api/progress/progress/mi_progreso/', None),
+    ('progress.historial', 'becario', 'get', '/api/progress/progress/historial/', None),
+    ('progress.progreso_general', 'admin', 'get', '/api/progress/progress/progreso_general/', None),
+    # Cursor tomado tras generar el dataset: sincronización sin cambios (estado estacionario)
+    ('sync.delta_becario', 'becario', 'get', '/api/sync/?cursor={sync_cursor}', None),
+    ('sync.delta_admin', 'admin', 'get', '/api/sync/?cursor={sync_cursor}', None),
+]
+
+METRICAS = ('p50_ms', 'p95_ms', 'queries', 'peak_kb', 'bytes')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the users, activities, records, progress and sync endpoints in-process against "
+        "generated datasets of several sizes (rolled back afterwards). Reports p50/p95 latency, "
+        "query count, tracemalloc peak and payload bytes; can save a JSON baseline and compare against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000', help='Comma separated becario counts')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per endpoint')
+        parser.add_argument('--registros', type=int, default=20, help='Hour records per becario')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Only endpoints whose name starts with this prefix (e.g. "progress.")')
+        parser.add_argument('--output', help='Write results to this JSON baseline file')
+        parser.add_argument('--compare', help='Compare against this JSON baseline file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative increase that counts as a regression (0.2 = 20%%)')
+        parser.add_argument('--min-ms', type=float, default=1.0,
+                            help='Latency increases below this many ms are ignored as noise')
+        parser.add_argument('--min-kb', type=float, default=64.0,
+                            help='Peak memory increases below this many KB are ignored as noise')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the progress response cache between requests (default: measure cache misses)')
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = [int(t) for t in options['sizes'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers')
+        endpoints = [e for e in ENDPOINTS if not options['only'] or e[0].startswith(options['only'])]
+
+        resultados = {}
+        # Todas las peticiones salen de la misma IP y cuenta: sin limitación de intentos (users/throttling.py)
+        with override_settings(THROTTLING_PUBLICO={'ACTIVO': False}):
+            for tamano in tamanos:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {tamano} becarios =='))
+                with transaction.atomic():
+                    contexto = self.preparar(tamano, options)
+                    contexto['warm_cache'] = options['warm_cache']
+                    resultados[str(tamano)] = {
+                        nombre: self.medir(nombre, rol, metodo, ruta, cuerpo, contexto, options['iterations'])
+                        for nombre, rol, metodo, ruta, cuerpo in endpoints
+                    }
+                    transaction.set_rollback(True)
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'iteraciones': options['iterations'],
+            'registros_por_becario': options['registros'],
+            'seed': options['seed'],
+            'warm_cache': options['warm_cache'],
+            'resultados': resultados,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(informe, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        if options['compare']:
+            self.comparar(informe, options)
+
+    def preparar(self, tamano, options):
+        inicio = time.perf_counter()
+        call_command(
+            'generate_dataset', becarios=tamano, actividades=max(4, tamano // 5), asignaciones=20,
+            registros=options['registros'], seed=options['seed'], prefix=PREFIJO, password=PASSWORD,
+            stdout=StringIO(),
+        )
+        caches['progress'].clear()
+        self.stdout.write(f'Dataset generated in {time.perf_counter() - inicio:.1f}s')
+
+        admin = Usuario.objects.get(username=f'{PREFIJO}_admin')
+        becario = Usuario.objects.get(username=f'{PREFIJO}_becario_0')
+        asignada = Actividad.objects.filter(becarios_asignados=becario, is_active=True).order_by('id').first() \
+            or Actividad.objects.filter(titulo__startswith=f'{PREFIJO} ').order_by('id').first()
+        clientes = {None: Client(HTTP_HOST='localhost')}
+        # Con sharding el administrador se queda en el shard del dataset: sin X-Shard los
+        # endpoints de administración consultarían todos los shards desde otros hilos,
+        # que no ven la transacción que se deshace al terminar
+        extra_admin = {sharding.CABECERA_SHARD: sharding.alias_actual()} if sharding.activo() else {}
+        for rol, usuario in (('admin', admin), ('becario', becario)):
+            token, _ = Token.objects.get_or_create(user=usuario)
+            extra = extra_admin if rol == 'admin' else {}
+            clientes[rol] = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}', **extra)
+        return {
+            'clientes': clientes,
+            'ids': {
+                'becario_id': becario.id,
+                'becario_email': becario.email,
+                'actividad_id': asignada.id,
+                'actividad_asignada_id': asignada.id,
+                'registro_id': RegistroHoras.objects.filter(becario=becario).order_by('id').values_list('id', flat=True).first(),
+                'sync_cursor': cursor_actual(),
+            },
+        }
+
+    def medir(self, nombre, rol, metodo, ruta, cuerpo, contexto, iteraciones):
+        cliente = contexto['clientes'][rol]
+        ids = contexto['ids']
+        url = ruta.format(**ids)
+        datos = {k: v.format(**ids) for k, v in cuerpo.items()} if cuerpo else None
+
+        def peticion():
+            if not contexto['warm_cache']:
+                caches['progress'].clear()
+            # Las escrituras se deshacen para que todas las iteraciones vean el mismo dataset
+            with transaction.atomic():
+                if metodo == 'get':
+                    respuesta = cliente.get(url)
+                else:
+                    respuesta = cliente.post(url, data=json.dumps(datos), content_type='application/json')
+                contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+                transaction.set_rollback(True)
+            if respuesta.status_code >= 400:
+                raise CommandError(f'{nombre}: {metodo.upper()} {url} -> {respuesta.status_code} {contenido[:200]!r}')
+            return contenido
+
+        peticion()  # calentamiento
+        with CaptureQueriesContext(connection) as consultas:
+            contenido = peticion()
+        # Los savepoints de la propia medición no cuentan como consultas del endpoint
+        numero_consultas = sum(1 for q in consultas.captured_queries if 'SAVEPOINT' not in q['sql'])
+
+        tracemalloc.start()
+        peticion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            peticion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+
+        resultado = {
+            'p50_ms': round(statistics.median(tiempos), 3),
+            'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+            'queries': numero_consultas,
+            'peak_kb': round(pico / 1024, 1),
+            'bytes': len(contenido),
+        }
+        self.stdout.write(
+            f"  {nombre:<40} p50={resultado['p50_ms']:>8.2f}ms p95={resultado['p95_ms']:>8.2f}ms "
+            f"queries={resultado['queries']:>3} peak={resultado['peak_kb']:>8.1f}KB bytes={resultado['bytes']}"
+        )
+        return resultado
+
+    def comparar(self, informe, options):
+        try:
+            with open(options['compare'], encoding='utf-8') as fh:
+                base = json.load(fh)['resultados']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read baseline {options["compare"]}: {e}')
+
+        umbral = 1 + options['threshold']
+        regresiones = []
+        for tamano, endpoints in informe['resultados'].items():
+            for nombre, actual in endpoints.items():
+                anterior = base.get(tamano, {}).get(nombre)
+                if anterior is None:
+                    continue
+                for metrica in METRICAS:
+                    antes, ahora = anterior.get(metrica), actual[metrica]
+                    if antes is None:
+                        continue
+                    if metrica == 'queries':
+                        peor = ahora > antes
+                    elif metrica.endswith('_ms'):
+                        peor = ahora > antes * umbral and ahora - antes > options['min_ms']
+                    elif metrica == 'peak_kb':
+                        peor = ahora > antes * umbral and ahora - antes > options['min_kb']
+                    else:
+                        peor = ahora > antes * umbral
+                    if peor:
+                        regresiones.append(f'{tamano} {nombre} {metrica}: {antes} -> {ahora}')
+
+        if regresiones:
+            for linea in regresiones:
+                self.stdout.write(self.style.ERROR(f'  REGRESSION {linea}'))
+            raise CommandError(f'{len(regresiones)} regressions against {options["compare"]}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
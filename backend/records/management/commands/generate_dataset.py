@@ -0,0 +1,190 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from users import directory
+from users.models import Usuario
+from activities.models import Actividad
+from activities.visibility import reconstruir
+from records.models import RegistroHoras
+
+UNIVERSIDADES = ['UCV', 'USB', 'UCAB', 'UNIMET', 'LUZ', 'ULA', 'UC', 'UDO']
+CARRERAS = ['Ingeniería Informática', 'Ingeniería Civil', 'Derecho', 'Medicina', 'Administración',
+            'Comunicación Social', 'Psicología', 'Arquitectura', 'Economía', 'Educación']
+HORAS = [Decimal(h) for h in ('1', '1.5', '2', '2.5', '3', '4')]
+METAS = [Decimal(m) for m in ('0', '10', '20', '30', '40')]
+
+
+def lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a seeded, reproducible synthetic dataset (becarios, activities of every type, "
+        "assignments and hour records) with batched bulk_create, then rebuild the visibility "
+        "index and the progress ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--becarios', type=int, default=1000)
+        parser.add_argument('--actividades', type=int, default=200)
+        parser.add_argument('--asignaciones', type=int, default=20, help='Becarios assigned per activity')
+        parser.add_argument('--registros', type=int, default=50, help='Hour records per becario')
+        parser.add_argument('--aprobados', type=float, default=0.7,
+                            help='Share of approved records; the rest is split 2:1 pending/rejected')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='synthetic', help='Prefix for usernames and activity titles')
+        parser.add_argument('--password', default='synthetic123', help='Password shared by every generated user')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['aprobados'] <= 1:
+            raise CommandError('--aprobados must be between 0 and 1')
+        prefijo = options['prefix']
+        if Usuario.objects.filter(username__startswith=f'{prefijo}_').exists():
+            raise CommandError(f'Users with prefix "{prefijo}_" already exist; use another --prefix')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # PBKDF2 una sola vez: hashear por usuario dominaría el tiempo total
+        self.password = make_password(options['password'])
+        inicio = time.perf_counter()
+
+        with transaction.atomic():
+            admin_id, becarios_ids = self.crear_usuarios(prefijo, options['becarios'])
+            actividades_ids = self.crear_actividades(prefijo, options['actividades'], admin_id, becarios_ids)
+            asignadas = self.asignar(actividades_ids, becarios_ids, options['asignaciones'])
+            self.crear_registros(becarios_ids, actividades_ids, asignadas, admin_id,
+                                 options['registros'], options['aprobados'])
+
+            # bulk_create no dispara señales: índices derivados en bloque
+            paso = time.perf_counter()
+            altas, _, _ = reconstruir()
+            self.stdout.write(f'Visibility index: {altas} rows in {time.perf_counter() - paso:.1f}s')
+            paso = time.perf_counter()
+            directory.indexar([admin_id, *becarios_ids])
+            self.stdout.write(f'User directory indexed in {time.perf_counter() - paso:.1f}s')
+            paso = time.perf_counter()
+            call_command('reconcile_progress', stdout=self.stdout)
+            self.stdout.write(f'Progress ledger rebuilt in {time.perf_counter() - paso:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS(f'Dataset generated in {time.perf_counter() - inicio:.1f}s'))
+
+    def crear_usuarios(self, prefijo, cantidad):
+        rng = self.rng
+        admin = Usuario.objects.create(
+            username=f'{prefijo}_admin', email=f'{prefijo}_admin@example.com', rol='administrador',
+            password=self.password, first_name='Admin', last_name=prefijo.capitalize(),
+            configuracion_inicial_completada=True,
+        )
+
+        def becarios():
+            for i in range(cantidad):
+                yield Usuario(
+                    username=f'{prefijo}_becario_{i}', email=f'{prefijo}_becario_{i}@example.com',
+                    password=self.password, rol='becario', first_name=f'Becario{i}', last_name=prefijo.capitalize(),
+                    sexo=rng.choice('MF'), fecha_nacimiento=date(1995, 1, 1) + timedelta(days=rng.randint(0, 3650)),
+                    universidad=rng.choice(UNIVERSIDADES), carrera=rng.choice(CARRERAS),
+                    semestre=str(rng.randint(1, 10)), configuracion_inicial_completada=True,
+                    meta_horas_voluntariado_interno=rng.choice(METAS),
+                    meta_horas_voluntariado_externo=rng.choice(METAS),
+                    meta_horas_chat_ingles=rng.choice(METAS),
+                    meta_horas_talleres=rng.choice(METAS),
+                )
+
+        self.insertar(Usuario, becarios(), 'becarios')
+        becarios_ids = list(
+            Usuario.objects.filter(username__startswith=f'{prefijo}_becario_').order_by('id').values_list('id', flat=True)
+        )
+        return admin.id, becarios_ids
+
+    def crear_actividades(self, prefijo, cantidad, admin_id, becarios_ids):
+        rng = self.rng
+        tipos = [t for t, _ in Actividad.TIPO_CHOICES]
+        modalidades = [m for m, _ in Actividad.MODALIDAD_CHOICES]
+        hoy = date.today()
+
+        def actividades():
+            for i in range(cantidad):
+                yield Actividad(
+                    # Todos los tipos aparecen aunque haya pocas actividades
+                    titulo=f'{prefijo} actividad {i}', tipo=tipos[i % len(tipos)],
+                    descripcion=f'Actividad sintética {i}', fecha=hoy - timedelta(days=rng.randint(0, 365)),
+                    duracion_horas=rng.choice(HORAS), modalidad=rng.choice(modalidades),
+                    en_catalogo=rng.random() < 0.7, is_active=rng.random() < 0.95,
+                    creador_id=rng.choice(becarios_ids) if becarios_ids and rng.random() < 0.05 else admin_id,
+                )
+
+        self.insertar(Actividad, actividades(), 'actividades')
+        return list(
+            Actividad.objects.filter(titulo__startswith=f'{prefijo} actividad ').order_by('id').values_list('id', flat=True)
+        )
+
+    def asignar(self, actividades_ids, becarios_ids, por_actividad):
+        """Asigna becarios a cada actividad. Devuelve becario_id -> [actividad_id]"""
+        rng = self.rng
+        por_actividad = min(por_actividad, len(becarios_ids))
+        asignadas = {becario_id: [] for becario_id in becarios_ids}
+        Asignacion = Actividad.becarios_asignados.through
+
+        def filas():
+            for actividad_id in actividades_ids:
+                for becario_id in rng.sample(becarios_ids, por_actividad):
+                    asignadas[becario_id].append(actividad_id)
+                    yield Asignacion(actividad_id=actividad_id, usuario_id=becario_id)
+
+        self.insertar(Asignacion, filas(), 'asignaciones')
+        return asignadas
+
+    def crear_registros(self, becarios_ids, actividades_ids, asignadas, admin_id, por_becario, aprobados):
+        if not actividades_ids:
+            return
+        rng = self.rng
+        ahora = timezone.now()
+
+        def registros():
+            for becario_id in becarios_ids:
+                # Se registran horas sobre todo en actividades asignadas
+                propias = asignadas[becario_id] or actividades_ids
+                for _ in range(por_becario):
+                    actividad_id = rng.choice(propias) if rng.random() < 0.9 else rng.choice(actividades_ids)
+                    azar = rng.random()
+                    estado = 'A' if azar < aprobados else ('P' if azar < aprobados + (1 - aprobados) * 2 / 3 else 'R')
+                    revisado = estado != 'P'
+                    yield RegistroHoras(
+                        becario_id=becario_id, actividad_id=actividad_id,
+                        horas_reportadas=rng.choice(HORAS), estado_aprobacion=estado,
+                        fecha_aprobacion=ahora if revisado else None,
+                        administrador_aprobo_id=admin_id if revisado else None,
+                    )
+
+        primero = (RegistroHoras.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        self.insertar(RegistroHoras, registros(), 'registros')
+
+        # fecha_registro es auto_now_add: se lleva a la fecha de la actividad en un solo UPDATE
+        paso = time.perf_counter()
+        RegistroHoras.objects.filter(id__gte=primero).update(fecha_registro=Subquery(
+            Actividad.objects.filter(pk=OuterRef('actividad_id')).values('fecha')[:1]
+        ))
+        self.stdout.write(f'  registros: fecha_registro set in {time.perf_counter() - paso:.1f}s')
+
+    def insertar(self, modelo, objetos, nombre):
+        inicio = time.perf_counter()
+        total = 0
+        for lote in lotes(objetos, self.batch_size):
+            modelo.objects.bulk_create(lote, batch_size=self.batch_size)
+            total += len(lote)
+            if total % (self.batch_size * 20) == 0:
+                self.stdout.write(f'  {nombre}: {total}')
+        transcurrido = time.perf_counter() - inicio
+        self.stdout.write(f'  {nombre}: {total} rows in {transcurrido:.1f}s ({total / (transcurrido or 1):.0f}/s)')
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from backend import sharding
+from users.models import Usuario
+from activities.models import Actividad
+from records.models import RegistroHoras
+
+PASSWORD = 'load-password'
+MEZCLA_POR_DEFECTO = 'login=1,mi_progreso=6,crear_registro=3,pendientes=1,aprobar_rechazar=2'
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0
+
+
+class ClienteASGI:
+    """Llama a la aplicación ASGI directamente, sin sockets ni servidor"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def peticion(self, metodo, ruta, token=None, datos=None, shard=None):
+        ruta, _, query = ruta.partition('?')
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        headers = [(b'host', b'localhost'), (b'content-type', b'application/json'),
+                   (b'content-length', str(len(cuerpo)).encode())]
+        if token:
+            headers.append((b'authorization', f'Token {token}'.encode()))
+        if shard:
+            headers.append((b'x-shard', shard.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': metodo, 'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(),
+            'query_string': query.encode(), 'root_path': '', 'headers': headers,
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        pendiente = [{'type': 'http.request', 'body': cuerpo, 'more_body': False}]
+        respuesta = {'status': None, 'body': []}
+
+        async def receive():
+            if pendiente:
+                return pendiente.pop()
+            # Sin desconexión: Django cancela esta espera al terminar la respuesta
+            await asyncio.Future()
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                respuesta['status'] = mensaje['status']
+            elif mensaje['type'] == 'http.response.body':
+                respuesta['body'].append(mensaje.get('body', b''))
+
+        await self.app(scope, receive, send)
+        return respuesta['status'], b''.join(respuesta['body'])
+
+
+class Escenario:
+    """Estado compartido por los clientes virtuales y definición de cada operación"""
+
+    def __init__(self, cliente, rng, admin_token, becarios, pendientes, shard=None):
+        self.cliente = cliente
+        self.rng = rng
+        self.admin_token = admin_token
+        # Shard del dataset: la bandeja paginada por cursor lo requiere con sharding
+        self.shard = shard
+        # [(email, token, [actividad_id])]
+        self.becarios = becarios
+        self.pendientes = pendientes
+
+    async def login(self):
+        email, _, _ = self.rng.choice(self.becarios)
+        return await self.cliente.peticion('POST', '/api/users/auth/login/', datos={'email': email, 'password': PASSWORD})
+
+    async def login_async(self):
+        email, _, _ = self.rng.choice(self.becarios)
+        return await self.cliente.peticion('POST', '/api/users/auth/login_async/', datos={'email': email, 'password': PASSWORD})
+
+    async def mi_progreso(self):
+        _, token, _ = self.rng.choice(self.becarios)
+        return await self.cliente.peticion('GET', '/api/progress/progress/mi_progreso/', token)
+
+    async def crear_registro(self):
+        _, token, actividades = self.rng.choice(self.becarios)
+        return await self.cliente.peticion('POST', '/api/records/registros-horas/', token, {
+            'actividad': self.rng.choice(actividades), 'horas_reportadas': '2.00', 'descripcion_manual': 'load test',
+        })
+
+    async def pendientes_admin(self):
+        return await self.cliente.peticion(
+            'GET', '/api/records/registros-horas/pendientes/?paginacion=cursor', self.admin_token, shard=self.shard
+        )
+
+    async def aprobar_rechazar(self):
+        if not self.pendientes:
+            # Como haría un administrador: consultar la bandeja de pendientes y aprobar desde ahí
+            status, cuerpo = await self.pendientes_admin()
+            if status != 200:
+                return status, cuerpo
+            self.pendientes.extend(r['id'] for r in json.loads(cuerpo)['results'])
+            if not self.pendientes:
+                return status, cuerpo
+        registro_id = self.pendientes.pop(self.rng.randrange(len(self.pendientes)))
+        return await self.cliente.peticion(
+            'POST', f'/api/records/registros-horas/{registro_id}/aprobar_rechazar/', self.admin_token,
+            {'accion': self.rng.choice(['aprobar', 'aprobar', 'rechazar'])}, shard=self.shard,
+        )
+
+    def operacion(self, nombre):
+        return {
+            'login': self.login,
+            'login_async': self.login_async,
+            'mi_progreso': self.mi_progreso,
+            'crear_registro': self.crear_registro,
+            'pendientes': self.pendientes_admin,
+            'aprobar_rechazar': self.aprobar_rechazar,
+        }[nombre]
+
+
+class Command(BaseCommand):
+    help = (
+        "In-process concurrent load test of the ASGI application (backend.asgi) with a configurable "
+        "traffic mix. Sweeps concurrency levels and reports throughput, latency percentiles and "
+        "error rates, including SQLite 'database is locked' errors. Writes to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16', help='Comma separated virtual client counts')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency level')
+        parser.add_argument('--mix', default=MEZCLA_POR_DEFECTO,
+                            help=f'Operation weights (default: {MEZCLA_POR_DEFECTO})')
+        parser.add_argument('--prefix', default='load', help='Dataset prefix; generated if it does not exist')
+        parser.add_argument('--becarios', type=int, default=200, help='Becarios when generating the dataset')
+        parser.add_argument('--clientes-becario', type=int, default=50, help='Distinct becario sessions used')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            niveles = [int(c) for c in options['concurrency'].split(',') if c.strip()]
+            mezcla = {}
+            for parte in options['mix'].split(','):
+                nombre, _, peso = parte.partition('=')
+                mezcla[nombre.strip()] = float(peso or 1)
+        except ValueError:
+            raise CommandError('Invalid --concurrency or --mix')
+        validas = {'login', 'login_async', 'mi_progreso', 'crear_registro', 'pendientes', 'aprobar_rechazar'}
+        if not mezcla or set(mezcla) - validas:
+            raise CommandError(f'--mix operations must be among: {", ".join(sorted(validas))}')
+
+        rng = random.Random(options['seed'])
+        admin_token, becarios, pendientes = self.preparar(options, rng)
+
+        # Importar aquí: get_asgi_application() no debe ejecutarse al cargar los comandos
+        from backend.asgi import application
+        shard = sharding.alias_actual() if sharding.activo() else None
+        escenario = Escenario(ClienteASGI(application), rng, admin_token, becarios, pendientes, shard)
+
+        self.stdout.write(f'Mix: {mezcla}')
+        # Todos los clientes virtuales comparten IP: sin limitación de intentos (users/throttling.py)
+        with override_settings(THROTTLING_PUBLICO={'ACTIVO': False}):
+            for concurrencia in niveles:
+                resultados, transcurrido = asyncio.run(self.ejecutar(escenario, mezcla, concurrencia, options['duration']))
+                self.informar(concurrencia, resultados, transcurrido)
+
+    def preparar(self, options, rng):
+        prefijo = options['prefix']
+        if not Usuario.objects.filter(username=f'{prefijo}_admin').exists():
+            self.stdout.write(f'Generating dataset "{prefijo}" ({options["becarios"]} becarios)...')
+            call_command('generate_dataset', becarios=options['becarios'], actividades=max(4, options['becarios'] // 5),
+                         registros=20, seed=options['seed'], prefix=prefijo, password=PASSWORD, stdout=self.stdout)
+
+        admin_token, _ = Token.objects.get_or_create(user=Usuario.objects.get(username=f'{prefijo}_admin'))
+        usuarios = list(Usuario.objects.filter(username__startswith=f'{prefijo}_becario_', is_active=True)
+                        .order_by('id')[:options['clientes_becario']])
+        actividades = Actividad.becarios_asignados.through.objects.filter(
+            usuario__in=usuarios, actividad__is_active=True
+        ).values_list('usuario_id', 'actividad_id')
+        por_becario = defaultdict(list)
+        for usuario_id, actividad_id in actividades:
+            por_becario[usuario_id].append(actividad_id)
+
+        becarios = []
+        for usuario in usuarios:
+            if por_becario[usuario.id]:
+                token, _ = Token.objects.get_or_create(user=usuario)
+                becarios.append((usuario.email, token.key, por_becario[usuario.id]))
+        if not becarios:
+            raise CommandError(f'No becarios with assigned activities in dataset "{prefijo}"')
+
+        pendientes = list(RegistroHoras.objects.filter(
+            becario__username__startswith=f'{prefijo}_', estado_aprobacion='P'
+        ).values_list('id', flat=True))
+        rng.shuffle(pendientes)
+        return admin_token.key, becarios, pendientes
+
+    async def ejecutar(self, escenario, mezcla, concurrencia, duracion):
+        nombres = list(mezcla)
+        pesos = [mezcla[n] for n in nombres]
+        resultados = defaultdict(lambda: {'tiempos': [], 'errores': defaultdict(int)})
+        fin = time.perf_counter() + duracion
+
+        async def cliente_virtual():
+            while time.perf_counter() < fin:
+                nombre = escenario.rng.choices(nombres, pesos)[0]
+                inicio = time.perf_counter()
+                try:
+                    status, cuerpo = await escenario.operacion(nombre)()
+                except Exception as e:
+                    status, cuerpo = type(e).__name__, str(e).encode()
+                resultado = resultados[nombre]
+                resultado['tiempos'].append((time.perf_counter() - inicio) * 1000)
+                if not isinstance(status, int) or status >= 400:
+                    tipo = 'locked' if b'database is locked' in cuerpo else status
+                    resultado['errores'][tipo] += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_virtual() for _ in range(concurrencia)))
+        return resultados, time.perf_counter() - inicio
+
+    def informar(self, concurrencia, resultados, transcurrido):
+        total = sum(len(r['tiempos']) for r in resultados.values())
+        errores = sum(sum(r['errores'].values()) for r in resultados.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'== concurrency {concurrencia}: {total} requests in {transcurrido:.1f}s '
+            f'({total / transcurrido:.1f} req/s), errors {errores} ({errores / (total or 1):.1%}) =='
+        ))
+        for nombre, r in sorted(resultados.items()):
+            tiempos = sorted(r['tiempos'])
+            detalle = ', '.join(f'{tipo}={n}' for tipo, n in r['errores'].items()) or '-'
+            self.stdout.write(
+                f'  {nombre:<18} n={len(tiempos):>5} p50={statistics.median(tiempos):>8.1f}ms '
+                f'p95={percentil(tiempos, 0.95):>8.1f}ms p99={percentil(tiempos, 0.99):>8.1f}ms errors: {detalle}'
+            )
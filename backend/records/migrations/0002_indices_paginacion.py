@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_indices_paginacion'),
+        ('records', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrohoras',
+            index=models.Index(fields=['fecha_registro', 'id'], name='registro_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrohoras',
+            index=models.Index(fields=['estado_aprobacion', 'fecha_registro', 'id'], name='registro_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrohoras',
+            index=models.Index(fields=['becario', 'fecha_registro', 'id'], name='registro_becario_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0007_indices_filtros'),
+        ('records', '0002_indices_paginacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrohoras',
+            index=models.Index(fields=['becario', 'estado_aprobacion'], name='registro_becario_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrohoras',
+            index=models.Index(condition=models.Q(('estado_aprobacion', 'P')), fields=['actividad'], name='registro_pendiente_act_idx'),
+        ),
+    ]
@@ -19,5 +19,18 @@ class RegistroHoras(models.Model):
     administrador_aprobo = models.ForeignKey(Usuario, on_delete=models.SET_NULL, 
                                            null=True, blank=True, related_name='registros_aprobados')
 
+    class Meta:
+        # Claves de la paginación por cursor: (fecha_registro, id), global, por estado y por becario
+        indexes = [
+            models.Index(fields=['fecha_registro', 'id'], name='registro_fecha_id_idx'),
+            models.Index(fields=['estado_aprobacion', 'fecha_registro', 'id'], name='registro_estado_fecha_idx'),
+            models.Index(fields=['becario', 'fecha_registro', 'id'], name='registro_becario_fecha_idx'),
+            # Libro de progreso, reconciliación y aprobación en lote por becario
+            models.Index(fields=['becario', 'estado_aprobacion'], name='registro_becario_estado_idx'),
+            # Parcial: solo los pendientes, que son pocos frente al histórico aprobado
+            models.Index(fields=['actividad'], condition=models.Q(estado_aprobacion='P'),
+                         name='registro_pendiente_act_idx'),
+        ]
+
     def __str__(self):
         return f"{self.becario.get_full_name()} - {self.actividad.titulo} - {self.horas_reportadas}h"
\ No newline at end of file
@@ -1,16 +1,21 @@
 from rest_framework import serializers
+from backend.expansion import ExpandableFieldsMixin
 from .models import RegistroHoras
-from activities.serializers import ActividadSerializer
 
-class RegistroHorasSerializer(serializers.ModelSerializer):
-    actividad_detalle = ActividadSerializer(source='actividad', read_only=True)
+class RegistroHorasSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     becario_nombre = serializers.CharField(source='becario.get_full_name', read_only=True)
     
     class Meta:
         model = RegistroHoras
-        fields = ['id', 'becario', 'becario_nombre', 'actividad', 'actividad_detalle',
+        fields = ['id', 'becario', 'becario_nombre', 'actividad',
                  'descripcion_manual', 'fecha_registro', 'horas_reportadas',
                  'estado_aprobacion', 'fecha_aprobacion', 'administrador_aprobo']
+        # Relación necesaria para becario_nombre
+        select_related_fields = ['becario']
+        # Solo con ?expand=actividad_detalle se incluye la actividad completa
+        expandable_fields = {
+            'actividad_detalle': ('activities.serializers.ActividadSerializer', {'source': 'actividad'}),
+        }
 
 class RegistroHorasCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,4 +28,29 @@ class RegistroHorasCreateSerializer(serializers.ModelSerializer):
 
 class AprobarRechazarSerializer(serializers.Serializer):
     accion = serializers.ChoiceField(choices=['aprobar', 'rechazar'])
-    observaciones = serializers.CharField(required=False, allow_blank=True)
\ No newline at end of file
+    observaciones = serializers.CharField(required=False, allow_blank=True)
+
+class AprobarRechazarLoteSerializer(serializers.Serializer):
+    accion = serializers.ChoiceField(choices=['aprobar', 'rechazar'])
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=5000,
+        help_text="IDs de los registros a procesar"
+    )
+    actividad = serializers.IntegerField(
+        required=False,
+        help_text="Procesar todos los registros pendientes de esta actividad"
+    )
+    becario = serializers.IntegerField(
+        required=False,
+        help_text="Procesar todos los registros pendientes de este becario"
+    )
+    observaciones = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        if not data.get('ids') and data.get('actividad') is None and data.get('becario') is None:
+            raise serializers.ValidationError(
+                'Debe indicar una lista de ids o un filtro (actividad o becario).'
+            )
+        return data
\ No newline at end of file
@@ -1,3 +1,443 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.cache import caches
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from activities.models import Actividad
+from backend.expansion import parsear_rutas, relaciones_para
+from backend.query_plan import PlanConsultasMixin
+from backend.sqlite import PRAGMAS_PRODUCCION
+from progress.ledger import calcular_esperado
+from progress.models import ProgresoMeta
+from users.models import Usuario
+from .management.commands.benchmark_endpoints import ENDPOINTS
+from .models import RegistroHoras
+from .serializers import RegistroHorasSerializer
+from .views import RegistroHorasViewSet
 
-# Create your tests here.
+
+class PlanConsultasRegistrosTests(PlanConsultasMixin, TestCase):
+    """Las consultas principales de los endpoints de registros no recorren tablas enteras"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', rol='becario')
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin
+        )
+        for estado in 'PAR':
+            RegistroHoras.objects.create(
+                becario=cls.becario, actividad=cls.actividad, horas_reportadas=2, estado_aprobacion=estado
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_pendientes_por_cursor(self):
+        self.client.force_authenticate(self.admin)
+        respuesta = self.assertSinEscaneosCompletos(
+            # X-Shard: con DB_SHARDS la paginación por cursor se hace en un solo shard
+            lambda: self.client.get('/api/records/registros-horas/pendientes/', {'paginacion': 'cursor'},
+                                    HTTP_X_SHARD='default')
+        )
+        self.assertEqual(len(respuesta.data['results']), 1)
+
+    def test_listado_becario(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/records/registros-horas/', {'paginacion': 'cursor'})
+        )
+        self.assertEqual(len(respuesta.data['results']), 3)
+
+    def test_aprobar_lote_por_actividad(self):
+        self.client.force_authenticate(self.admin)
+        respuesta = self.assertSinEscaneosCompletos(lambda: self.client.post(
+            '/api/records/registros-horas/aprobar_rechazar_lote/',
+            {'accion': 'aprobar', 'actividad': self.actividad.id}, format='json'
+        ))
+        self.assertEqual(respuesta.data['procesados'], 1)
+
+    def test_exportar_por_estado_y_becario(self):
+        self.client.force_authenticate(self.admin)
+
+        def exportar():
+            respuesta = self.client.get('/api/records/registros-horas/exportar_csv/', {
+                'estado': 'A', 'becario': self.becario.id, 'incluir': 'registros'
+            })
+            return b''.join(respuesta.streaming_content)
+
+        contenido = self.assertSinEscaneosCompletos(exportar)
+        self.assertEqual(len(contenido.decode().splitlines()), 2)
+
+
+class ExportacionCsvTests(TestCase):
+    """exportar_csv incluye solo usuarios activos salvo que se pida ``usuarios=todos``"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        Usuario.objects.create_user('becario', 'becario@example.com', 'clave', rol='becario')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_exportar_usuarios_activos_o_todos(self):
+        Usuario.objects.create_user('baja', 'baja@example.com', 'clave', is_active=False)
+        self.client.force_authenticate(self.admin)
+
+        def usuarios(**params):
+            respuesta = self.client.get('/api/records/registros-horas/exportar_csv/',
+                                        {'incluir': 'usuarios', **params})
+            filas = list(csv.reader(b''.join(respuesta.streaming_content).decode().splitlines()))
+            return [fila[3] for fila in filas[1:]]
+
+        self.assertEqual(usuarios(), ['admin@example.com', 'becario@example.com'])
+        self.assertEqual(usuarios(usuarios='todos'), ['admin@example.com', 'becario@example.com', 'baja@example.com'])
+        self.assertEqual(self.client.get('/api/records/registros-horas/exportar_csv/',
+                                         {'usuarios': 'inactivos'}).status_code, 400)
+
+
+class AprobacionLoteTests(TestCase):
+    """aprobar_rechazar_lote informa por id y actualiza libro y caché solo con las filas que cambió"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', rol='becario',
+                                                  meta_horas_talleres=10)
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin
+        )
+
+    def setUp(self):
+        caches['progress'].clear()
+        caches['versiones'].clear()
+        self.client = APIClient()
+        self.registros = [
+            RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad, horas_reportadas=horas,
+                                         estado_aprobacion=estado)
+            for horas, estado in ((2, 'P'), (3, 'P'), (4, 'A'))
+        ]
+
+    def lote(self, **datos):
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/records/registros-horas/aprobar_rechazar_lote/', datos, format='json')
+
+    def horas_taller(self):
+        return ProgresoMeta.objects.get(becario=self.becario, tipo_actividad='Taller').horas_alcanzadas
+
+    def mi_progreso(self):
+        self.client.force_authenticate(self.becario)
+        return self.client.get('/api/progress/progress/mi_progreso/').data[0]['horas_alcanzadas']
+
+    def test_resultados_por_id_libro_y_cache(self):
+        pendiente, otro, aprobado = (r.id for r in self.registros)
+        self.assertEqual(self.mi_progreso(), '4.00')
+
+        # Lotes de dos: la lectura y las actualizaciones se parten igual
+        with mock.patch.object(RegistroHorasViewSet, 'TAMANO_LOTE', 2):
+            respuesta = self.lote(accion='aprobar', ids=[pendiente, aprobado, 999999, otro])
+        self.assertEqual(respuesta.data['resultados'], [
+            {'id': pendiente, 'resultado': 'aprobado'},
+            {'id': aprobado, 'resultado': 'no_pendiente'},
+            {'id': 999999, 'resultado': 'no_encontrado'},
+            {'id': otro, 'resultado': 'aprobado'},
+        ])
+        self.assertEqual((respuesta.data['procesados'], respuesta.data['omitidos']), (2, 2))
+        self.assertEqual(self.horas_taller(), Decimal('9'))
+        self.assertEqual(self.mi_progreso(), '9.00')
+
+    def test_rechazo_no_suma_horas(self):
+        respuesta = self.lote(accion='rechazar', becario=self.becario.id)
+        self.assertEqual(respuesta.data['procesados'], 2)
+        self.assertEqual(set(RegistroHoras.objects.values_list('estado_aprobacion', flat=True)), {'R', 'A'})
+        self.assertEqual(self.horas_taller(), Decimal('4'))
+
+    def test_registro_resuelto_entre_lectura_y_actualizacion(self):
+        pendiente, otro, _ = (r.id for r in self.registros)
+        ahora = timezone.now
+
+        def rechazar_otro():
+            # Otra petición rechaza ``otro`` después de leerlo como pendiente
+            RegistroHoras.objects.filter(id=otro).update(estado_aprobacion='R')
+            return ahora()
+
+        with mock.patch('records.views.timezone.now', side_effect=rechazar_otro):
+            respuesta = self.lote(accion='aprobar', ids=[pendiente, otro])
+        self.assertEqual(respuesta.data['resultados'], [
+            {'id': pendiente, 'resultado': 'aprobado'},
+            {'id': otro, 'resultado': 'no_pendiente'},
+        ])
+        self.assertEqual(self.horas_taller(), Decimal('6'))
+
+
+class ExpansionTests(TestCase):
+    """?fields= y ?expand= en los registros: recorte, anidamiento y consultas constantes al expandir"""
+    URL = '/api/records/registros-horas/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.crear_registros(1)
+
+    @classmethod
+    def crear_registros(cls, cantidad):
+        for _ in range(cantidad):
+            n = RegistroHoras.objects.count()
+            becario = Usuario.objects.create_user(f'becario{n}', f'becario{n}@example.com', 'clave')
+            actividad = Actividad.objects.create(
+                titulo=f'Taller {n}', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+                modalidad='P', en_catalogo=True, creador=cls.admin
+            )
+            actividad.becarios_asignados.add(becario)
+            RegistroHoras.objects.create(becario=becario, actividad=actividad, horas_reportadas=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def listar(self, **params):
+        # X-Shard: con DB_SHARDS se lista un solo shard
+        respuesta = self.client.get(self.URL, params, HTTP_X_SHARD='default')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_fields_recorta_e_ignora_desconocidos(self):
+        self.assertEqual(set(self.listar(fields='id,horas_reportadas,no_existe')[0]), {'id', 'horas_reportadas'})
+        # Un nombre de expansión desconocido se ignora
+        self.assertEqual(self.listar(expand='no_existe'), self.listar())
+        self.assertNotIn('actividad_detalle', self.listar()[0])
+
+    def test_expansion_anidada_con_fields(self):
+        fila = self.listar(expand='actividad_detalle.becarios_asignados_info',
+                           fields='id,actividad_detalle.titulo')[0]
+        self.assertEqual(set(fila), {'id', 'actividad_detalle'})
+        detalle = fila['actividad_detalle']
+        self.assertEqual(set(detalle), {'titulo', 'becarios_asignados_info'})
+        self.assertEqual([b['username'] for b in detalle['becarios_asignados_info']], ['becario0'])
+
+    def test_relaciones_derivadas_de_la_expansion(self):
+        self.assertEqual(relaciones_para(RegistroHorasSerializer, RegistroHoras, {}), ([], []))
+        select, prefetch = relaciones_para(
+            RegistroHorasSerializer, RegistroHoras, parsear_rutas('actividad_detalle.becarios_asignados_info')
+        )
+        self.assertEqual(select, ['actividad', 'actividad__creador'])
+        self.assertEqual(set(prefetch), {'actividad__becarios_asignados'})
+
+    def test_expandir_no_hace_consultas_por_fila(self):
+        params = {'expand': 'actividad_detalle.becarios_asignados_info'}
+        with CaptureQueriesContext(connection) as una_fila:
+            self.listar(**params)
+        consultas = len(una_fila)
+        self.crear_registros(5)
+        with self.assertNumQueries(consultas):
+            self.assertEqual(len(self.listar(**params)), 6)
+
+
+class GenerarDatasetTests(TestCase):
+    """generate_dataset crea las filas pedidas y deja el libro de progreso cuadrado"""
+
+    def test_dataset_pequeno(self):
+        salida = StringIO()
+        call_command('generate_dataset', becarios=5, actividades=4, asignaciones=2, registros=3,
+                     prefix='prueba', stdout=salida)
+        self.assertIn('Dataset generated', salida.getvalue())
+        self.assertEqual(Usuario.objects.filter(username__startswith='prueba_becario_').count(), 5)
+        self.assertTrue(Usuario.objects.filter(username='prueba_admin', rol='administrador').exists())
+        self.assertEqual(Actividad.objects.filter(titulo__startswith='prueba actividad ').count(), 4)
+        self.assertEqual(Actividad.becarios_asignados.through.objects.count(), 4 * 2)
+        self.assertEqual(RegistroHoras.objects.count(), 5 * 3)
+
+        esperado = {clave: horas for clave, horas in calcular_esperado().items() if horas}
+        libro = {
+            (becario_id, tipo): horas for becario_id, tipo, horas in
+            ProgresoMeta.objects.filter(horas_alcanzadas__gt=0).values_list('becario_id', 'tipo_actividad',
+                                                                            'horas_alcanzadas')
+        }
+        self.assertEqual(libro, esperado)
+        salida = StringIO()
+        call_command('reconcile_progress', '--dry-run', stdout=salida)
+        self.assertIn('Missing: 0, Drifted: 0', salida.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', becarios=1, prefix='prueba', stdout=StringIO())
+
+
+class BenchmarkEndpointsTests(TestCase):
+    """benchmark_endpoints recorre los endpoints, informa y compara con una línea base"""
+
+    def test_informe_y_comparacion(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            base = os.path.join(directorio, 'base.json')
+            salida = StringIO()
+            call_command('benchmark_endpoints', sizes='3', iterations=1, registros=2, output=base, stdout=salida)
+            with open(base, encoding='utf-8') as fh:
+                resultados = json.load(fh)['resultados']['3']
+            # Tolerancia amplia: solo se comprueba que compara, no los tiempos
+            call_command('benchmark_endpoints', sizes='3', iterations=1, registros=2, only='progress.',
+                         compare=base, threshold=1000, min_ms=1000, min_kb=100000, stdout=salida)
+        informe = salida.getvalue()
+        self.assertIn('== 3 becarios ==', informe)
+        self.assertRegex(informe, r'progress\.mi_progreso +p50=')
+        self.assertIn('No regressions against', informe)
+        self.assertEqual(set(resultados), {nombre for nombre, *_ in ENDPOINTS})
+        self.assertEqual(set(resultados['progress.mi_progreso']), {'p50_ms', 'p95_ms', 'queries', 'peak_kb', 'bytes'})
+        # El dataset de cada tamaño se deshace
+        self.assertFalse(Usuario.objects.filter(username__startswith='bench_').exists())
+
+
+class LoadTestTests(TransactionTestCase):
+    """load_test ejecuta la mezcla contra la aplicación ASGI e informa por nivel de concurrencia"""
+
+    def test_informe(self):
+        salida = StringIO()
+        call_command('load_test', concurrency='1', duration=0.3, becarios=5, clientes_becario=3,
+                     mix='mi_progreso=2,crear_registro=1,pendientes=1,aprobar_rechazar=1', stdout=salida)
+        informe = salida.getvalue()
+        self.assertRegex(informe, r'== concurrency 1: [1-9]\d* requests in [\d.]+s .* errors 0 ')
+        self.assertRegex(informe, r'mi_progreso +n= *[1-9]\d* p50=')
+
+        with self.assertRaises(CommandError):
+            call_command('load_test', mix='borrar_todo=1', stdout=StringIO())
+
+
+class PerfilSQLiteConcurrenciaTests(SimpleTestCase):
+    """
+    Escrituras concurrentes con el patrón de ``aprobar_rechazar`` (leer el registro,
+    actualizarlo y sumar al libro de progreso en ``transaction.atomic``) sobre un
+    fichero SQLite, a través de conexiones de Django con la configuración por
+    defecto y con el perfil de producción (``SQLITE_PRAGMAS`` aplicados por
+    ``connection_created`` y ``OPTIONS['transaction_mode'] = 'IMMEDIATE'``).
+    """
+    HILOS = 8
+    TRANSACCIONES_POR_HILO = 50
+    ALIAS = 'perfil_sqlite'
+
+    def conexion(self, ruta, produccion):
+        """Conexión de Django nueva sobre ``ruta``, fuera de las bases de datos de los tests"""
+        opciones = {'timeout': 5}
+        if produccion:
+            opciones['transaction_mode'] = 'IMMEDIATE'
+        configuracion = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ruta, 'OPTIONS': opciones}
+        # ConnectionHandler exige un alias ``default``; la conexión usa ALIAS
+        manejador = ConnectionHandler({DEFAULT_DB_ALIAS: configuracion, self.ALIAS: configuracion})
+        return manejador.create_connection(self.ALIAS)
+
+    def test_pragmas_en_conexion_nueva(self):
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(SQLITE_PRAGMAS=PRAGMAS_PRODUCCION):
+            conexion = self.conexion(os.path.join(directorio, 'pragmas.sqlite3'), produccion=True)
+            try:
+                with conexion.cursor() as cursor:
+                    valores = {}
+                    for nombre in PRAGMAS_PRODUCCION:
+                        cursor.execute(f'PRAGMA {nombre}')
+                        valores[nombre] = cursor.fetchone()[0]
+            finally:
+                conexion.close()
+        self.assertEqual(valores, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000,
+            'mmap_size': PRAGMAS_PRODUCCION['mmap_size'], 'cache_size': PRAGMAS_PRODUCCION['cache_size'],
+            'temp_store': 2,
+        })
+
+    def test_db_profile_production(self):
+        codigo = (
+            'import django, json; django.setup(); from django.conf import settings; '
+            "print(json.dumps([settings.SQLITE_PRAGMAS, settings.DATABASES['default']['OPTIONS']]))"
+        )
+        entorno = {**os.environ, 'DB_PROFILE': 'production', 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+        salida = subprocess.run([sys.executable, '-c', codigo], env=entorno, check=True,
+                                capture_output=True, text=True, cwd=settings.BASE_DIR).stdout
+        pragmas, opciones = json.loads(salida.strip().splitlines()[-1])
+        self.assertEqual(pragmas, PRAGMAS_PRODUCCION)
+        self.assertEqual(opciones['transaction_mode'], 'IMMEDIATE')
+
+    def ejecutar(self, produccion):
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(SQLITE_PRAGMAS=PRAGMAS_PRODUCCION if produccion else {}):
+            ruta = os.path.join(directorio, 'concurrencia.sqlite3')
+            conexion = self.conexion(ruta, produccion)
+            total = self.HILOS * self.TRANSACCIONES_POR_HILO
+            with conexion.cursor() as cursor:
+                cursor.execute('CREATE TABLE registro (id INTEGER PRIMARY KEY, estado TEXT, horas REAL)')
+                cursor.execute('CREATE TABLE libro (id INTEGER PRIMARY KEY, horas REAL)')
+                cursor.executemany('INSERT INTO registro VALUES (%s, %s, %s)', [(i, 'P', 2) for i in range(total)])
+                cursor.execute('INSERT INTO libro VALUES (1, 0)')
+            conexion.close()
+
+            confirmadas, bloqueos = [], []
+
+            def trabajador(numero):
+                # transaction.atomic(using=ALIAS) usa la conexión registrada para este hilo
+                connections[self.ALIAS] = conexion = self.conexion(ruta, produccion)
+                try:
+                    for i in range(self.TRANSACCIONES_POR_HILO):
+                        registro_id = numero * self.TRANSACCIONES_POR_HILO + i
+                        try:
+                            with transaction.atomic(using=self.ALIAS), conexion.cursor() as cursor:
+                                cursor.execute('SELECT estado FROM registro WHERE id = %s', [registro_id])
+                                cursor.fetchone()
+                                cursor.execute("UPDATE registro SET estado = 'A' WHERE id = %s", [registro_id])
+                                cursor.execute('UPDATE libro SET horas = horas + 2 WHERE id = 1')
+                            confirmadas.append(registro_id)
+                        except OperationalError:
+                            bloqueos.append(registro_id)
+                finally:
+                    conexion.close()
+                    del connections[self.ALIAS]
+
+            inicio = time.perf_counter()
+            hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(self.HILOS)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            transcurrido = time.perf_counter() - inicio
+
+            conexion = self.conexion(ruta, produccion)
+            with conexion.cursor() as cursor:
+                cursor.execute('SELECT horas FROM libro')
+                horas = cursor.fetchone()[0]
+            conexion.close()
+            return len(confirmadas), len(bloqueos), horas, len(confirmadas) / transcurrido
+
+    def test_perfil_produccion_sin_bloqueos(self):
+        total = self.HILOS * self.TRANSACCIONES_POR_HILO
+        resultados = {}
+        for produccion in (False, True):
+            confirmadas, bloqueos, horas, por_segundo = resultados[produccion] = self.ejecutar(produccion)
+            # Con cualquier perfil, cada transacción se confirma entera o no se aplica
+            self.assertEqual(confirmadas + bloqueos, total)
+            self.assertEqual(horas, 2 * confirmadas)
+
+        confirmadas, bloqueos, _, _ = resultados[True]
+        self.assertEqual(bloqueos, 0)
+        self.assertEqual(confirmadas, total)
+        # El rendimiento depende de la máquina: se informa, no se compara
+        sys.stderr.write(''.join(
+            f"\nPerfil SQLite {'producción' if produccion else 'por defecto'}: "
+            f"{confirmadas} confirmadas, {bloqueos} bloqueadas, {por_segundo:.0f} transacciones/s"
+            for produccion, (confirmadas, bloqueos, _, por_segundo) in resultados.items()
+        ) + '\n')
@@ -1,16 +1,37 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from .models import RegistroHoras
 from .serializers import (RegistroHorasSerializer, RegistroHorasCreateSerializer, 
-                         AprobarRechazarSerializer)
+                         AprobarRechazarSerializer, AprobarRechazarLoteSerializer)
+from . import export
+from progress import cache as cache_progreso
+from progress.ledger import aplicar_deltas
 from users.permissions import IsAdministrador
+from backend import sharding
+from backend.expansion import ExpandableViewMixin
+from backend.pagination import FusionadaPagination
 from drf_spectacular.utils import extend_schema
 
-class RegistroHorasViewSet(viewsets.ModelViewSet):
+
+def registros_visibles(usuario):
+    """Registros que ve ``usuario``: todos para administradores, los propios para becarios"""
+    if usuario.rol == 'administrador':
+        return RegistroHoras.objects.all()
+    return RegistroHoras.objects.filter(becario=usuario)
+
+
+class RegistroHorasViewSet(ExpandableViewMixin, viewsets.ModelViewSet):
     queryset = RegistroHoras.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-fecha_registro', '-id')
+    # IDs por UPDATE en las operaciones en lote (límite de parámetros de SQLite)
+    TAMANO_LOTE = 500
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -18,11 +39,8 @@ class RegistroHorasViewSet(viewsets.ModelViewSet):
         return RegistroHorasSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        if user.rol == 'administrador':
-            return RegistroHoras.objects.all().select_related('becario', 'actividad')
-        else:
-            return RegistroHoras.objects.filter(becario=user).select_related('actividad')
+        # La actividad solo se une si se pide ?expand=actividad_detalle (ver ExpandableViewMixin)
+        return registros_visibles(self.request.user).select_related('becario')
     
     @extend_schema(
         description="""**🔐 BECARIOS Y ADMINISTRADORES** - Listar registros de horas
@@ -90,13 +108,28 @@ class RegistroHorasViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
     
+    # Las escrituras van en una transacción junto con el delta del libro ProgresoMeta
     def perform_create(self, serializer):
-        serializer.save(becario=self.request.user)
+        with transaction.atomic(using=sharding.alias_actual()):
+            serializer.save(becario=self.request.user)
+
+    def perform_update(self, serializer):
+        with transaction.atomic(using=sharding.alias_actual()):
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=sharding.alias_actual()):
+            instance.delete()
     
     @extend_schema(
         description="""**👑 SOLO ADMINISTRADORES** - Ver registros pendientes
         
         Retorna todos los registros de horas que están pendientes de aprobación.
+        Con `?paginacion=cursor` la respuesta se pagina por cursor.
+
+        Con sharding por universidad, sin cabecera `X-Shard` se devuelven los
+        pendientes de todos los shards (cada uno con su campo `shard`), paginados
+        por número de página (`page`, `page_size`) como `{count, next, previous, results}`.
         
         **Permisos:**
         - **Administradores:** Acceso completo a todos los registros pendientes
@@ -107,9 +140,32 @@ class RegistroHorasViewSet(viewsets.ModelViewSet):
         if request.user.rol != 'administrador':
             return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
         
-        registros_pendientes = RegistroHoras.objects.filter(
-            estado_aprobacion='P'
-        ).select_related('becario', 'actividad')
+        registros_pendientes = self.filter_queryset(
+            RegistroHoras.objects.filter(estado_aprobacion='P').select_related('becario')
+        )
+
+        shards = sharding.consulta_en_todos(request)
+        if shards:
+            # Sharding por universidad: se mezclan los pendientes de todos los shards, por páginas.
+            # Cada registro indica su shard, que se envía en X-Shard para aprobarlo o rechazarlo.
+            if self.paginator.esta_activa(request):
+                return Response({'error': 'La paginación por cursor requiere la cabecera X-Shard'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            registros = sharding.ResultadosFusionados(
+                {alias: registros_pendientes.order_by(*self.keyset_ordering) for alias in shards},
+                self.keyset_ordering
+            )
+            paginator = FusionadaPagination()
+            pagina = paginator.paginate_queryset(registros, request, view=self)
+            datos = self.get_serializer(pagina, many=True).data
+            return paginator.get_paginated_response(
+                [{**fila, 'shard': registro.shard} for fila, registro in zip(datos, pagina)]
+            )
+
+        pagina = self.paginate_queryset(registros_pendientes)
+        if pagina is not None:
+            return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
         serializer = self.get_serializer(registros_pendientes, many=True)
         return Response(serializer.data)
     
@@ -140,9 +196,126 @@ class RegistroHorasViewSet(viewsets.ModelViewSet):
                 registro.estado_aprobacion = 'R'
             
             registro.fecha_aprobacion = timezone.now()
-            registro.administrador_aprobo = request.user
-            registro.save()
+            # Con sharding, un administrador de otro shard no puede referenciarse desde este
+            registro.administrador_aprobo = request.user if request.user._state.db == registro._state.db else None
+            with transaction.atomic(using=sharding.alias_actual()):
+                registro.save()
             
             return Response({'message': f'Registro {accion}ado correctamente'})
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Aprobar o rechazar registros en lote
+
+        Aplica la misma acción a muchos registros pendientes en una sola transacción.
+
+        **Selección de registros:**
+        - `ids`: lista de IDs de registros
+        - `actividad` y/o `becario`: todos los registros pendientes que cumplan el filtro
+
+        Los registros que ya no están pendientes se omiten. La respuesta incluye el
+        resultado de cada ID (`aprobado`, `rechazado`, `no_pendiente` o `no_encontrado`).
+        """
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsAdministrador])
+    def aprobar_rechazar_lote(self, request):
+        serializer = AprobarRechazarLoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        datos = serializer.validated_data
+        accion = datos['accion']
+        estado = 'A' if accion == 'aprobar' else 'R'
+        ids = list(dict.fromkeys(datos.get('ids') or []))
+
+        with transaction.atomic(using=sharding.alias_actual()):
+            seleccion = RegistroHoras.objects.select_for_update()
+            if datos.get('actividad') is not None:
+                seleccion = seleccion.filter(actividad_id=datos['actividad'])
+            if datos.get('becario') is not None:
+                seleccion = seleccion.filter(becario_id=datos['becario'])
+            if ids:
+                # Por lotes, como las actualizaciones: SQLite limita los parámetros por sentencia
+                lotes = [ids[inicio:inicio + self.TAMANO_LOTE] for inicio in range(0, len(ids), self.TAMANO_LOTE)]
+                consultas = [seleccion.filter(id__in=lote) for lote in lotes]
+            else:
+                consultas = [seleccion.filter(estado_aprobacion='P')]
+
+            campos = ('id', 'becario_id', 'actividad__tipo', 'horas_reportadas', 'estado_aprobacion')
+            filas = [fila for consulta in consultas for fila in consulta.values(*campos)]
+            leidos = [f for f in filas if f['estado_aprobacion'] == 'P']
+
+            ahora = timezone.now()
+            administrador = request.user if request.user._state.db == sharding.alias_actual() else None
+            actualizados = set()
+            for inicio in range(0, len(leidos), self.TAMANO_LOTE):
+                lote = [f['id'] for f in leidos[inicio:inicio + self.TAMANO_LOTE]]
+                cantidad = RegistroHoras.objects.filter(id__in=lote, estado_aprobacion='P').update(
+                    estado_aprobacion=estado,
+                    fecha_aprobacion=ahora,
+                    administrador_aprobo=administrador
+                )
+                if cantidad == len(lote):
+                    actualizados.update(lote)
+                else:
+                    # Otra petición resolvió parte del lote entre la lectura y el UPDATE
+                    actualizados.update(RegistroHoras.objects.filter(
+                        id__in=lote, estado_aprobacion=estado, fecha_aprobacion=ahora
+                    ).values_list('id', flat=True))
+            pendientes = [f for f in leidos if f['id'] in actualizados]
+
+            # queryset.update() no dispara señales: se actualiza el libro de progreso aquí
+            if estado == 'A':
+                deltas = defaultdict(Decimal)
+                for f in pendientes:
+                    deltas[(f['becario_id'], f['actividad__tipo'])] += f['horas_reportadas']
+                aplicar_deltas(deltas)
+            cache_progreso.invalidar(f['becario_id'] for f in pendientes)
+
+        resultado_ok = 'aprobado' if estado == 'A' else 'rechazado'
+        estados = {f['id']: resultado_ok if f['id'] in actualizados else 'no_pendiente' for f in filas}
+        resultados = [
+            {'id': registro_id, 'resultado': estados.get(registro_id, 'no_encontrado')}
+            for registro_id in (ids or estados)
+        ]
+
+        return Response({
+            'message': f'{len(pendientes)} registros {resultado_ok}s correctamente',
+            'procesados': len(pendientes),
+            'omitidos': len(resultados) - len(pendientes),
+            'resultados': resultados
+        })
+
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Exportar usuarios y registros en CSV
+
+        Devuelve un CSV en streaming con una sección de usuarios (`users`) y otra de
+        registros de horas (`hours`). La memoria usada no depende del número de filas.
+
+        Columnas: `section, id, name, email, sexo, user_id, hours, date, activity,
+        activity_type, estado_aprobacion`. Respecto al informe anterior, la sección
+        de registros se llama `hours` (antes `pending_hour`) y el título de la
+        actividad va en `activity` (antes en `activity_type`, que ahora es el tipo).
+
+        **Filtros opcionales:**
+        - `estado`: `P`, `A` y/o `R` separados por comas
+        - `desde` / `hasta`: rango de `fecha_registro` (`YYYY-MM-DD`)
+        - `tipo`: tipo de actividad (`Interna`, `Externa`, `Taller`, `Chat`)
+        - `becario`: ID del becario (también filtra la sección de usuarios)
+        - `incluir`: `usuarios`, `registros` o ambos (por defecto ambos)
+        - `usuarios`: `activos` (por defecto) o `todos`, incluidos los desactivados
+        """
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsAdministrador])
+    def exportar_csv(self, request):
+        try:
+            filtros, incluir, solo_activos = export.parsear_filtros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            export.generar_csv(filtros, incluir, solo_activos), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'attachment; filename="informe.csv"'
+        return response
@@ -0,0 +1,132 @@
+"""
+Sincronización incremental: cambios desde un cursor.
+
+Los triggers de la migración ``0001_initial`` apuntan en ``Cambio`` cada alta,
+modificación o borrado de registros, actividades y asignaciones. El cursor de
+un cliente es el ``id`` del último cambio que procesó; ``cambios_desde``
+devuelve los objetos tocados después, con su estado actual:
+
+- Los que el usuario ve según las reglas de los endpoints
+  (``actividades_visibles`` y ``registros_visibles``) van completos.
+- El resto van como *tombstones* (solo el id): borrados, desactivados
+  (``is_active``), sacados del catálogo o que dejaron de ser del becario. El
+  cliente elimina los que tenga y descarta los demás.
+- Asignaciones ``(actividad, becario)``: las vigentes y las eliminadas. Un
+  becario solo recibe las suyas.
+
+Un objeto con varios cambios se envía una vez. Como se envía el estado actual,
+repetir un tramo no tiene efectos: el cliente guarda el cursor solo después
+de aplicar la respuesta. Con sharding el cursor es del shard de la petición.
+
+``manage.py prune_sync_log`` borra cambios antiguos; un cursor anterior al
+primer cambio conservado está caducado y el cliente debe descargar de nuevo
+los listados completos.
+"""
+from django.db import connections
+from django.db.models import Max, Min, Q
+from activities.models import Actividad
+from activities.serializers import ActividadSerializer
+from activities.visibility import actividades_visibles
+from records.serializers import RegistroHorasSerializer
+from records.views import registros_visibles
+from .models import Cambio
+
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 2000
+TRIGGER = 'sync_cambio_actividad_ai'
+
+# alias -> si existen los triggers en esa base de datos
+_disponible = {}
+
+
+class CursorCaducado(Exception):
+    pass
+
+
+def disponible(alias):
+    if alias not in _disponible:
+        conexion = connections[alias]
+        if conexion.vendor != 'sqlite':
+            _disponible[alias] = False
+        else:
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [TRIGGER])
+                _disponible[alias] = cursor.fetchone() is not None
+    return _disponible[alias]
+
+
+def cursor_actual():
+    """Cursor para empezar a sincronizar después de descargar los listados completos"""
+    return Cambio.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+def cambios_desde(usuario, cursor, limite=LIMITE_POR_DEFECTO):
+    """Cambios visibles para ``usuario`` posteriores a ``cursor`` (como mucho ``limite`` entradas del registro)"""
+    # MIN y MAX por separado: SQLite solo resuelve con el índice un agregado por consulta
+    primero = Cambio.objects.aggregate(primero=Min('id'))['primero'] or 1
+    # Anterior a lo podado, o posterior al último cambio (p. ej. una base de datos restaurada)
+    if cursor < primero - 1 or cursor > cursor_actual():
+        raise CursorCaducado(cursor)
+
+    entradas = Cambio.objects.filter(id__gt=cursor)
+    if usuario.rol != 'administrador':
+        # Las actividades se filtran después por visibilidad; registros y asignaciones, por becario
+        entradas = entradas.filter(Q(entidad=Cambio.ACTIVIDAD) | Q(becario_id=usuario.id))
+    entradas = list(entradas.order_by('id').values_list('id', 'entidad', 'objeto_id', 'becario_id')[:limite + 1])
+    hay_mas = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    actividad_ids, registro_ids, pares = {}, {}, {}
+    for _, entidad, objeto_id, becario_id in entradas:
+        if entidad == Cambio.ACTIVIDAD:
+            actividad_ids[objeto_id] = None
+        elif entidad == Cambio.REGISTRO:
+            registro_ids[objeto_id] = None
+        else:
+            pares[(objeto_id, becario_id)] = None
+
+    actividades = _por_id(
+        actividades_visibles(usuario).select_related('creador').prefetch_related('becarios_asignados'),
+        actividad_ids,
+    )
+    registros = _por_id(registros_visibles(usuario).select_related('becario'), registro_ids)
+    vigentes = _asignaciones_vigentes(pares)
+
+    return {
+        'cursor': entradas[-1][0] if entradas else cursor,
+        'hay_mas': hay_mas,
+        'actividades': ActividadSerializer([actividades[i] for i in actividad_ids if i in actividades], many=True).data,
+        'actividades_eliminadas': [i for i in actividad_ids if i not in actividades],
+        'registros': RegistroHorasSerializer([registros[i] for i in registro_ids if i in registros], many=True).data,
+        'registros_eliminados': [i for i in registro_ids if i not in registros],
+        'asignaciones': [{'actividad': a, 'becario': b} for a, b in pares if (a, b) in vigentes],
+        'asignaciones_eliminadas': [{'actividad': a, 'becario': b} for a, b in pares if (a, b) not in vigentes],
+    }
+
+
+def _por_id(queryset, ids):
+    if not ids:
+        return {}
+    return {objeto.id: objeto for objeto in queryset.filter(id__in=list(ids))}
+
+
+def _asignaciones_vigentes(pares):
+    if not pares:
+        return set()
+    Asignacion = Actividad.becarios_asignados.through
+    existentes = Asignacion.objects.filter(
+        actividad_id__in={a for a, _ in pares}, usuario_id__in={b for _, b in pares}
+    ).values_list('actividad_id', 'usuario_id')
+    return set(existentes) & set(pares)
+
+
+def podar(antes_de):
+    """
+    Borra los cambios hasta el último anterior a ``antes_de``, siempre un tramo
+    inicial y sin el último cambio, que fija el cursor mínimo válido
+    """
+    hasta = Cambio.objects.filter(fecha__lt=antes_de).aggregate(hasta=Max('id'))['hasta']
+    if hasta is None:
+        return 0
+    borrados, _ = Cambio.objects.filter(id__lte=hasta, id__lt=cursor_actual()).delete()
+    return borrados
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from backend import sharding
+from sync.changes import podar
+
+
+class Command(BaseCommand):
+    help = ("Delete sync change-log entries older than --days. Clients whose cursor "
+            "falls before the remaining log get 410 and must do a full download.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep the last N days (default 30)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (e.g. a shard)')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        with sharding.en_shard(alias):
+            borrados = podar(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {borrados} change-log entries in "{alias}"'))
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:26
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+TABLA = 'sync_cambio'
+ASIGNACIONES = 'activities_actividad_becarios_asignados'
+
+
+def _cambio(entidad, objeto, becario='NULL'):
+    return f"INSERT INTO {TABLA} (entidad, objeto_id, becario_id) VALUES ('{entidad}', {objeto}, {becario});"
+
+
+# Nombre -> (cuándo, cuerpo). Las asignaciones cambian también la lista
+# ``becarios_asignados`` de la actividad, y el nombre de un usuario aparece en
+# sus actividades (``creador_nombre``) y registros (``becario_nombre``).
+TRIGGERS = {
+    'actividad_ai': ('AFTER INSERT ON activities_actividad', _cambio('actividad', 'new.id')),
+    'actividad_au': ('AFTER UPDATE ON activities_actividad', _cambio('actividad', 'new.id')),
+    'actividad_ad': ('AFTER DELETE ON activities_actividad', _cambio('actividad', 'old.id')),
+    'registro_ai': ('AFTER INSERT ON records_registrohoras', _cambio('registro', 'new.id', 'new.becario_id')),
+    'registro_au': ('AFTER UPDATE ON records_registrohoras', _cambio('registro', 'new.id', 'new.becario_id') + f"""
+        INSERT INTO {TABLA} (entidad, objeto_id, becario_id)
+        SELECT 'registro', old.id, old.becario_id WHERE old.becario_id IS NOT new.becario_id;"""),
+    'registro_ad': ('AFTER DELETE ON records_registrohoras', _cambio('registro', 'old.id', 'old.becario_id')),
+    'asignacion_ai': (f'AFTER INSERT ON {ASIGNACIONES}',
+                      _cambio('asignacion', 'new.actividad_id', 'new.usuario_id') + _cambio('actividad', 'new.actividad_id')),
+    'asignacion_ad': (f'AFTER DELETE ON {ASIGNACIONES}',
+                      _cambio('asignacion', 'old.actividad_id', 'old.usuario_id') + _cambio('actividad', 'old.actividad_id')),
+    'usuario_au': (
+        'AFTER UPDATE OF first_name, last_name ON users_usuario '
+        'WHEN old.first_name IS NOT new.first_name OR old.last_name IS NOT new.last_name',
+        f"""INSERT INTO {TABLA} (entidad, objeto_id, becario_id)
+        SELECT 'actividad', id, NULL FROM activities_actividad WHERE creador_id = new.id;
+        INSERT INTO {TABLA} (entidad, objeto_id, becario_id)
+        SELECT 'registro', id, becario_id FROM records_registrohoras WHERE becario_id = new.id;""",
+    ),
+}
+
+
+def crear_triggers(apps, schema_editor):
+    """Triggers que escriben en sync_cambio (solo SQLite, como el índice FTS5 de actividades)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for nombre, (cuando, cuerpo) in TRIGGERS.items():
+            cursor.execute(f'CREATE TRIGGER {TABLA}_{nombre} {cuando} BEGIN {cuerpo} END')
+
+
+def eliminar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for nombre in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA}_{nombre}')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('activities', '0008_busqueda_fts'),
+        ('records', '0003_indices_filtros'),
+        ('users', '0008_terminodirectorio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(choices=[('actividad', 'Actividad'), ('registro', 'Registro de horas'), ('asignacion', 'Asignación')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('becario_id', models.BigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entidad', 'id'], name='cambio_entidad_idx'), models.Index(fields=['becario_id', 'id'], name='cambio_becario_idx')],
+            },
+        ),
+        migrations.RunPython(crear_triggers, eliminar_triggers),
+    ]
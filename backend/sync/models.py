@@ -0,0 +1,39 @@
+from django.db import models
+from django.db.models.functions import Now
+
+
+class Cambio(models.Model):
+    """
+    Registro de cambios para la sincronización incremental (``sync/changes.py``).
+
+    Lo escriben triggers de SQLite (migración ``0001_initial``) en cada alta,
+    modificación o borrado de registros, actividades y asignaciones, así que
+    incluye también ``bulk_create``, ``queryset.update()``, borrados en cascada
+    y SQL directo. El ``id`` autoincremental es el cursor de los clientes. Para
+    asignaciones ``objeto_id`` es la actividad; ``becario_id`` es el dueño del
+    registro o el becario asignado (nulo en actividades).
+    """
+    ACTIVIDAD = 'actividad'
+    REGISTRO = 'registro'
+    ASIGNACION = 'asignacion'
+    ENTIDAD_CHOICES = [
+        (ACTIVIDAD, 'Actividad'),
+        (REGISTRO, 'Registro de horas'),
+        (ASIGNACION, 'Asignación'),
+    ]
+
+    entidad = models.CharField(max_length=10, choices=ENTIDAD_CHOICES)
+    objeto_id = models.BigIntegerField()
+    # Sin clave foránea: el cambio sobrevive al borrado del becario o del objeto
+    becario_id = models.BigIntegerField(null=True, blank=True)
+    fecha = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        indexes = [
+            # Cambios desde el cursor de un becario: actividades de todos y lo suyo
+            models.Index(fields=['entidad', 'id'], name='cambio_entidad_idx'),
+            models.Index(fields=['becario_id', 'id'], name='cambio_becario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.entidad} {self.objeto_id}"
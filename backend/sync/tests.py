@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from activities.assignments import aplicar_matriz
+from activities.models import Actividad
+from backend.query_plan import PlanConsultasMixin
+from records.models import RegistroHoras
+from users.models import Usuario
+from .changes import podar
+from .models import Cambio
+
+
+class SincronizacionTests(PlanConsultasMixin, TestCase):
+    """/api/sync/ devuelve solo lo cambiado desde el cursor, con las reglas de visibilidad de los listados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador',
+                                                first_name='Ana')
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        cls.otro = Usuario.objects.create_user('otro', 'otro@example.com', 'clave')
+        cls.actividad = Actividad.objects.create(
+            titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+            modalidad='P', en_catalogo=True, creador=cls.admin,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def sync(self, usuario, cursor=None, **params):
+        self.client.force_authenticate(usuario)
+        if cursor is not None:
+            params['cursor'] = cursor
+        return self.client.get('/api/sync/', params)
+
+    def cursor(self, usuario):
+        return self.sync(usuario).data['cursor']
+
+    def test_registros_propios_con_tombstones(self):
+        cursor = self.cursor(self.becario)
+        propio = RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad, horas_reportadas=2)
+        RegistroHoras.objects.create(becario=self.otro, actividad=self.actividad, horas_reportadas=1)
+        # Actualización en lote (sin señales): también queda registrada
+        RegistroHoras.objects.filter(pk=propio.pk).update(estado_aprobacion='A')
+
+        datos = self.sync(self.becario, cursor).data
+        self.assertEqual([r['id'] for r in datos['registros']], [propio.pk])
+        self.assertEqual(datos['registros'][0]['estado_aprobacion'], 'A')
+        self.assertEqual(len(self.sync(self.admin, cursor).data['registros']), 2)
+
+        propio_id = propio.pk
+        propio.delete()
+        datos = self.sync(self.becario, datos['cursor']).data
+        self.assertEqual((datos['registros'], datos['registros_eliminados']), ([], [propio_id]))
+
+    def test_asignaciones_y_actividades_desactivadas(self):
+        cursor = self.cursor(self.becario)
+        aplicar_matriz([self.actividad.pk], [self.becario.pk, self.otro.pk], 'agregar')
+        datos = self.sync(self.becario, cursor).data
+        # La asignación hace visible la actividad de catálogo; la del otro becario no se envía
+        self.assertEqual([a['id'] for a in datos['actividades']], [self.actividad.pk])
+        self.assertEqual(datos['asignaciones'], [{'actividad': self.actividad.pk, 'becario': self.becario.pk}])
+
+        cursor = datos['cursor']
+        self.actividad.is_active = False
+        self.actividad.save()
+        aplicar_matriz([self.actividad.pk], [self.becario.pk], 'quitar')
+        for usuario in (self.becario, self.admin):
+            datos = self.sync(usuario, cursor).data
+            self.assertEqual((datos['actividades'], datos['actividades_eliminadas']), ([], [self.actividad.pk]))
+            self.assertEqual(datos['asignaciones_eliminadas'],
+                             [{'actividad': self.actividad.pk, 'becario': self.becario.pk}])
+
+    def test_renombrar_creador_reenvia_sus_actividades(self):
+        cursor = self.cursor(self.admin)
+        self.admin.first_name = 'Ana María'
+        self.admin.save()
+        datos = self.sync(self.admin, cursor).data
+        self.assertEqual(datos['actividades'][0]['creador_nombre'], self.admin.get_full_name())
+
+    def test_limite_y_cursor_caducado(self):
+        cursor = self.cursor(self.admin)
+        for i in range(3):
+            RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad, horas_reportadas=i + 1)
+        datos = self.sync(self.admin, cursor, limite=2).data
+        self.assertEqual((len(datos['registros']), datos['hay_mas']), (2, True))
+        datos = self.sync(self.admin, datos['cursor'], limite=2).data
+        self.assertEqual((len(datos['registros']), datos['hay_mas']), (1, False))
+
+        # Se conserva el último cambio, que fija el cursor mínimo válido
+        total = Cambio.objects.count()
+        self.assertEqual(podar(timezone.now() + timedelta(days=1)), total - 1)
+        self.assertEqual(self.sync(self.admin, cursor).status_code, 410)
+        self.assertEqual(self.sync(self.admin, 'x').status_code, 400)
+
+    def test_consultas_constantes_por_indice(self):
+        cursor = self.cursor(self.becario)
+        aplicar_matriz([self.actividad.pk], [self.becario.pk], 'agregar')
+        for i in range(10):
+            RegistroHoras.objects.create(becario=self.becario, actividad=self.actividad, horas_reportadas=1)
+        # Primer cambio, último cambio, registro de cambios, actividades (+ becarios), registros y asignaciones
+        with self.assertNumQueries(7):
+            datos = self.sync(self.becario, cursor).data
+        self.assertEqual(len(datos['registros']), 10)
+        self.assertSinEscaneosCompletos(lambda: self.sync(self.becario, cursor))
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.SincronizacionView.as_view(), name='sync'),
+]
@@ -0,0 +1,50 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from backend import sharding
+from drf_spectacular.utils import extend_schema
+from . import changes
+
+
+class SincronizacionView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        description="""**🔐 BECARIOS Y ADMINISTRADORES** - Sincronización incremental
+
+        Retorna solo los registros de horas, actividades y asignaciones que cambiaron
+        después de `cursor`, con las mismas reglas de visibilidad que sus listados.
+
+        **Uso:**
+        - Sin `cursor`: retorna el cursor actual. El cliente descarga luego los listados
+          completos y a partir de ahí sincroniza con ese cursor.
+        - Con `cursor`: retorna los objetos cambiados (estado actual), los ids eliminados
+          o que ya no son visibles (`*_eliminados`, incluye los desactivados) y el nuevo
+          `cursor`. Si `hay_mas` es verdadero se vuelve a llamar con el nuevo cursor.
+        - `limite`: cambios procesados por llamada (por defecto 500, máximo 2000).
+        - 410: el cursor caducó (cambios antiguos depurados); hay que descargar todo de nuevo.
+
+        **Permisos:**
+        - **Administradores:** Todos los cambios del shard
+        - **Becarios:** Sus registros y asignaciones, y las actividades que pueden ver
+        """
+    )
+    def get(self, request):
+        if not changes.disponible(sharding.alias_actual()):
+            return Response({'error': 'La sincronización incremental no está disponible en esta base de datos'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        params = request.query_params
+        try:
+            cursor = int(params['cursor']) if params.get('cursor') else None
+            limite = min(max(int(params.get('limite', changes.LIMITE_POR_DEFECTO)), 1), changes.LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'error': 'Los parámetros cursor y limite deben ser enteros'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if cursor is None:
+            return Response({'cursor': changes.cursor_actual()})
+        try:
+            return Response(changes.cambios_desde(request.user, cursor, limite))
+        except changes.CursorCaducado:
+            return Response({'error': 'El cursor caducó: descarga de nuevo los listados completos'},
+                            status=status.HTTP_410_GONE)
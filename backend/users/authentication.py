@@ -0,0 +1,137 @@
+"""
+Autenticación por token con caché en proceso de token -> usuario.
+
+``CachedTokenAuthentication`` evita la consulta token+usuario de
+``TokenAuthentication`` en cada petición. Las entradas caducan a los ``TTL``
+segundos y, al superar ``MAX_ENTRIES``, se desaloja la menos usada. Las señales
+de ``users.signals`` invalidan las entradas de un usuario cuando se guarda
+(desactivación, cambio de contraseña...) o cuando se elimina su token.
+
+Cada proceso tiene su propia caché: con varios workers, los cambios hechos en
+otro proceso se ven como mucho ``TTL`` segundos después. Los tokens firmados de
+``users/tokens.py`` no pasan por la caché. Configuración::
+
+    REST_FRAMEWORK = {
+        'TOKEN_CACHE': {'TTL': 60, 'MAX_ENTRIES': 10000},
+    }
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from backend import sharding
+from . import tokens
+
+CONFIGURACION_POR_DEFECTO = {'TTL': 60, 'MAX_ENTRIES': 10000}
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'REST_FRAMEWORK', {}).get('TOKEN_CACHE', {})}
+
+
+class TokenCache:
+    """Caché LRU con caducidad, segura entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()   # key -> (user, token, expira)
+        self._por_usuario = {}           # user_id -> {keys}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada is None or entrada[2] <= ahora:
+                if entrada is not None:
+                    self._quitar(key)
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(key)
+            self.hits += 1
+            return entrada[0], entrada[1]
+
+    def set(self, key, user, token):
+        conf = configuracion()
+        if conf['TTL'] <= 0 or conf['MAX_ENTRIES'] <= 0:
+            return
+        with self._lock:
+            self._quitar(key)
+            self._entradas[key] = (user, token, time.monotonic() + conf['TTL'])
+            self._por_usuario.setdefault(user.pk, set()).add(key)
+            while len(self._entradas) > conf['MAX_ENTRIES']:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar_token(self, key):
+        with self._lock:
+            self._quitar(key)
+
+    def invalidar_usuario(self, user_id):
+        with self._lock:
+            for key in list(self._por_usuario.get(user_id, ())):
+                self._quitar(key)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_usuario.clear()
+            self.hits = self.misses = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {'entradas': len(self._entradas), 'hits': self.hits, 'misses': self.misses}
+
+    def _quitar(self, key):
+        entrada = self._entradas.pop(key, None)
+        if entrada is not None:
+            claves = self._por_usuario.get(entrada[0].pk)
+            if claves is not None:
+                claves.discard(key)
+                if not claves:
+                    del self._por_usuario[entrada[0].pk]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` con caché en proceso de los tokens válidos"""
+
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is not None and sharding.activo():
+            user = resultado[0]
+            try:
+                solicitado = sharding.shard_solicitado(request)
+            except ValueError as e:
+                raise exceptions.ValidationError({'error': str(e)})
+            # La petición se atiende en el shard del usuario; los administradores
+            # pueden operar sobre otro con la cabecera X-Shard
+            if solicitado and user.rol == 'administrador':
+                sharding.fijar_shard(solicitado)
+            else:
+                sharding.fijar_shard(user._state.db)
+        return resultado
+
+    def authenticate_credentials(self, key):
+        if tokens.es_firmado(key):
+            # Token firmado (users/tokens.py): se verifica sin consultar la base de datos
+            try:
+                return tokens.usuario_de(*tokens.verificar(key)), key
+            except tokens.TokenInvalido as e:
+                raise exceptions.AuthenticationFailed(str(e))
+
+        entrada = token_cache.get(key)
+        if entrada is None:
+            # Valida token, usuario activo, etc. y lanza AuthenticationFailed si no
+            with sharding.en_shard(sharding.shard_de_token(key)):
+                user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+        else:
+            user, token = entrada
+        # Copia por petición: las vistas pueden modificar request.user
+        return copy.copy(user), token
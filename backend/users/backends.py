@@ -0,0 +1,25 @@
+from django.contrib.auth.backends import ModelBackend
+from .models import Usuario
+
+
+class EmailBackend(ModelBackend):
+    """
+    Autentica por email con una sola consulta.
+
+    ``LoginSerializer`` antes buscaba el usuario por email y luego llamaba a
+    ``authenticate`` con su username, que volvía a consultarlo. Las llamadas con
+    ``username`` siguen llegando a ``ModelBackend`` (admin de Django).
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        try:
+            usuario = Usuario.objects.get(email=email)
+        except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
+            # Mismo coste que un usuario existente para no revelar qué emails están registrados
+            Usuario().set_password(password)
+            return None
+        if usuario.check_password(password) and self.user_can_authenticate(usuario):
+            return usuario
+        return None
@@ -0,0 +1,123 @@
+"""
+Directorio de usuarios para selectores con autocompletado.
+
+``TerminoDirectorio`` guarda una fila por palabra normalizada (sin acentos ni
+mayúsculas) del nombre, apellido, username, email, carrera y universidad de
+cada usuario, con un índice único ``(termino, usuario)``. Buscar un prefijo es
+un recorrido de rango sobre ese índice (``termino >= 'ana' AND termino <
+'anb'``) que ya sale ordenado, así que se detiene en cuanto reúne ``limite``
+usuarios distintos, sin ordenar ni leer la tabla de usuarios entera.
+
+Con varias palabras, la más larga recorre el índice y las demás se comprueban
+para cada candidato con ``EXISTS`` sobre el índice ``(usuario, termino)``. ``users.signals`` mantiene los
+términos al guardar un usuario; las importaciones en bloque llaman a
+``indexar`` y ``manage.py rebuild_user_directory`` lo reconstruye entero.
+"""
+import re
+import unicodedata
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from backend import sharding
+from .models import TerminoDirectorio, Usuario
+
+CAMPOS = ('first_name', 'last_name', 'username', 'email', 'carrera', 'universidad')
+LARGO_MAXIMO = 100
+TAMANO_LOTE = 500
+# Letras y dígitos; '_', '.', '@', '-' y espacios separan palabras
+PALABRA = re.compile(r'[^\W_]+')
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def palabras(texto):
+    return PALABRA.findall(normalizar(texto))
+
+
+def terminos(valores):
+    """Términos de un usuario a partir de los valores de ``CAMPOS``"""
+    return {palabra[:LARGO_MAXIMO] for valor in valores for palabra in palabras(valor)}
+
+
+def indexar(usuario_ids):
+    """Sincroniza los términos de los usuarios indicados aplicando solo la diferencia"""
+    usuario_ids = list(set(usuario_ids))
+    with transaction.atomic(using=sharding.alias_actual()):
+        for inicio in range(0, len(usuario_ids), TAMANO_LOTE):
+            lote = usuario_ids[inicio:inicio + TAMANO_LOTE]
+            esperados = {
+                (usuario_id, termino)
+                for usuario_id, *valores in Usuario.objects.filter(id__in=lote).values_list('id', *CAMPOS)
+                for termino in terminos(valores)
+            }
+            existentes = {
+                (usuario_id, termino): pk
+                for pk, usuario_id, termino in TerminoDirectorio.objects.filter(usuario_id__in=lote)
+                .values_list('id', 'usuario_id', 'termino')
+            }
+            sobrantes = [pk for clave, pk in existentes.items() if clave not in esperados]
+            if sobrantes:
+                TerminoDirectorio.objects.filter(id__in=sobrantes).delete()
+            TerminoDirectorio.objects.bulk_create(
+                [TerminoDirectorio(usuario_id=u, termino=t) for u, t in esperados if (u, t) not in existentes],
+                batch_size=TAMANO_LOTE, ignore_conflicts=True,
+            )
+
+
+def reconstruir():
+    """Reindexa todos los usuarios. Devuelve cuántos se procesaron"""
+    ids = list(Usuario.objects.order_by('id').values_list('id', flat=True))
+    with transaction.atomic(using=sharding.alias_actual()):
+        TerminoDirectorio.objects.exclude(usuario_id__in=Usuario.objects.values('id')).delete()
+        indexar(ids)
+    return len(ids)
+
+
+def _rango(prefijo):
+    """Condiciones de ``termino`` que empiezan por ``prefijo`` como rango del índice"""
+    return {'termino__gte': prefijo, 'termino__lt': prefijo[:-1] + chr(ord(prefijo[-1]) + 1)}
+
+
+def buscar(texto, limite, rol=None):
+    """
+    Usuarios activos con alguna palabra que empieza por cada palabra de ``texto``.
+    Devuelve ``[{'id', 'nombre', 'rol'}]`` en orden alfabético del término encontrado.
+    """
+    consulta = sorted(palabras(texto), key=len, reverse=True)
+    if not consulta:
+        return []
+    principal, *resto = consulta
+
+    filtros = {'usuario__is_active': True}
+    if rol:
+        filtros['usuario__rol'] = rol
+    candidatos = TerminoDirectorio.objects.filter(**_rango(principal), **filtros)
+    for palabra in resto:
+        # Correlacionada a propósito: con IN, SQLite recorre la lista de la subconsulta y ordena después
+        candidatos = candidatos.filter(Exists(
+            TerminoDirectorio.objects.filter(usuario_id=OuterRef('usuario_id'), **_rango(palabra))
+        ))
+
+    ids = []
+    for usuario_id in candidatos.order_by('termino', 'usuario_id').values_list('usuario_id', flat=True) \
+            .iterator(chunk_size=limite * 2):
+        if usuario_id not in ids:
+            ids.append(usuario_id)
+            if len(ids) == limite:
+                break
+
+    usuarios = {
+        fila['id']: fila for fila in
+        Usuario.objects.filter(id__in=ids).values('id', 'first_name', 'last_name', 'username', 'rol')
+    }
+    return [
+        {
+            'id': usuario_id,
+            'nombre': f"{usuarios[usuario_id]['first_name']} {usuarios[usuario_id]['last_name']}".strip()
+            or usuarios[usuario_id]['username'],
+            'rol': usuarios[usuario_id]['rol'],
+        }
+        for usuario_id in ids if usuario_id in usuarios
+    ]
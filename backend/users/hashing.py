@@ -0,0 +1,74 @@
+"""
+Verificación de contraseñas fuera del bucle de eventos.
+
+El login asíncrono (``LoginAsyncView``) ejecuta PBKDF2 en un pool de hilos
+acotado en lugar de hacerlo en el bucle de eventos de ASGI o en el hilo de las
+vistas síncronas. ``WORKERS`` limita los hashes simultáneos y
+``MAX_PENDIENTES`` las verificaciones en espera: por encima de ese número se
+rechaza el login con 503 en lugar de acumular latencia. Configuración::
+
+    HASHING_ASYNC = {'WORKERS': 4, 'MAX_PENDIENTES': 64}
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+CONFIGURACION_POR_DEFECTO = {'WORKERS': 4, 'MAX_PENDIENTES': 64}
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'HASHING_ASYNC', {})}
+
+
+class PoolSaturado(Exception):
+    pass
+
+
+class PoolHashes:
+    """Pool de hilos perezoso con un máximo de tareas pendientes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pendientes = 0
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=configuracion()['WORKERS'], thread_name_prefix='hashes'
+                )
+            return self._executor
+
+    async def ejecutar(self, funcion, *args):
+        executor = self._obtener_executor()
+        with self._lock:
+            if self.pendientes >= configuracion()['MAX_PENDIENTES']:
+                raise PoolSaturado('Demasiados inicios de sesión en curso')
+            self.pendientes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, funcion, *args)
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+pool = PoolHashes()
+
+
+async def verificar(password, encoded):
+    """``check_password`` en el pool. Sin hash (usuario inexistente) se calcula uno igualmente"""
+    if encoded is None:
+        # Mismo coste que un usuario existente para no revelar qué emails están registrados
+        await pool.ejecutar(make_password, password)
+        return False
+    # Sin ``setter``: el pool no toca la base de datos (la actualización del hash la hace el login síncrono)
+    return await pool.ejecutar(check_password, password, encoded)
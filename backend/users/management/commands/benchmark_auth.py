@@ -0,0 +1,137 @@
+import json
+import statistics
+import time
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+from users import tokens
+from users.authentication import CachedTokenAuthentication, token_cache
+from users.models import Usuario
+
+# (nombre, clase de autenticación, tipo de token, caché de tokens caliente)
+MODOS = [
+    ('token', TokenAuthentication, 'authtoken', False),
+    ('token_cache', CachedTokenAuthentication, 'authtoken', True),
+    ('firmado', CachedTokenAuthentication, 'firmado', None),
+]
+
+RUTA_POR_DEFECTO = '/api/progress/progress/mi_progreso/'
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the per-request cost of authentication with DRF tokens (TokenAuthentication), '
+        'the in-process token cache and signed stateless tokens. Measures authenticate() alone and a '
+        'full authenticated request to a cheap endpoint (warm progress cache). Test data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='authenticate() calls per mode')
+        parser.add_argument('--requests', type=int, default=300, help='Full requests per mode')
+        parser.add_argument('--path', default=RUTA_POR_DEFECTO, help='GET endpoint used for the full requests')
+        parser.add_argument('--output', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0 or options['requests'] <= 0:
+            raise CommandError('--iterations and --requests must be positive')
+
+        resultados = {}
+        with transaction.atomic():
+            becario = Usuario.objects.create_user(
+                'bench_auth_becario', 'bench_auth@example.com', 'bench-password', meta_horas_talleres=10
+            )
+            claves = {
+                'authtoken': Token.objects.create(user=becario).key,
+                'firmado': tokens.emitir(becario),
+            }
+            tokens.revocaciones.recargar()
+            caches['progress'].clear()
+
+            self.stdout.write(f'{"mode":<12} {"auth µs":>9} {"auth q":>7} {"req p50":>9} {"req p95":>9} {"req q":>6}')
+            for nombre, clase, tipo, cache_caliente in MODOS:
+                resultados[nombre] = {
+                    **self.medir_autenticacion(clase, claves[tipo], cache_caliente, options['iterations']),
+                    **self.medir_peticiones(claves[tipo], cache_caliente, options['path'], options['requests']),
+                }
+                r = resultados[nombre]
+                self.stdout.write(
+                    f"{nombre:<12} {r['auth_us']:>9.1f} {r['auth_queries']:>7} "
+                    f"{r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms {r['queries']:>6}"
+                )
+            transaction.set_rollback(True)
+
+        base = resultados['token']
+        for nombre in ('token_cache', 'firmado'):
+            ahorro = base['p50_ms'] - resultados[nombre]['p50_ms']
+            self.stdout.write(f'{nombre}: {abs(ahorro):.2f}ms {"faster" if ahorro >= 0 else "slower"} '
+                              f'p50 per request than token')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump({'fecha': timezone.now().isoformat(), 'ruta': options['path'],
+                           'resultados': resultados}, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def preparar_cache(self, cache_caliente):
+        # Sin caché caliente, CachedTokenAuthentication se comporta como TokenAuthentication
+        if cache_caliente is False:
+            token_cache.limpiar()
+
+    def medir_autenticacion(self, clase, clave, cache_caliente, iteraciones):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {clave}')
+        autenticacion = clase()
+
+        def autenticar():
+            self.preparar_cache(cache_caliente)
+            if autenticacion.authenticate(request) is None:
+                raise CommandError(f'{clase.__name__} did not authenticate')
+
+        autenticar()  # calentamiento
+        with CaptureQueriesContext(connection) as consultas:
+            autenticar()
+
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            autenticar()
+        duracion = time.perf_counter() - inicio
+        return {
+            'auth_us': round(duracion / iteraciones * 1e6, 2),
+            'auth_queries': len(consultas.captured_queries),
+        }
+
+    def medir_peticiones(self, clave, cache_caliente, ruta, peticiones):
+        cliente = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {clave}')
+
+        def peticion():
+            self.preparar_cache(cache_caliente)
+            respuesta = cliente.get(ruta)
+            if respuesta.status_code >= 400:
+                raise CommandError(f'GET {ruta} -> {respuesta.status_code} {respuesta.content[:200]!r}')
+
+        peticion()  # calentamiento (incluye la caché de progreso)
+        with CaptureQueriesContext(connection) as consultas:
+            peticion()
+        # captured_queries se lee del log de la conexión, que cada petición reinicia
+        numero_consultas = len(consultas.captured_queries)
+
+        tiempos = []
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            peticion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return {
+            'p50_ms': round(statistics.median(tiempos), 3),
+            'p95_ms': round(percentil(tiempos, 0.95), 3),
+            'queries': numero_consultas,
+        }
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from backend import sharding
+from users.models import UbicacionUsuario, Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the global user -> shard lookup table (users.UbicacionUsuario) '
+        'from the users stored in every shard. Only meaningful with DB_SHARDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        if not sharding.activo():
+            raise CommandError('Sharding is not configured (set DB_SHARDS)')
+
+        usuarios = sharding.en_todos(
+            lambda alias: list(Usuario.objects.using(alias).values_list('id', 'username', 'email'))
+        )
+        filas = [
+            UbicacionUsuario(shard=alias, usuario_id=pk, username=username, email=email)
+            for alias, valores in usuarios.items()
+            for pk, username, email in valores
+        ]
+        with transaction.atomic():
+            UbicacionUsuario.objects.all().delete()
+            UbicacionUsuario.objects.bulk_create(filas, batch_size=options['batch_size'])
+
+        for alias, valores in usuarios.items():
+            self.stdout.write(f'{alias}: {len(valores)} users')
+        self.stdout.write(self.style.SUCCESS(f'Lookup rebuilt with {len(filas)} rows'))
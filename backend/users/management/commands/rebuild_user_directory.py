@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.directory import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Rebuild the TerminoDirectorio prefix index used by the user directory search."
+
+    def handle(self, *args, **options):
+        usuarios = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Indexed users: {usuarios}'))
@@ -1,10 +1,105 @@
 from django.core.management.base import BaseCommand
 import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.contrib.auth.hashers import make_password
+from django.db import transaction, IntegrityError
 from pathlib import Path
 from django.utils.dateparse import parse_datetime, parse_date
 import datetime
+from users.authentication import token_cache
+from users.tokens import revocaciones
+from users import directory
+
+# Prefixes of values that are already Django password hashes
+HASH_PREFIXES = ('pbkdf2_', 'argon2$', 'bcrypt')
+
+# Columns never copied to the rejects file (it is meant to be read and fixed by hand)
+SECRET_COLUMNS = ('password',)
+
+EXTRA_FIELDS = ['rol', 'sexo', 'fecha_nacimiento', 'carrera', 'universidad', 'semestre']
+
+
+def to_bool(v):
+    return str(v).strip() in ('1', 'True', 'true', 'yes', 'y')
+
+
+def is_hashed(pwd):
+    return pwd.startswith(HASH_PREFIXES)
+
+
+def needs_revocation(user):
+    """Whether an updated user's signed tokens must be revoked: deactivated, new password or new role"""
+    before = getattr(user, '_seed_before', None)
+    if before is None:
+        return False
+    password, rol = before
+    return not user.is_active or user.password != password or user.rol != rol
+
+
+def apply_row(user, row):
+    """Copy every column of ``row`` except the password onto ``user``"""
+    # Basic fields
+    if 'first_name' in row:
+        user.first_name = row.get('first_name') or ''
+    if 'last_name' in row:
+        user.last_name = row.get('last_name') or ''
+    if 'email' in row:
+        user.email = row.get('email') or ''
+
+    if 'is_staff' in row and row.get('is_staff') not in (None, ''):
+        try:
+            user.is_staff = to_bool(row['is_staff'])
+        except Exception:
+            pass
+    if 'is_active' in row and row.get('is_active') not in (None, ''):
+        try:
+            user.is_active = to_bool(row['is_active'])
+        except Exception:
+            pass
+    if 'is_superuser' in row and row.get('is_superuser') not in (None, ''):
+        try:
+            user.is_superuser = to_bool(row['is_superuser'])
+        except Exception:
+            pass
+
+    # Dates
+    if 'date_joined' in row and row.get('date_joined') and row['date_joined'] != 'NULL':
+        dt = parse_datetime(row['date_joined'])
+        if dt is None:
+            d = parse_date(row['date_joined'])
+            if d:
+                dt = datetime.datetime.combine(d, datetime.time())
+        if dt:
+            user.date_joined = dt
+
+    if 'last_login' in row and row.get('last_login') and row['last_login'] != 'NULL':
+        dt = parse_datetime(row['last_login'])
+        if dt:
+            user.last_login = dt
+
+    # Try to set extra fields if they exist on the model
+    for key in EXTRA_FIELDS:
+        if key in row and row[key] and row[key] != 'NULL' and hasattr(user, key):
+            val = row[key]
+            if key == 'fecha_nacimiento':
+                d = parse_date(val)
+                if d:
+                    setattr(user, key, d)
+                    continue
+            setattr(user, key, val)
+
+
+def row_username(row):
+    return (row.get('username') or row.get('email') or '').strip()
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
 
 
 class Command(BaseCommand):
@@ -14,6 +109,14 @@ class Command(BaseCommand):
         default_path = Path(__file__).resolve().parents[3] / 'id,password,last_login,is_superuser,user.txt'
         parser.add_argument('--file', '-f', type=str, default=str(default_path), help='Path to CSV file')
         parser.add_argument('--update', action='store_true', help='Update existing users (matched by username)')
+        parser.add_argument('--bulk', action='store_true',
+                            help='Stream the CSV in chunks, hash passwords in a process pool and write with bulk queries')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per chunk in --bulk mode')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes in --bulk mode (default: CPU count)')
+        parser.add_argument('--rejects', type=str, default=None,
+                            help='CSV file for rejected rows in --bulk mode, without the password column '
+                                 '(default: <file>.rejects.csv)')
 
     def handle(self, *args, **options):
         path = Path(options['file'])
@@ -21,6 +124,9 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f'File not found: {path}'))
             return
 
+        if options['bulk']:
+            return self.handle_bulk(path, options)
+
         User = get_user_model()
         created = 0
         updated = 0
@@ -30,7 +136,7 @@ class Command(BaseCommand):
             reader = csv.DictReader(fh)
             with transaction.atomic():
                 for row in reader:
-                    username = (row.get('username') or row.get('email') or '').strip()
+                    username = row_username(row)
                     if not username:
                         self.stderr.write(self.style.WARNING('Skipping row without username/email'))
                         skipped += 1
@@ -47,71 +153,19 @@ class Command(BaseCommand):
                     else:
                         user = User()
 
-                    # Basic fields
                     user.username = username
-                    if 'first_name' in row:
-                        user.first_name = row.get('first_name') or ''
-                    if 'last_name' in row:
-                        user.last_name = row.get('last_name') or ''
-                    if 'email' in row:
-                        user.email = row.get('email') or ''
-
-                    def to_bool(v):
-                        return str(v).strip() in ('1', 'True', 'true', 'yes', 'y')
-
-                    if 'is_staff' in row and row.get('is_staff') not in (None, ''):
-                        try:
-                            user.is_staff = to_bool(row['is_staff'])
-                        except Exception:
-                            pass
-                    if 'is_active' in row and row.get('is_active') not in (None, ''):
-                        try:
-                            user.is_active = to_bool(row['is_active'])
-                        except Exception:
-                            pass
-                    if 'is_superuser' in row and row.get('is_superuser') not in (None, ''):
-                        try:
-                            user.is_superuser = to_bool(row['is_superuser'])
-                        except Exception:
-                            pass
+                    apply_row(user, row)
 
                     # Password: if value looks like a Django hashed password (pbkdf2_sha256$...), set it directly.
                     pwd = row.get('password')
                     if pwd:
                         pwd = pwd.strip()
-                        if pwd.startswith('pbkdf2_') or pwd.startswith('argon2$') or pwd.startswith('bcrypt'):
+                        if is_hashed(pwd):
                             user.password = pwd
                         else:
                             # treat as plain text and hash it
                             user.set_password(pwd)
 
-                    # Dates
-                    if 'date_joined' in row and row.get('date_joined') and row['date_joined'] != 'NULL':
-                        dt = parse_datetime(row['date_joined'])
-                        if dt is None:
-                            d = parse_date(row['date_joined'])
-                            if d:
-                                dt = datetime.datetime.combine(d, datetime.time())
-                        if dt:
-                            user.date_joined = dt
-
-                    if 'last_login' in row and row.get('last_login') and row['last_login'] != 'NULL':
-                        dt = parse_datetime(row['last_login'])
-                        if dt:
-                            user.last_login = dt
-
-                    # Try to set extra fields if they exist on the model
-                    extras = ['rol', 'sexo', 'fecha_nacimiento', 'carrera', 'universidad', 'semestre']
-                    for key in extras:
-                        if key in row and row[key] and row[key] != 'NULL' and hasattr(user, key):
-                            val = row[key]
-                            if key == 'fecha_nacimiento':
-                                d = parse_date(val)
-                                if d:
-                                    setattr(user, key, d)
-                                    continue
-                            setattr(user, key, val)
-
                     try:
                         user.save()
                         if exists:
@@ -123,3 +177,167 @@ class Command(BaseCommand):
                         self.stderr.write(self.style.ERROR(f'Failed to save {username}: {e}'))
 
         self.stdout.write(self.style.NOTICE(f'Created: {created}, Updated: {updated}, Skipped: {skipped}'))
+
+    # -- Bulk mode ------------------------------------------------------------
+
+    def handle_bulk(self, path, options):
+        """
+        Streaming import: each chunk is one transaction with a single lookup,
+        one bulk_create and one bulk_update. Plaintext passwords are hashed in
+        a process pool. Rows that cannot be imported go to the rejects file.
+        """
+        rejects_path = Path(options['rejects'] or f'{path}.rejects.csv')
+        chunk_size = max(1, options['chunk_size'])
+        self.totals = {'created': 0, 'updated': 0, 'skipped': 0, 'rejected': 0}
+        start = time.monotonic()
+        processed = 0
+
+        with open(path, newline='', encoding='utf-8') as fh, \
+                open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_fh, \
+                ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker,
+                                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),)) as pool:
+            reader = csv.DictReader(fh)
+            self.rejects = csv.DictWriter(
+                rejects_fh, extrasaction='ignore',
+                fieldnames=[f for f in reader.fieldnames or [] if f not in SECRET_COLUMNS] + ['error'],
+            )
+            self.rejects.writeheader()
+            # Columns present in the file decide which fields an update may touch
+            self.update_fields = self.fields_for_header(reader.fieldnames or [])
+
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    self.import_chunk(chunk, pool, options['update'])
+                    processed += len(chunk)
+                    chunk = []
+                    self.report_progress(processed, start)
+            if chunk:
+                self.import_chunk(chunk, pool, options['update'])
+                processed += len(chunk)
+                self.report_progress(processed, start)
+
+        t = self.totals
+        self.stdout.write(self.style.NOTICE(
+            f"Created: {t['created']}, Updated: {t['updated']}, Skipped: {t['skipped']}, Rejected: {t['rejected']}"
+        ))
+        if t['rejected']:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {rejects_path}'))
+
+    @staticmethod
+    def fields_for_header(header):
+        User = get_user_model()
+        fields = {'password'} & set(header)
+        for name in ['first_name', 'last_name', 'email', 'is_staff', 'is_active', 'is_superuser',
+                     'date_joined', 'last_login'] + EXTRA_FIELDS:
+            if name in header and hasattr(User, name):
+                fields.add(name)
+        return sorted(fields)
+
+    def report_progress(self, processed, start):
+        elapsed = time.monotonic() - start
+        rate = processed / elapsed if elapsed else 0
+        t = self.totals
+        self.stdout.write(
+            f"{processed} rows ({rate:.0f}/s) - created {t['created']}, updated {t['updated']}, "
+            f"skipped {t['skipped']}, rejected {t['rejected']}"
+        )
+
+    def reject(self, row, error):
+        self.rejects.writerow({**row, 'error': error})
+        self.totals['rejected'] += 1
+
+    def import_chunk(self, rows, pool, update):
+        User = get_user_model()
+
+        # First occurrence of each username wins within a chunk
+        by_username = {}
+        for row in rows:
+            username = row_username(row)
+            if not username:
+                self.reject(row, 'missing username/email')
+            elif username in by_username:
+                self.reject(row, 'duplicate username in file')
+            else:
+                by_username[username] = row
+
+        existing = User.objects.in_bulk(list(by_username), field_name='username')
+        if not update:
+            for username in [u for u in by_username if u in existing]:
+                del by_username[username]
+                self.totals['skipped'] += 1
+
+        users = {}
+        plaintext = []
+        for username, row in by_username.items():
+            user = existing.get(username) or User(username=username)
+            # Signed tokens of existing users are revoked when these change, as on save()
+            before = (user.password, user.rol) if username in existing else None
+            try:
+                apply_row(user, row)
+            except Exception as e:
+                self.reject(row, str(e))
+                continue
+            pwd = (row.get('password') or '').strip()
+            if pwd:
+                if is_hashed(pwd):
+                    user.password = pwd
+                else:
+                    plaintext.append((username, pwd))
+            users[username] = user
+            user._seed_before = before
+
+        # PBKDF2 is CPU bound: hash in parallel processes
+        if plaintext:
+            hashes = pool.map(make_password, [pwd for _, pwd in plaintext], chunksize=64)
+            for (username, _), hashed in zip(plaintext, hashes):
+                users[username].password = hashed
+
+        new = [u for name, u in users.items() if name not in existing]
+        changed = [u for name, u in users.items() if name in existing]
+        try:
+            with transaction.atomic():
+                self.write(new, changed, update)
+        except (IntegrityError, ValueError):
+            # Fall back to row by row only for the failing chunk, to find the culprits
+            for username, user in users.items():
+                try:
+                    with transaction.atomic():
+                        if username in existing:
+                            self.write([], [user], update)
+                        else:
+                            self.write([user], [], update)
+                except (IntegrityError, ValueError) as e:
+                    self.reject(by_username[username], str(e))
+
+    def write(self, new, changed, update):
+        User = get_user_model()
+        if new:
+            kwargs = {'batch_size': 1000}
+            if update and self.update_fields:
+                # A concurrent import may have created the same username meanwhile
+                kwargs.update(update_conflicts=True, unique_fields=['username'], update_fields=self.update_fields)
+            User.objects.bulk_create(new, **kwargs)
+        if changed and self.update_fields:
+            User.objects.bulk_update(changed, self.update_fields, batch_size=1000)
+            # bulk_update does not send post_save: drop cached tokens and revoke
+            # signed tokens explicitly, like users.signals does on save()
+            revoke = {}
+            for user in changed:
+                token_cache.invalidar_usuario(user.pk)
+                if needs_revocation(user):
+                    revoke.setdefault(user._state.db, []).append(user.pk)
+            for shard, ids in revoke.items():
+                revocaciones.revocar_varios(shard, ids)
+        # Neither does bulk_create: index the directory search terms here
+        directory.indexar(User.objects.filter(
+            username__in=[user.username for user in new + changed]
+        ).values_list('id', flat=True))
+
+        # Only counted once the surrounding transaction block has not raised
+        transaction.on_commit(lambda: self.count(len(new), len(changed) if self.update_fields else 0))
+
+    def count(self, created, updated):
+        self.totals['created'] += created
+        self.totals['updated'] += updated
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_alter_usuario_managers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['email'], name='usuario_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['rol', 'is_active'], name='usuario_rol_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['username'], name='usuario_activo_username_idx'),
+        ),
+    ]
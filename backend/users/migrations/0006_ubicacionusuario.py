@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UbicacionUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.CharField(max_length=50)),
+                ('usuario_id', models.BigIntegerField()),
+                ('username', models.CharField(max_length=150)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['email'], name='ubicacion_email_idx'), models.Index(fields=['username'], name='ubicacion_username_idx')],
+                'constraints': [models.UniqueConstraint(fields=('shard', 'usuario_id'), name='ubicacion_shard_usuario_uniq')],
+            },
+        ),
+    ]
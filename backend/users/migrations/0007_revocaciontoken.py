@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_ubicacionusuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevocacionToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.CharField(default='default', max_length=50)),
+                ('usuario_id', models.BigIntegerField()),
+                ('revocado_en', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('shard', 'usuario_id'), name='revocacion_shard_usuario_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+import re
+import unicodedata
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+CAMPOS = ('first_name', 'last_name', 'username', 'email', 'carrera', 'universidad')
+
+
+def poblar_directorio(apps, schema_editor):
+    """Términos normalizados de los usuarios existentes"""
+    Usuario = apps.get_model('users', 'Usuario')
+    TerminoDirectorio = apps.get_model('users', 'TerminoDirectorio')
+
+    def palabras(texto):
+        descompuesto = unicodedata.normalize('NFKD', texto or '')
+        return re.findall(r'[^\W_]+', ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold())
+
+    filas = {
+        (usuario_id, palabra[:100])
+        for usuario_id, *valores in Usuario.objects.values_list('id', *CAMPOS).iterator()
+        for valor in valores for palabra in palabras(valor)
+    }
+    TerminoDirectorio.objects.bulk_create(
+        [TerminoDirectorio(usuario_id=u, termino=t) for u, t in filas], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_revocaciontoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoDirectorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100)),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='terminos_directorio', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'termino'], name='termino_directorio_usuario_idx')],
+                'constraints': [models.UniqueConstraint(fields=('termino', 'usuario'), name='termino_directorio_uniq')],
+            },
+        ),
+        migrations.RunPython(poblar_directorio, migrations.RunPython.noop),
+    ]
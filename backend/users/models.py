@@ -29,9 +29,26 @@ class Usuario(AbstractUser):
     configuracion_inicial_completada = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True, help_text="Desactivar en lugar de eliminar")
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Login y pregunta de seguridad buscan por email, que no es único
+            models.Index(fields=['email'], name='usuario_email_idx'),
+            models.Index(fields=['rol', 'is_active'], name='usuario_rol_activo_idx'),
+            # Parcial: listado de usuarios activos ordenado por username (clave del cursor)
+            models.Index(fields=['username'], condition=models.Q(is_active=True),
+                         name='usuario_activo_username_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.rol})"
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Usuario de un token firmado (users/tokens.py): el primer campo diferido
+        # que se usa carga todos los demás en una sola consulta
+        if fields is not None and getattr(self, '_cargar_diferidos_juntos', False):
+            fields = set(fields) | self.get_deferred_fields()
+            self._cargar_diferidos_juntos = False
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
     
     # Use Django's UserManager so authentication helpers (authenticate/get_by_natural_key)
     # work correctly. Replacing with a plain models.Manager removes methods required
@@ -39,4 +56,77 @@ class Usuario(AbstractUser):
     objects = UserManager()
     # active_objects can remain a simple manager or extend UserManager if you need
     # authentication-related helpers on that manager as well.
-    active_objects = models.Manager()
\ No newline at end of file
+    active_objects = models.Manager()
+
+class TerminoDirectorio(models.Model):
+    """
+    Índice de prefijos del directorio de usuarios (``users/directory.py``).
+
+    Una fila por palabra normalizada (sin acentos ni mayúsculas) de los datos
+    visibles del usuario. La restricción única ``(termino, usuario)`` es el
+    índice por el que se busca por prefijo; ``(usuario, termino)`` comprueba
+    el resto de palabras de la búsqueda para cada candidato.
+    """
+    # El índice (usuario, termino) cubre también las búsquedas por usuario
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='terminos_directorio',
+                                db_index=False)
+    termino = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['termino', 'usuario'], name='termino_directorio_uniq'),
+        ]
+        indexes = [
+            # Comprobar las palabras secundarias de la búsqueda para un usuario concreto
+            models.Index(fields=['usuario', 'termino'], name='termino_directorio_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.termino} -> {self.usuario_id}"
+
+
+class UbicacionUsuario(models.Model):
+    """
+    Tabla global (solo en ``default``) que indica en qué shard vive cada usuario.
+
+    Con sharding por universidad (``backend/sharding.py``) el login y la
+    recuperación de contraseña buscan aquí el shard a partir del email antes de
+    consultar ``Usuario``. ``users.signals`` la mantiene al guardar o eliminar
+    usuarios; ``manage.py rebuild_shard_lookup`` la reconstruye.
+    """
+    shard = models.CharField(max_length=50)
+    usuario_id = models.BigIntegerField()
+    username = models.CharField(max_length=150)
+    email = models.EmailField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shard', 'usuario_id'], name='ubicacion_shard_usuario_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['email'], name='ubicacion_email_idx'),
+            models.Index(fields=['username'], name='ubicacion_username_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} -> {self.shard}"
+
+
+class RevocacionToken(models.Model):
+    """
+    Marca de revocación de los tokens firmados de un usuario (``users/tokens.py``).
+
+    Los tokens emitidos antes de ``revocado_en`` dejan de ser válidos. Tabla
+    global: con sharding vive en ``default`` y se distingue el usuario por shard.
+    """
+    shard = models.CharField(max_length=50, default='default')
+    usuario_id = models.BigIntegerField()
+    revocado_en = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shard', 'usuario_id'], name='revocacion_shard_usuario_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.shard}:{self.usuario_id} desde {self.revocado_en}"
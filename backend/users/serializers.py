@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from backend.expansion import ExpandableFieldsMixin
 from .models import Usuario
 
 class LoginSerializer(serializers.Serializer):
@@ -11,30 +12,25 @@ class LoginSerializer(serializers.Serializer):
         password = data.get('password')
         
         if email and password:
-            try:
-                # Buscar el usuario por email
-                usuario_obj = Usuario.objects.get(email=email)
-                # Usar el username para autenticar
-                user = authenticate(username=usuario_obj.username, password=password)
-                if not user:
-                    raise serializers.ValidationError('Credenciales inválidas')
-                data['user'] = user
-            except Usuario.DoesNotExist:
+            # Una sola consulta por email (users/backends.py)
+            user = authenticate(self.context.get('request'), email=email, password=password)
+            if not user:
                 raise serializers.ValidationError('Credenciales inválidas')
+            data['user'] = user
         return data
 
-class UsuarioSerializer(serializers.ModelSerializer):
-    # NUEVO: Mostrar actividades asignadas al becario
-    actividades_asignadas = serializers.SerializerMethodField()
-
+class UsuarioSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Usuario
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'rol',
                  'sexo', 'fecha_nacimiento', 'carrera', 'universidad', 'semestre',
                  'meta_horas_voluntariado_interno', 'meta_horas_voluntariado_externo',
                  'meta_horas_chat_ingles', 'meta_horas_talleres',
-                 'pregunta_seguridad', 'configuracion_inicial_completada',
-                 'actividades_asignadas']  # NUEVO campo
+                 'pregunta_seguridad', 'configuracion_inicial_completada']
+        # Solo con ?expand=actividades_asignadas se incluyen las actividades del becario
+        expandable_fields = {
+            'actividades_asignadas': ('activities.serializers.ActividadBasicaSerializer', {'many': True}),
+        }
         extra_kwargs = {
             'password': {'write_only': True},
             'respuesta_seguridad': {'write_only': True},  # Never expose security answers
@@ -85,15 +81,6 @@ class UsuarioSerializer(serializers.ModelSerializer):
 
         return data
 
-    def get_actividades_asignadas(self, obj):
-        """Obtener información básica de las actividades asignadas al becario"""
-        if obj.rol != 'becario':
-            return []
-
-        from activities.serializers import ActividadBasicaSerializer
-        actividades = obj.actividades_asignadas.all()
-        return ActividadBasicaSerializer(actividades, many=True).data
-
 class UsuarioCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Usuario
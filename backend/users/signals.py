@@ -0,0 +1,81 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from backend import sharding
+from .authentication import token_cache
+from .tokens import revocaciones
+from . import directory
+from .models import UbicacionUsuario, Usuario
+
+
+@receiver(post_save, sender=Usuario)
+def invalidar_tokens_usuario(sender, instance, update_fields=None, **kwargs):
+    # Desactivación, cambio de contraseña o de rol: el usuario cacheado ya no es válido.
+    # El login solo actualiza last_login y no necesita invalidar.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidar_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_eliminado(sender, instance, **kwargs):
+    token_cache.invalidar_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidar_token_eliminado(sender, instance, **kwargs):
+    token_cache.invalidar_token(instance.key)
+
+
+@receiver(post_save, sender=Usuario)
+def actualizar_ubicacion(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Tabla global email/username -> shard (solo con sharding por universidad)
+    if raw or not sharding.activo():
+        return
+    if update_fields is not None and not set(update_fields) & {'username', 'email'}:
+        return
+    UbicacionUsuario.objects.update_or_create(
+        shard=instance._state.db, usuario_id=instance.pk,
+        defaults={'username': instance.username, 'email': instance.email},
+    )
+
+
+@receiver(post_save, sender=Usuario)
+def actualizar_directorio(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Términos de búsqueda del directorio (users/directory.py); se borran en cascada con el usuario
+    if raw or (update_fields is not None and not set(update_fields) & set(directory.CAMPOS)):
+        return
+    with sharding.en_shard(instance._state.db):
+        directory.indexar([instance.pk])
+
+
+@receiver(post_delete, sender=Usuario)
+def eliminar_ubicacion(sender, instance, **kwargs):
+    if sharding.activo():
+        UbicacionUsuario.objects.filter(shard=instance._state.db, usuario_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=Usuario)
+def recordar_rol_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rol_anterior = None
+    if raw or instance._state.adding or (update_fields is not None and 'rol' not in update_fields):
+        return
+    instance._rol_anterior = Usuario.objects.filter(pk=instance.pk).values_list('rol', flat=True).first()
+
+
+@receiver(post_save, sender=Usuario)
+def revocar_tokens_firmados(sender, instance, created=False, raw=False, **kwargs):
+    # Los tokens firmados llevan el rol y no consultan al usuario: se revocan al
+    # desactivarlo, al cambiar su contraseña (set_password deja ``_password``) o su rol
+    if raw or created:
+        return
+    rol_anterior = getattr(instance, '_rol_anterior', None)
+    if (not instance.is_active or getattr(instance, '_password', None) is not None
+            or (rol_anterior is not None and rol_anterior != instance.rol)):
+        revocaciones.revocar(instance._state.db, instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def revocar_tokens_usuario_eliminado(sender, instance, **kwargs):
+    revocaciones.revocar(instance._state.db, instance.pk)
+
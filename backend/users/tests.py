@@ -1,3 +1,513 @@
-from django.test import TestCase
+import csv
+import tempfile
+import time
+from datetime import date
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from activities.models import Actividad
+from backend import routers, sharding
+from backend.query_plan import PlanConsultasMixin
+from progress.models import ProgresoMeta
+from records.models import RegistroHoras
+from .authentication import CachedTokenAuthentication, TokenCache, token_cache
+from .hashing import pool
+from .models import RevocacionToken, TerminoDirectorio, UbicacionUsuario, Usuario
+from .throttling import cubos
+from .tokens import revocaciones
+from . import tokens
 
-# Create your tests here.
+
+class PlanConsultasUsuariosTests(PlanConsultasMixin, TestCase):
+    """Las consultas principales de los endpoints de usuarios no recorren tablas enteras"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.becario = Usuario.objects.create_user(
+            'becario', 'becario@example.com', 'clave', rol='becario', pregunta_seguridad='¿Color?'
+        )
+
+    def setUp(self):
+        cubos.limpiar()
+        self.client = APIClient()
+
+    def test_login_busca_por_email(self):
+        respuesta = self.assertSinEscaneosCompletos(lambda: self.client.post(
+            '/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'}
+        ))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_pregunta_seguridad_busca_por_email(self):
+        respuesta = self.assertSinEscaneosCompletos(lambda: self.client.post(
+            '/api/users/usuarios/obtener_pregunta_seguridad/', {'email': 'becario@example.com'}
+        ))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_listado_activos_por_cursor(self):
+        self.client.force_authenticate(self.admin)
+        respuesta = self.assertSinEscaneosCompletos(
+            lambda: self.client.get('/api/users/usuarios/', {'paginacion': 'cursor'})
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_mi_perfil(self):
+        self.client.force_authenticate(self.becario)
+        respuesta = self.assertSinEscaneosCompletos(lambda: self.client.get('/api/users/usuarios/mi_perfil/'))
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class PerfilCondicionalTests(TestCase):
+    """mi_perfil responde 304 hasta que cambia el usuario; el login no lo invalida"""
+
+    def test_validadores_de_mi_perfil(self):
+        becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        client = APIClient()
+        client.force_authenticate(becario)
+        url = '/api/users/usuarios/mi_perfil/'
+        respuesta = client.get(url)
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+        etag = respuesta['ETag']
+
+        becario.last_login = becario.date_joined
+        becario.save(update_fields=['last_login'])
+        # La huella sale de los campos serializados de request.user: sin consultas
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotIn('Last-Modified', respuesta.headers)
+
+        becario.carrera = 'Ingeniería'
+        becario.save()
+        respuesta = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta.data['carrera']), (200, 'Ingeniería'))
+
+
+class CacheTokensTests(TestCase):
+    """CachedTokenAuthentication: aciertos sin consultas, invalidación por señales, TTL y LRU"""
+    # Con DB_SHARDS un token que no está en la caché se busca en todos los shards. Sin '__all__':
+    # con DB_REPLICA incluiría la réplica, que en pruebas es un espejo del primario
+    databases = set(sharding.todos())
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+        cls.token = Token.objects.create(user=cls.becario)
+
+    def setUp(self):
+        token_cache.limpiar()
+
+    def autenticar(self, key=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key or self.token.key}')
+        return CachedTokenAuthentication().authenticate(request)
+
+    def configuracion(self, **cache):
+        return override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'TOKEN_CACHE': {**settings.REST_FRAMEWORK['TOKEN_CACHE'], **cache},
+        })
+
+    def test_acierto_sin_consultas(self):
+        self.autenticar()
+        with self.assertNumQueries(0):
+            usuario, _ = self.autenticar()
+        self.assertEqual(usuario.pk, self.becario.pk)
+        self.assertEqual(token_cache.estadisticas(), {'entradas': 1, 'hits': 1, 'misses': 1})
+
+    def test_desactivar_rechaza_la_siguiente_peticion(self):
+        self.autenticar()
+        self.becario.is_active = False
+        self.becario.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+    def test_cambio_de_password_desaloja(self):
+        self.autenticar()
+        self.becario.set_password('otra-clave')
+        self.becario.save()
+        self.assertEqual(token_cache.estadisticas()['entradas'], 0)
+        # El login solo toca last_login y no desaloja
+        self.autenticar()
+        self.becario.save(update_fields=['last_login'])
+        self.assertEqual(token_cache.estadisticas()['entradas'], 1)
+
+    def test_borrar_y_rotar_token_desaloja(self):
+        self.autenticar()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar()
+
+        nuevo = Token.objects.create(user=self.becario)
+        self.autenticar(nuevo.key)
+        # Rotación: se sustituye la clave y la anterior deja de valer
+        nuevo.delete()
+        rotado = Token.objects.create(user=self.becario)
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar(nuevo.key)
+        self.assertEqual(self.autenticar(rotado.key)[0].pk, self.becario.pk)
+
+    def test_caduca_tras_el_ttl(self):
+        with self.configuracion(TTL=60), mock.patch('users.authentication.time.monotonic') as reloj:
+            reloj.return_value = 1000
+            self.autenticar()
+            reloj.return_value = 1059
+            with self.assertNumQueries(0):
+                self.autenticar()
+            reloj.return_value = 1061
+            self.autenticar()
+        self.assertEqual(token_cache.estadisticas(), {'entradas': 1, 'hits': 1, 'misses': 2})
+
+    def test_lru_desaloja_la_entrada_menos_usada(self):
+        cache = TokenCache()
+        usuarios = {clave: Usuario(pk=i, username=clave) for i, clave in enumerate('abc', start=1)}
+        with self.configuracion(MAX_ENTRIES=2):
+            cache.set('a', usuarios['a'], None)
+            cache.set('b', usuarios['b'], None)
+            cache.get('a')
+            cache.set('c', usuarios['c'], None)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual([cache.get(clave)[0].username for clave in 'ac'], ['a', 'c'])
+
+
+@override_settings(TOKENS_FIRMADOS={'ACTIVO': True, 'TTL': 3600, 'REFRESCO': 30})
+class TokensFirmadosTests(TestCase):
+    """Tokens firmados: se verifican sin consultas y se revocan al desactivar o cambiar la contraseña"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave', carrera='Ing')
+
+    def setUp(self):
+        revocaciones.limpiar()
+        cubos.limpiar()
+        self.client = APIClient()
+        respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'})
+        self.token = respuesta.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_verificacion_sin_consultas(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token}')
+        revocaciones.recargar()
+        with self.assertNumQueries(0):
+            usuario, _ = CachedTokenAuthentication().authenticate(request)
+        self.assertEqual((usuario.pk, usuario.rol), (self.becario.pk, 'becario'))
+        # El resto de campos se cargan juntos en una sola consulta
+        with self.assertNumQueries(1):
+            self.assertEqual((usuario.carrera, usuario.email), ('Ing', 'becario@example.com'))
+
+    def test_mi_perfil(self):
+        respuesta = self.client.get('/api/users/usuarios/mi_perfil/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['username'], 'becario')
+
+    def test_firma_alterada_o_caducada(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token[:-2]}xx')
+        self.assertEqual(self.client.get('/api/users/usuarios/mi_perfil/').status_code, 401)
+        self.client.credentials()
+        with override_settings(TOKENS_FIRMADOS={'ACTIVO': True, 'TTL': -1}):
+            respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {respuesta.data["token"]}')
+        self.assertEqual(self.client.get('/api/users/usuarios/mi_perfil/').status_code, 401)
+
+    def test_desactivar_revoca(self):
+        self.becario.is_active = False
+        self.becario.save()
+        self.assertEqual(self.client.get('/api/users/usuarios/mi_perfil/').status_code, 401)
+
+    def test_cambio_de_password_revoca_y_otros_procesos_lo_ven_al_recargar(self):
+        self.becario.set_password('otra-clave')
+        self.becario.save()
+        # Otro proceso: su lista está vacía hasta que la recarga de la base de datos
+        revocaciones.limpiar()
+        self.assertEqual(self.client.get('/api/users/usuarios/mi_perfil/').status_code, 401)
+        # Los tokens emitidos después de la revocación son válidos
+        self.client.credentials()
+        respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'otra-clave'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {respuesta.data["token"]}')
+        self.assertEqual(self.client.get('/api/users/usuarios/mi_perfil/').status_code, 200)
+
+    def test_revocacion_se_lee_del_primario_con_replica(self):
+        contexto = routers._usar_replica.set(True)
+        try:
+            for modelo in (RevocacionToken, UbicacionUsuario):
+                self.assertEqual(routers.LecturaEscrituraRouter().db_for_read(modelo), 'default')
+        finally:
+            routers._usar_replica.reset(contexto)
+
+        self.becario.is_active = False
+        self.becario.save()
+        # Otro proceso recarga la lista durante un GET que lee de una réplica recién copiada
+        revocaciones.limpiar()
+        router = 'backend.routers.LecturaEscrituraRouter'
+        middleware = list(settings.MIDDLEWARE)
+        if 'backend.routers.ReplicaMiddleware' not in middleware:
+            middleware.insert(middleware.index('backend.metrics.MetricasMiddleware') + 1,
+                              'backend.routers.ReplicaMiddleware')
+        with override_settings(DATABASE_ROUTERS=[r for r in settings.DATABASE_ROUTERS if r != router] + [router],
+                               MIDDLEWARE=middleware), \
+                mock.patch('backend.routers.replica_actualizada', return_value=time.time()):
+            # Cliente nuevo: carga los middlewares con ReplicaMiddleware
+            client = APIClient(HTTP_AUTHORIZATION=f'Token {self.token}')
+            self.assertEqual(client.get('/api/users/usuarios/mi_perfil/').status_code, 401)
+
+
+@override_settings(THROTTLING_PUBLICO={
+    'ACTIVO': True, 'IP': {'CAPACIDAD': 5, 'RECARGA': 0.01}, 'CUENTA': {'CAPACIDAD': 2, 'RECARGA': 0.01},
+    'MAX_ENTRIES': 100,
+})
+class LoginTests(TestCase):
+    """Login por email en una consulta, límites por IP y por cuenta y login asíncrono"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.becario = Usuario.objects.create_user('becario', 'becario@example.com', 'clave')
+
+    def setUp(self):
+        cubos.limpiar()
+        self.client = APIClient()
+
+    def test_login_una_consulta_antes_del_token(self):
+        # Usuario por email y token existente (con sharding, antes la tabla de ubicación;
+        # con tokens firmados no se consulta la tabla de tokens)
+        self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'})
+        with self.assertNumQueries(2 + sharding.activo() - tokens.activo()):
+            respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_limite_por_cuenta_y_por_ip(self):
+        for _ in range(2):
+            respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'mala'})
+            self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.client.post('/api/users/auth/login/', {'email': 'becario@example.com', 'password': 'clave'})
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertIn('Retry-After', respuesta)
+        # Otras cuentas siguen pudiendo hasta agotar el cubo de la IP (compartido con la recuperación)
+        self.assertEqual(self.client.post('/api/users/usuarios/obtener_pregunta_seguridad/',
+                                          {'email': 'otro@example.com'}).status_code, 404)
+        self.assertEqual(self.client.post('/api/users/auth/login/',
+                                          {'email': 'otro@example.com', 'password': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/users/auth/login/',
+                                          {'email': 'tercero@example.com', 'password': 'x'}).status_code, 429)
+
+    async def test_login_asincrono(self):
+        respuesta = await self.async_client.post(
+            '/api/users/auth/login_async/', {'email': 'becario@example.com', 'password': 'clave'},
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['user']['username'], 'becario')
+        for email in ('becario@example.com', 'nadie@example.com'):
+            respuesta = await self.async_client.post(
+                '/api/users/auth/login_async/', {'email': email, 'password': 'mala'}, content_type='application/json',
+            )
+            self.assertEqual(respuesta.status_code, 400)
+
+    async def test_login_asincrono_sin_token_csrf(self):
+        # Como un cliente real: CsrfViewMiddleware activo y sin cookie ni cabecera CSRF
+        cliente = AsyncClient(enforce_csrf_checks=True)
+        respuesta = await cliente.post(
+            '/api/users/auth/login_async/', {'email': 'becario@example.com', 'password': 'clave'},
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+    async def test_login_asincrono_pool_saturado(self):
+        with override_settings(HASHING_ASYNC={'WORKERS': 1, 'MAX_PENDIENTES': 0}):
+            respuesta = await self.async_client.post(
+                '/api/users/auth/login_async/', {'email': 'becario@example.com', 'password': 'clave'},
+                content_type='application/json',
+            )
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(pool.pendientes, 0)
+
+
+class DirectorioTests(PlanConsultasMixin, TestCase):
+    """Directorio por prefijos: normalizado, acotado y mantenido al guardar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        cls.ana = Usuario.objects.create_user(
+            'ana_perez', 'ana.perez@ucv.edu', 'clave', first_name='Ana', last_name='Pérez',
+            carrera='Ingeniería', universidad='UCV',
+        )
+        cls.andres = Usuario.objects.create_user(
+            'andres', 'andres@usb.edu', 'clave', first_name='Andrés', last_name='Núñez', universidad='USB',
+        )
+        Usuario.objects.create_user('anibal', 'anibal@usb.edu', 'clave', first_name='Aníbal', is_active=False)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def buscar(self, **params):
+        respuesta = self.client.get('/api/users/usuarios/directorio/', params)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta.data
+
+    def test_prefijos_sin_acentos(self):
+        self.assertEqual([u['nombre'] for u in self.buscar(q='AN')], ['Ana Pérez', 'Andrés Núñez'])
+        self.assertEqual(self.buscar(q='nunez'), [{'id': self.andres.pk, 'nombre': 'Andrés Núñez', 'rol': 'becario'}])
+        # Todas las palabras deben coincidir, en cualquier campo
+        self.assertEqual([u['id'] for u in self.buscar(q='an ingen')], [self.ana.pk])
+        self.assertEqual([u['id'] for u in self.buscar(q='usb')], [self.andres.pk])
+        self.assertEqual(len(self.buscar(q='an', limite=1)), 1)
+        self.assertEqual(self.buscar(q='adm', rol='becario'), [])
+
+    def test_se_actualiza_al_guardar(self):
+        self.andres.last_name = 'Álvarez'
+        self.andres.save()
+        self.assertEqual(self.buscar(q='nunez'), [])
+        self.assertEqual([u['id'] for u in self.buscar(q='alva')], [self.andres.pk])
+        self.assertFalse(TerminoDirectorio.objects.filter(termino='nunez').exists())
+
+    def test_consultas_por_indice(self):
+        self.assertSinEscaneosCompletos(lambda: self.buscar(q='an pe'))
+        with self.assertNumQueries(2):
+            self.buscar(q='an pe')
+
+    def test_solo_administradores(self):
+        self.client.force_authenticate(self.ana)
+        self.assertEqual(self.client.get('/api/users/usuarios/directorio/', {'q': 'an'}).status_code, 403)
+
+
+class SeedUsersTests(TestCase):
+    """seed_users --bulk escribe las filas rechazadas sin la contraseña y revoca tokens como save()"""
+
+    def test_rechazos_sin_contrasena(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            origen = Path(directorio) / 'usuarios.csv'
+            origen.write_text(
+                'username,email,password,first_name\n'
+                'ana,ana@example.com,secreto-1,Ana\n'
+                'ana,ana2@example.com,secreto-2,Ana\n'
+                ',,secreto-3,Sin usuario\n',
+                encoding='utf-8',
+            )
+            call_command('seed_users', file=str(origen), bulk=True, workers=1, stdout=StringIO())
+
+            with open(f'{origen}.rejects.csv', newline='', encoding='utf-8') as fh:
+                contenido = fh.read()
+        self.assertNotIn('secreto', contenido)
+        filas = list(csv.DictReader(StringIO(contenido)))
+        self.assertEqual([f['error'] for f in filas], ['duplicate username in file', 'missing username/email'])
+        self.assertNotIn('password', filas[0])
+        self.assertTrue(Usuario.objects.get(username='ana').check_password('secreto-1'))
+
+    @override_settings(TOKENS_FIRMADOS={'ACTIVO': True, 'TTL': 3600, 'REFRESCO': 30})
+    def test_actualizacion_en_lote_revoca_tokens_firmados(self):
+        revocaciones.limpiar()
+        emitidos = {
+            nombre: tokens.emitir(Usuario.objects.create_user(nombre, f'{nombre}@example.com', 'clave'))
+            for nombre in ('ana', 'beto', 'carla')
+        }
+        with tempfile.TemporaryDirectory() as directorio:
+            origen = Path(directorio) / 'usuarios.csv'
+            origen.write_text(
+                'username,password,first_name,is_active\n'
+                'ana,otra-clave,Ana,1\n'
+                'beto,,Beto,1\n'
+                'carla,,Carla,0\n',
+                encoding='utf-8',
+            )
+            call_command('seed_users', file=str(origen), bulk=True, update=True, workers=1, stdout=StringIO())
+
+        # Nueva contraseña o desactivación revocan; un cambio de nombre no
+        revocaciones.limpiar()
+        for nombre, revocado in (('ana', True), ('beto', False), ('carla', True)):
+            if revocado:
+                with self.assertRaises(tokens.TokenInvalido, msg=nombre):
+                    tokens.verificar(emitidos[nombre])
+            else:
+                tokens.verificar(emitidos[nombre])
+
+
+@skipUnless(sharding.activo(), 'Requiere DB_SHARDS con al menos dos shards')
+class ShardingTests(TransactionTestCase):
+    """Con DB_SHARDS, cada universidad vive en su shard y los endpoints de administración los recorren todos"""
+    databases = '__all__'
+
+    def setUp(self):
+        # Dos universidades que caigan en shards distintos
+        por_shard = {}
+        for universidad in ('UCV', 'USB', 'UCAB', 'UNIMET', 'LUZ', 'ULA', 'UC', 'UDO'):
+            por_shard.setdefault(sharding.shard_para(universidad), universidad)
+        if len(por_shard) < 2:
+            self.skipTest('Las universidades de prueba caen todas en el mismo shard')
+        (self.shard_a, uni_a), (self.shard_b, uni_b) = list(por_shard.items())[:2]
+
+        self.admin = Usuario.objects.create_user('admin', 'admin@example.com', 'clave', rol='administrador')
+        self.becarios = {}
+        for alias, universidad in ((self.shard_a, uni_a), (self.shard_b, uni_b)):
+            with sharding.en_shard(alias):
+                becario = Usuario.objects.create_user(
+                    f'becario_{alias}', f'{alias}@example.com', 'clave', universidad=universidad,
+                    meta_horas_talleres=10,
+                )
+                actividad = Actividad.objects.create(
+                    titulo='Taller', tipo='Taller', fecha=date(2025, 1, 1), duracion_horas=2,
+                    modalidad='P', creador=becario,
+                )
+                actividad.becarios_asignados.add(becario)
+            self.becarios[alias] = (becario, actividad)
+        cubos.limpiar()
+        self.client = APIClient()
+
+    def login(self, email):
+        respuesta = self.client.post('/api/users/auth/login/', {'email': email, 'password': 'clave'})
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {respuesta.data["token"]}')
+
+    def test_usuarios_en_el_shard_de_su_universidad(self):
+        for alias, (becario, _) in self.becarios.items():
+            self.assertEqual(becario._state.db, alias)
+            self.assertEqual(UbicacionUsuario.objects.get(email=becario.email).shard, alias)
+        # Los ids se repiten entre shards: solo la tabla global los distingue
+        self.assertEqual(self.becarios[self.shard_a][0].pk, self.becarios[self.shard_b][0].pk)
+
+    def test_becario_escribe_en_su_shard(self):
+        becario, actividad = self.becarios[self.shard_b]
+        self.login(becario.email)
+        respuesta = self.client.post('/api/records/registros-horas/', {
+            'actividad': actividad.pk, 'horas_reportadas': 3,
+        })
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        self.assertEqual(RegistroHoras.objects.using(self.shard_b).count(), 1)
+        self.assertEqual(RegistroHoras.objects.using(self.shard_a).count(), 0)
+
+    def test_administracion_recorre_todos_los_shards(self):
+        for alias, (becario, actividad) in self.becarios.items():
+            with sharding.en_shard(alias):
+                RegistroHoras.objects.create(becario=becario, actividad=actividad, horas_reportadas=4)
+
+        self.login('admin@example.com')
+        pendientes = self.client.get('/api/records/registros-horas/pendientes/')
+        self.assertEqual(pendientes.status_code, 200)
+        self.assertEqual(pendientes.data['count'], 2)
+        self.assertEqual(sorted(fila['shard'] for fila in pendientes.data['results']), sorted(self.becarios))
+        # Páginas sobre la mezcla de shards
+        pagina = self.client.get('/api/records/registros-horas/pendientes/', {'page_size': 1, 'page': 2})
+        self.assertEqual((len(pagina.data['results']), pagina.data['next']), (1, None))
+        self.assertEqual(pagina.data['results'][0], pendientes.data['results'][1])
+
+        # La aprobación va al shard del registro
+        fila = pendientes.data['results'][0]
+        respuesta = self.client.post(
+            f'/api/records/registros-horas/{fila["id"]}/aprobar_rechazar/', {'accion': 'aprobar'},
+            HTTP_X_SHARD=fila['shard'],
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            ProgresoMeta.objects.using(fila['shard']).get(tipo_actividad='Taller').horas_alcanzadas, 4
+        )
+
+        progreso = self.client.get('/api/progress/progress/progreso_general/', {'ordering': '-porcentaje_cumplimiento'})
+        self.assertEqual(progreso.status_code, 200)
+        self.assertEqual(progreso.data['count'], 2)
+        self.assertEqual(progreso.data['estadisticas_generales']['total_horas_aprobadas'], 4)
+        self.assertEqual(progreso.data['progreso_becarios'][0]['shard'], fila['shard'])
+        self.assertEqual(progreso.data['progreso_becarios'][0]['porcentaje_cumplimiento'], '40.00')
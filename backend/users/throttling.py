@@ -0,0 +1,113 @@
+"""
+Limitación de las acciones públicas de autenticación con cubos de tokens en memoria.
+
+``login``, ``registrar_password``, ``obtener_pregunta_seguridad`` y
+``resetear_password_seguridad`` no requieren token y cada intento cuesta una
+verificación PBKDF2. ``AccionesPublicasThrottle`` aplica dos cubos por
+petición: uno por IP (compartido por todas estas acciones) y otro por cuenta
+(email o ``user_id``). Cada cubo admite una ráfaga de ``CAPACIDAD`` intentos y
+recupera ``RECARGA`` intentos por segundo (mayor que 0); al agotarse se responde 429 con
+``Retry-After``.
+
+Los cubos viven en memoria de cada proceso (como la caché de tokens de
+``users/authentication.py``): con varios workers el límite efectivo se
+multiplica por su número. Configuración::
+
+    THROTTLING_PUBLICO = {
+        'ACTIVO': True,
+        'IP': {'CAPACIDAD': 30, 'RECARGA': 0.5},
+        'CUENTA': {'CAPACIDAD': 10, 'RECARGA': 0.1},
+        'MAX_ENTRIES': 100000,
+    }
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+CONFIGURACION_POR_DEFECTO = {
+    'ACTIVO': True,
+    'IP': {'CAPACIDAD': 30, 'RECARGA': 0.5},
+    'CUENTA': {'CAPACIDAD': 10, 'RECARGA': 0.1},
+    'MAX_ENTRIES': 100000,
+}
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'THROTTLING_PUBLICO', {})}
+
+
+class CubosTokens:
+    """Cubos de tokens por clave con desalojo LRU, seguros entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cubos = OrderedDict()   # clave -> [tokens, instante de la última recarga]
+        self.rechazos = 0
+
+    def consumir(self, clave, capacidad, recarga, max_entradas):
+        """Gasta un token de ``clave``; devuelve 0 si se permite o los segundos de espera si no"""
+        ahora = time.monotonic()
+        with self._lock:
+            cubo = self._cubos.get(clave)
+            if cubo is None:
+                cubo = self._cubos[clave] = [float(capacidad), ahora]
+                while len(self._cubos) > max_entradas:
+                    self._cubos.popitem(last=False)
+            else:
+                cubo[0] = min(float(capacidad), cubo[0] + (ahora - cubo[1]) * recarga)
+                cubo[1] = ahora
+                self._cubos.move_to_end(clave)
+            if cubo[0] >= 1:
+                cubo[0] -= 1
+                return 0
+            self.rechazos += 1
+            return (1 - cubo[0]) / recarga
+
+    def limpiar(self):
+        with self._lock:
+            self._cubos.clear()
+            self.rechazos = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {'cubos': len(self._cubos), 'rechazos': self.rechazos}
+
+
+cubos = CubosTokens()
+
+
+def claves_de(ip, datos):
+    """Claves ``(tipo, clave)`` de una petición pública: su IP y la cuenta que menciona"""
+    claves = [('IP', f'ip:{ip}')]
+    email = datos.get('email') if hasattr(datos, 'get') else None
+    if email:
+        claves.append(('CUENTA', f'email:{str(email).strip().lower()}'))
+    elif hasattr(datos, 'get') and datos.get('user_id'):
+        claves.append(('CUENTA', f'usuario:{datos.get("shard") or ""}:{datos.get("user_id")}'))
+    return claves
+
+
+def espera(ip, datos):
+    """0 si la petición se permite; si no, segundos hasta que vuelva a haber intentos"""
+    conf = configuracion()
+    if not conf['ACTIVO']:
+        return 0
+    # Se consumen todos los cubos aunque alguno ya esté vacío: los intentos rechazados también cuentan
+    esperas = [
+        cubos.consumir(clave, conf[tipo]['CAPACIDAD'], conf[tipo]['RECARGA'], conf['MAX_ENTRIES'])
+        for tipo, clave in claves_de(ip, datos)
+    ]
+    return max(esperas)
+
+
+class AccionesPublicasThrottle(BaseThrottle):
+    """Throttle de DRF para las acciones públicas de ``users.views``"""
+
+    def allow_request(self, request, view):
+        self.segundos = espera(self.get_ident(request), request.data)
+        return self.segundos == 0
+
+    def wait(self):
+        return self.segundos
@@ -0,0 +1,152 @@
+"""
+Tokens de acceso firmados (sin estado) con lista de revocación.
+
+Con ``TOKENS_FIRMADOS['ACTIVO']`` el login emite, en lugar de un token de
+``rest_framework.authtoken``, un token firmado con HMAC (``django.core.signing``
+con ``SECRET_KEY``) que lleva el id del usuario, su rol, su shard y la
+caducidad. ``CachedTokenAuthentication`` lo verifica sin consultar la base de
+datos: ``request.user`` es un ``Usuario`` con solo ``id``, ``rol`` e
+``is_active`` cargados; el resto de campos se carga de una vez al primer acceso.
+
+Como la firma no se puede retirar, las desactivaciones, cambios de rol y de
+contraseña y las eliminaciones se registran en ``RevocacionToken``: los tokens
+emitidos antes de esa marca dejan de ser válidos. Cada proceso mantiene la
+lista en memoria y la recarga cada ``REFRESCO`` segundos, de modo que una
+revocación hecha en otro proceso tarda como mucho ese tiempo en aplicarse.
+Los tokens de ``authtoken`` existentes se siguen aceptando.
+"""
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+SALT = 'users.tokens'
+
+CONFIGURACION_POR_DEFECTO = {'ACTIVO': False, 'TTL': 24 * 3600, 'REFRESCO': 30}
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'TOKENS_FIRMADOS', {})}
+
+
+def activo():
+    return bool(configuracion()['ACTIVO'])
+
+
+def _ahora_ms():
+    return int(time.time() * 1000)
+
+
+def emitir(usuario):
+    """Token firmado para ``usuario`` válido durante ``TTL`` segundos"""
+    emitido = _ahora_ms()
+    return signing.dumps({
+        'u': usuario.pk,
+        'r': usuario.rol,
+        'd': usuario._state.db or DEFAULT_DB_ALIAS,
+        'iat': emitido,
+        'exp': emitido + configuracion()['TTL'] * 1000,
+    }, salt=SALT, compress=True)
+
+
+def es_firmado(key):
+    # Los tokens de authtoken son 40 caracteres hexadecimales; los firmados llevan ':'
+    return ':' in key
+
+
+def verificar(key):
+    """
+    Devuelve ``(usuario_id, rol, shard)`` de un token firmado válido.
+    Lanza ``TokenInvalido`` si la firma no es correcta, si caducó o si fue revocado.
+    """
+    try:
+        datos = signing.loads(key, salt=SALT)
+    except signing.BadSignature:
+        raise TokenInvalido('Token inválido.')
+    if datos['exp'] <= _ahora_ms():
+        raise TokenInvalido('Token caducado.')
+    revocado = revocaciones.revocado_desde(datos['d'], datos['u'])
+    if revocado is not None and datos['iat'] <= revocado:
+        raise TokenInvalido('Token revocado.')
+    return datos['u'], datos['r'], datos['d']
+
+
+def usuario_de(usuario_id, rol, shard):
+    """``Usuario`` sin consultar la base de datos; el resto de campos se cargan juntos al usarse"""
+    from .models import Usuario
+    usuario = Usuario.from_db(shard, ['id', 'rol', 'is_active'], [usuario_id, rol, True])
+    usuario._cargar_diferidos_juntos = True
+    return usuario
+
+
+class ListaRevocacion:
+    """Marcas de revocación ``(shard, usuario_id) -> epoch en ms``, recargadas periódicamente de la BD"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._marcas = {}
+        self._cargada = None
+        self.recargas = 0
+
+    def revocado_desde(self, shard, usuario_id):
+        refresco = configuracion()['REFRESCO']
+        if self._cargada is None or time.monotonic() - self._cargada >= refresco:
+            self.recargar()
+        return self._marcas.get((shard, usuario_id))
+
+    def recargar(self):
+        from .models import RevocacionToken
+        # Las revocaciones más antiguas que el TTL ya no afectan a ningún token vigente
+        desde = timezone.now() - timedelta(seconds=configuracion()['TTL'])
+        marcas = {
+            (shard, usuario_id): int(revocado_en.timestamp() * 1000)
+            for shard, usuario_id, revocado_en in RevocacionToken.objects.filter(revocado_en__gte=desde)
+            .values_list('shard', 'usuario_id', 'revocado_en')
+        }
+        with self._lock:
+            self._marcas = marcas
+            self._cargada = time.monotonic()
+            self.recargas += 1
+
+    def revocar(self, shard, usuario_id):
+        """Invalida los tokens emitidos hasta ahora para el usuario, en este proceso de inmediato"""
+        from .models import RevocacionToken
+        ahora = timezone.now()
+        RevocacionToken.objects.update_or_create(
+            shard=shard, usuario_id=usuario_id, defaults={'revocado_en': ahora}
+        )
+        with self._lock:
+            self._marcas[(shard, usuario_id)] = int(ahora.timestamp() * 1000)
+
+    def revocar_varios(self, shard, usuario_ids):
+        """``revocar`` para varios usuarios del mismo shard con un solo INSERT ... ON CONFLICT"""
+        from .models import RevocacionToken
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids:
+            return
+        ahora = timezone.now()
+        RevocacionToken.objects.bulk_create(
+            [RevocacionToken(shard=shard, usuario_id=usuario_id, revocado_en=ahora) for usuario_id in usuario_ids],
+            update_conflicts=True, unique_fields=['shard', 'usuario_id'], update_fields=['revocado_en'],
+            batch_size=1000,
+        )
+        marca = int(ahora.timestamp() * 1000)
+        with self._lock:
+            for usuario_id in usuario_ids:
+                self._marcas[(shard, usuario_id)] = marca
+
+    def limpiar(self):
+        with self._lock:
+            self._marcas = {}
+            self._cargada = None
+            self.recargas = 0
+
+
+revocaciones = ListaRevocacion()
@@ -7,5 +7,7 @@ router.register('auth', views.AuthViewSet, basename='auth')
 router.register('usuarios', views.UsuarioViewSet)
 
 urlpatterns = [
+    # Login asíncrono: verifica la contraseña en un pool de hilos acotado (users/hashing.py)
+    path('auth/login_async/', views.LoginAsyncView.as_view(), name='auth-login-async'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,13 +1,46 @@
+import json
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from django.db import models, IntegrityError
-from .models import Usuario
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views import View
+from .models import UbicacionUsuario, Usuario
 from .serializers import UsuarioSerializer, LoginSerializer, UsuarioCreateSerializer, ConfiguracionInicialSerializer
 from .permissions import IsAdministrador, IsOwnerOrAdmin
+from .throttling import AccionesPublicasThrottle
+from . import directory, hashing, throttling, tokens
+from backend import conditional, sharding
+from backend.conditional import condicional
+from backend.expansion import ExpandableViewMixin
 from drf_spectacular.utils import extend_schema
 
+def fijar_shard_por_email(email):
+    """Con sharding, atiende la petición en el shard del usuario con ``email`` según la tabla global"""
+    if sharding.activo():
+        sharding.fijar_shard(sharding.shard_de_email(email))
+
+
+def datos_login(user):
+    """Cuerpo de la respuesta de un login correcto (token nuevo o reutilizado)"""
+    if tokens.activo():
+        # Token firmado con caducidad, verificable sin base de datos (users/tokens.py)
+        clave = tokens.emitir(user)
+    else:
+        clave = Token.objects.get_or_create(user=user)[0].key
+    return {
+        'token': clave,
+        'user': UsuarioSerializer(user).data,
+        'message': 'Inicio de sesión exitoso',
+        'requiere_configuracion_inicial': not user.configuracion_inicial_completada
+    }
+
+
 class AuthViewSet(viewsets.ViewSet):
 
     @extend_schema(
@@ -16,21 +49,13 @@ class AuthViewSet(viewsets.ViewSet):
         Autentica a un usuario y retorna un token de acceso válido por 24 horas.
         """
     )
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny],
+            throttle_classes=[AccionesPublicasThrottle])
     def login(self, request):
-        serializer = LoginSerializer(data=request.data)
+        fijar_shard_por_email(request.data.get('email'))
+        serializer = LoginSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            user = serializer.validated_data['user']
-            token, created = Token.objects.get_or_create(user=user)
-
-            response_data = {
-                'token': token.key,
-                'user': UsuarioSerializer(user).data,
-                'message': 'Inicio de sesión exitoso',
-                'requiere_configuracion_inicial': not user.configuracion_inicial_completada
-            }
-
-            return Response(response_data)
+            return Response(datos_login(serializer.validated_data['user']))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @extend_schema(
@@ -40,10 +65,12 @@ class AuthViewSet(viewsets.ViewSet):
         Útil para usuarios creados por administradores que necesitan establecer su contraseña.
         """
     )
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny],
+            throttle_classes=[AccionesPublicasThrottle])
     def registrar_password(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
+        fijar_shard_por_email(email)
         
         try:
             user = Usuario.objects.get(email=email)
@@ -58,10 +85,72 @@ class AuthViewSet(viewsets.ViewSet):
             return Response({'error': 'Usuario no encontrado'}, 
                           status=status.HTTP_404_NOT_FOUND)
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginAsyncView(View):
+    """
+    **🔓 PÚBLICO** - Iniciar sesión sin bloquear el bucle de eventos (ASGI)
+
+    Mismo cuerpo y respuesta que ``auth/login/``. La verificación de la
+    contraseña se ejecuta en el pool acotado de ``users/hashing.py`` y la
+    consulta del usuario con el ORM asíncrono. Aplica los mismos límites por IP
+    y por cuenta que las acciones públicas (``users/throttling.py``). Como las
+    vistas de DRF con autenticación por token, no requiere token CSRF.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request):
+        try:
+            datos = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        except ValueError:
+            return JsonResponse({'detail': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        if not hasattr(datos, 'get'):
+            return JsonResponse({'detail': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        espera = throttling.espera(AccionesPublicasThrottle().get_ident(request), datos)
+        if espera:
+            respuesta = JsonResponse({'detail': 'Demasiados intentos. Inténtalo más tarde.'},
+                                     status=status.HTTP_429_TOO_MANY_REQUESTS)
+            respuesta['Retry-After'] = str(int(espera) + 1)
+            return respuesta
+
+        email, password = datos.get('email'), datos.get('password')
+        errores = {campo: ['Este campo es requerido.'] for campo, valor in
+                   (('email', email), ('password', password)) if not valor}
+        if errores:
+            return JsonResponse(errores, status=status.HTTP_400_BAD_REQUEST)
+
+        if sharding.activo():
+            sharding.fijar_shard(await sync_to_async(sharding.shard_de_email)(email))
+        try:
+            usuario = await Usuario.objects.aget(email=email)
+        except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
+            usuario = None
+
+        try:
+            valida = await hashing.verificar(password, usuario.password if usuario else None)
+        except hashing.PoolSaturado as e:
+            respuesta = JsonResponse({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            respuesta['Retry-After'] = '1'
+            return respuesta
+        if not valida or not usuario.is_active:
+            return JsonResponse({'non_field_errors': ['Credenciales inválidas']}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse(await sync_to_async(datos_login)(usuario))
+
+
+def versiones_perfil(view, request):
+    # El perfil se serializa desde request.user; con ?expand=actividades_asignadas incluye actividades
+    marcas = [conditional.marca_campos(request.user, UsuarioSerializer.Meta.fields)]
+    if request.query_params.get('expand'):
+        marcas.append(conditional.marca_actividades())
+    return marcas
+
+
+class UsuarioViewSet(ExpandableViewMixin, viewsets.ModelViewSet):
         
     queryset = Usuario.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    # username es único e indexado: sirve como clave de la paginación por cursor
+    keyset_ordering = ('username',)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -70,7 +159,8 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Usuario.objects.filter(is_active=True).prefetch_related('actividades_asignadas')
+        # Las actividades asignadas solo se prefetchean con ?expand=actividades_asignadas
+        queryset = Usuario.objects.filter(is_active=True)
         if user.rol == 'administrador':
             return queryset
         elif user.rol == 'becario':
@@ -144,7 +234,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'destroy']:
+        if self.action in ['create', 'update', 'destroy', 'directorio']:
             return [permissions.IsAuthenticated(), IsAdministrador()]
         elif self.action in ['obtener_pregunta_seguridad', 'resetear_password_seguridad']:
             return [permissions.AllowAny()]
@@ -173,6 +263,18 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        datos = serializer.validated_data
+        if sharding.activo():
+            # La validación del serializer solo ve el shard actual: la unicidad global se comprueba en la tabla de ubicación
+            if UbicacionUsuario.objects.filter(username=datos.get('username')).exists():
+                raise ValidationError({'username': 'Ya existe un usuario con este nombre de usuario.'})
+            if datos.get('email') and UbicacionUsuario.objects.filter(email=datos['email']).exists():
+                raise ValidationError({'email': 'Ya existe un usuario con este correo electrónico.'})
+        # El usuario nuevo vive en el shard de su universidad
+        with sharding.en_shard(sharding.shard_para(datos.get('universidad'))):
+            serializer.save()
+
     @extend_schema(
         description="""**🔐 BECARIOS Y ADMINISTRADORES** - Obtener usuario por ID
         
@@ -250,13 +352,43 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         description="""**🔐 TODOS LOS USUARIOS AUTENTICADOS** - Ver mi perfil
         
          Retorna la información del perfil del usuario actualmente autenticado.
-        Incluye las actividades asignadas si el usuario es becario."""
+        Incluye las actividades asignadas si el usuario es becario.
+        Admite peticiones condicionales (`If-None-Match` / `If-Modified-Since`): sin cambios responde 304."""
     )
     @action(detail=False, methods=['get'])
+    @condicional(versiones_perfil)
     def mi_perfil(self, request):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
+    @extend_schema(
+        description="""**👑 SOLO ADMINISTRADORES** - Directorio de usuarios (autocompletado)
+
+        Busca usuarios activos cuyo nombre, apellido, username, email, carrera o
+        universidad tenga palabras que empiecen por cada palabra de `q`, sin
+        distinguir mayúsculas ni acentos. Devuelve solo `id`, `nombre` y `rol`.
+
+        **Parámetros:**
+        - `q`: texto a buscar (requerido)
+        - `rol`: `becario` o `administrador` (opcional)
+        - `limite`: número máximo de resultados (por defecto 10, máximo 50)
+        """
+    )
+    @action(detail=False, methods=['get'])
+    def directorio(self, request):
+        params = request.query_params
+        texto = params.get('q', '')
+        if not directory.palabras(texto):
+            return Response({'error': 'El parámetro q es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        rol = params.get('rol')
+        if rol and rol not in dict(Usuario.ROL_CHOICES):
+            return Response({'error': f'Rol inválido: {rol}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(max(int(params.get('limite', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'El parámetro limite debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(directory.buscar(texto, limite, rol))
+
     @extend_schema(
         description="**👑 SOLO ADMINISTRADORES** - Asignar actividades a becario"   
     )
@@ -275,21 +407,23 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         
         # Verificar que las actividades existan
         from activities.models import Actividad
+        from activities.assignments import aplicar_matriz
+        actividades_ids = list(dict.fromkeys(actividades_ids))
         actividades = Actividad.objects.filter(id__in=actividades_ids)
         
-        if len(actividades) != len(actividades_ids):
+        if actividades.count() != len(actividades_ids):
             return Response(
                 {'error': 'Algunas actividades no existen'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Asignar las actividades al becario
-        usuario.actividades_asignadas.add(*actividades)
+        # Asignar las actividades al becario (solo los pares que falten)
+        aplicar_matriz(actividades_ids, [usuario.pk], 'agregar')
         
         return Response({
-            'message': f'Se asignaron {len(actividades)} actividades al becario',
+            'message': f'Se asignaron {len(actividades_ids)} actividades al becario',
             'becario': f"{usuario.first_name} {usuario.last_name}",
-            'actividades_asignadas': [actividad.titulo for actividad in actividades]
+            'actividades_asignadas': list(actividades.values_list('titulo', flat=True))
         })
 
     @extend_schema(
@@ -320,7 +454,8 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     @extend_schema(
         description="""Obtener pregunta de seguridad para recuperación de contraseña"""
     )
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny], authentication_classes=[])
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny], authentication_classes=[],
+            throttle_classes=[AccionesPublicasThrottle])
     def obtener_pregunta_seguridad(self, request):
         email = request.data.get('email')
         if not email:
@@ -329,6 +464,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        fijar_shard_por_email(email)
         try:
             usuario = Usuario.objects.get(email=email)
             if not usuario.pregunta_seguridad:
@@ -337,10 +473,14 @@ class UsuarioViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            return Response({
+            datos = {
                 'pregunta_seguridad': usuario.pregunta_seguridad,
                 'user_id': usuario.id
-            })
+            }
+            if sharding.activo():
+                # Los ids solo son únicos dentro de un shard: el cliente lo reenvía al resetear
+                datos['shard'] = usuario._state.db
+            return Response(datos)
         except Usuario.DoesNotExist:
             return Response(
                 {'error': 'No se encontró un usuario con este correo electrónico'},
@@ -350,7 +490,8 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     @extend_schema(
         description="""Verificar respuesta de seguridad y cambiar contraseña"""
     )
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny], authentication_classes=[])
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny], authentication_classes=[],
+            throttle_classes=[AccionesPublicasThrottle])
     def resetear_password_seguridad(self, request):
         user_id = request.data.get('user_id')
         respuesta_seguridad = request.data.get('respuesta_seguridad')
@@ -362,6 +503,13 @@ class UsuarioViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if sharding.activo():
+            # ``shard`` viene de la respuesta de obtener_pregunta_seguridad
+            shard = request.data.get('shard')
+            if shard not in sharding.todos():
+                return Response({'error': 'Shard desconocido'}, status=status.HTTP_400_BAD_REQUEST)
+            sharding.fijar_shard(shard)
+
         try:
             usuario = Usuario.objects.get(id=user_id)
         except Usuario.DoesNotExist:
@@ -1,55 +1,33 @@
-import { NextResponse } from 'next/server'
-import { getAllUsers } from '@/server/users'
-import { getAllPendingHours } from '@/server/activities'
+import { NextRequest, NextResponse } from 'next/server'
+import { getSession } from '@/lib'
 
-function escapeCsv(s: any) {
-  if (s === null || s === undefined) return ''
-  const str = String(s)
-  if (str.includes(',') || str.includes('"') || str.includes('\n')) {
-    return '"' + str.replace(/"/g, '""') + '"'
+// The backend builds and streams the CSV; this route only forwards the filters
+// (estado, desde, hasta, tipo, becario, incluir) and pipes the body through
+// without buffering it in Node memory.
+export async function GET(req: NextRequest) {
+  const session = await getSession()
+  if (!session) {
+    return NextResponse.json({ error: 'No autorizado' }, { status: 401 })
   }
-  return str
-}
-
-export async function GET() {
-  const users = await getAllUsers()
-  const hoursResp = await getAllPendingHours()
-  const hours = Array.isArray(hoursResp) ? hoursResp : (hoursResp && (hoursResp as any).data) ? (hoursResp as any).data : []
 
-  let csv = ''
-  csv += 'section,id,name,email,sexo,user_id,hours,date,activity_type,estado_aprobacion\n'
+  const params = new URLSearchParams(req.nextUrl.searchParams)
+  // Same content as the previous report: all users plus pending hour records
+  if (!params.has('estado')) params.set('estado', 'P')
 
-  const usersArray = Array.isArray(users) ? users : (users && (users as any).data) ? (users as any).data : []
-  // map users by id for lookups
-  const usersMap: Record<string | number, any> = {}
-  for (const u of usersArray) {
-    usersMap[(u as any).id] = u
-    const name = (u as any).first_name || (u as any).name || (u as any).username || ''
-    csv += ['users', escapeCsv((u as any).id), escapeCsv(name), escapeCsv((u as any).email), escapeCsv((u as any).sexo ?? ''), '', '', '', '', ''].join(',') + '\n'
-  }
+  const res = await fetch(`${process.env.API_URL}/api/records/registros-horas/exportar_csv/?${params}`, {
+    headers: { Authorization: `Token ${session.accessToken}` },
+    cache: 'no-store',
+  })
 
-  for (const h of hours) {
-    const becarioId = (h as any).becario ?? (h as any).user_id ?? (h as any).user ?? ''
-    const becarioSexo = usersMap[becarioId] ? (usersMap[becarioId].sexo ?? '') : ''
-    const horasVal = (h as any).horas_reportadas ?? (h as any).horas ?? (h as any).hours ?? ''
-    csv += [
-      'pending_hour',
-      escapeCsv((h as any).id ?? ''),
-      '',
-      '',
-      escapeCsv(becarioId ?? ''),
-      escapeCsv(horasVal ?? ''),
-      escapeCsv((h as any).fecha_registro ?? (h as any).date ?? ''),
-      escapeCsv((h as any).actividad_detalle?.titulo ?? (h as any).activity_type ?? ''),
-      escapeCsv((h as any).estado_aprobacion ?? ''),
-      escapeCsv(becarioSexo),
-    ].join(',') + '\n'
+  if (!res.ok || !res.body) {
+    const data = await res.json().catch(() => ({ error: 'Error al generar el informe' }))
+    return NextResponse.json(data, { status: res.status })
   }
 
-  return new Response(csv, {
+  return new Response(res.body, {
     headers: {
-      'Content-Type': 'text/csv; charset=utf-8',
-      'Content-Disposition': 'attachment; filename="informe.csv"',
+      'Content-Type': res.headers.get('Content-Type') ?? 'text/csv; charset=utf-8',
+      'Content-Disposition': res.headers.get('Content-Disposition') ?? 'attachment; filename="informe.csv"',
     },
   })
 }
@@ -94,6 +94,7 @@ export async function getActivityById(id: number) {
     const response = await request.get<Activity>(
       `/api/activities/actividades/${id}/`,
       {
+        params: { expand: "becarios_asignados_info" },
         headers: {
           Authorization: `Token ${session?.accessToken}`,
         },
@@ -158,22 +159,33 @@ export async function createRegistroHoras(data: any) {
   }
 }
 
+type PaginatedHours = { count: number; next: string | null; previous: string | null; results: Hours[] };
+
 export async function getAllPendingHours() {
   const session = await getSession();
   try {
-    const response = await request.get<Hours[]>(
+    const headers = { Authorization: `Token ${session?.accessToken}` };
+    const response = await request.get<Hours[] | PaginatedHours>(
       "/api/records/registros-horas/pendientes/",
-      {
-        headers: {
-          Authorization: `Token ${session?.accessToken}`,
-        },
-      }
+      { params: { expand: "actividad_detalle" }, headers }
     );
+    // With sharding the backend merges every shard and pages the result
+    let data = response.data;
+    if (!Array.isArray(data)) {
+      const hours = [...data.results];
+      let next = data.next;
+      while (next) {
+        const page = await request.get<PaginatedHours>(next, { headers });
+        hours.push(...page.data.results);
+        next = page.data.next;
+      }
+      data = hours;
+    }
     return {
       message: "Pending hours fetched successfully",
       status: 200,
       controller: true,
-      data: response.data,
+      data,
       originalError: null,
       error: false,
     };
@@ -210,6 +222,7 @@ export async function getDetailsHorasRegistro(registroId: number) {
     const response = await request.get<Hours>(
       `/api/records/registros-horas/${registroId}/`,
       {
+        params: { expand: "actividad_detalle" },
         headers: {
           Authorization: `Token ${session?.accessToken}`,
         },
@@ -324,6 +337,7 @@ export async function getAllHorasRegistros() {
     const response = await request.get<Hours[]>(
       `/api/records/registros-horas/`,
       {
+        params: { expand: "actividad_detalle" },
         headers: { Authorization: `Token ${session?.accessToken}` },
       }
     );